@@ -0,0 +1,7 @@
+# python3 src/bench.py --size 100MB --pages 100000   # the large corpus
+# the first run records bench-baseline.json, later runs fail on a regression
+if [ -f bench-baseline.json ]; then
+    python3 src/bench.py --baseline bench-baseline.json "$@"
+else
+    python3 src/bench.py --save-baseline bench-baseline.json "$@"
+fi
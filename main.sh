@@ -1,3 +1,7 @@
 # python3 src/main.py
 # cd public && python3 -m http.server 8888
+# python3 src/main.py --watch   # build, serve on :8888 and rebuild on save
+# python3 src/main.py --shard 1/2 && python3 src/main.py --shard 2/2   # on two hosts
+# python3 src/merge.py shard-1-of-2 shard-2-of-2   # combine into docs/
+# python3 src/main.py --artifacts http://cache-host:8899   # share rendered pages; on cache-host: python3 src/cache.py serve --host 0.0.0.0 (trusted network only), or stats|prune
 python3 src/main.py "/static_site_generator/"
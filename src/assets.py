@@ -0,0 +1,99 @@
+import hashlib
+import json
+from pathlib import Path
+
+from manifest import hash_file
+from output import write_if_changed
+from sync import walk_files
+
+ASSET_MANIFEST_VERSION = 1
+
+# written into the output directory: static path -> fingerprinted name
+ASSET_MANIFEST = "asset-manifest.json"
+
+# hex digits of the content hash put in a fingerprinted name
+FINGERPRINT_LENGTH = 10
+
+# linked to by name from outside the site, so never fingerprinted
+_FIXED_NAMES = frozenset({"robots.txt", "favicon.ico", "sitemap.xml", "humans.txt"})
+_FIXED_SUFFIXES = (".html", ".htm")
+
+def is_fingerprinted(rel):
+    name = rel.rsplit("/", 1)[-1]
+    return not (name in _FIXED_NAMES or name.startswith(".") or rel.endswith(_FIXED_SUFFIXES))
+
+def fingerprint_name(rel, digest):
+    # "css/index.css" -> "css/index.3f9a1c2b7d.css"
+    head, sep, name = rel.rpartition("/")
+    stem, dot, suffix = name.rpartition(".")
+    if not dot:
+        stem, suffix = name, ""
+    fingerprinted = f"{stem}.{digest[:FINGERPRINT_LENGTH]}" + (f".{suffix}" if dot else "")
+    return f"{head}{sep}{fingerprinted}"
+
+class AssetMap():
+    # static paths to the names they are published under.  Immutable and
+    # hashable, so a compiled template can be cached per map.
+    def __init__(self, names = None):
+        self.names = dict(names or {})
+        self._key = tuple(sorted(self.names.items()))
+        self.digest = hashlib.sha256(json.dumps(self._key).encode()).hexdigest()
+
+    def __eq__(self, other):
+        return isinstance(other, AssetMap) and self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __len__(self):
+        return len(self.names)
+
+    def url_path(self, path):
+        # path is root-relative without its leading "/"; a query or fragment
+        # is carried over onto the fingerprinted name
+        end = len(path)
+        for mark in ("?", "#"):
+            i = path.find(mark)
+            if i != -1:
+                end = min(end, i)
+        name = self.names.get(path[:end])
+        return path if name is None else name + path[end:]
+
+class AssetManifest():
+    # the fingerprinted name of every static file, and the size and mtime it
+    # was hashed at, so later builds only rehash files that were touched
+    def __init__(self, path, records = None):
+        self.path = Path(path)
+        self.records = records if records is not None else {}
+
+    @classmethod
+    def load(cls, path):
+        p = Path(path)
+        try:
+            data = json.loads(p.read_text())
+        except (FileNotFoundError, ValueError):
+            return cls(p)
+        if data.get("version") != ASSET_MANIFEST_VERSION:
+            return cls(p)
+        return cls(p, data.get("assets", {}))
+
+    def fingerprint(self, static_dir):
+        records = {}
+        for rel, entry in walk_files(static_dir):
+            if not is_fingerprinted(rel):
+                continue
+            st = entry.stat()
+            record = self.records.get(rel)
+            if record is None or record["size"] != st.st_size or record["mtime_ns"] != st.st_mtime_ns:
+                digest = hash_file(entry.path)
+                record = {"name": fingerprint_name(rel, digest), "sha256": digest,
+                          "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            records[rel] = record
+        self.records = dict(sorted(records.items()))
+        return AssetMap((rel, record["name"]) for rel, record in self.records.items())
+
+    def save(self):
+        # returns whether the file changed, like write_if_changed
+        data = {"version": ASSET_MANIFEST_VERSION, "assets": self.records}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        return write_if_changed(self.path, [json.dumps(data, indent=1), "\n"])
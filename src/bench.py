@@ -0,0 +1,334 @@
+import argparse
+import json
+import random
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+from blocks import BlockType, block_to_block_type, markdown_to_blocks
+from inline import extract_markdown_images, extract_markdown_links, text_to_textnodes
+from markdown import markdown_to_html, markdown_to_html_node
+from template import Template
+
+_PARAGRAPH = ("Some **bold** text, some _italic_ text and `inline code`, "
+              "a [link](https://example.com/a_b) and an ![image](/images/a.png). ")
+
+_WORDS = ("lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod "
+          "tempor incididunt ut labore et dolore magna aliqua enim ad minim veniam").split()
+
+_TEMPLATE = ('<!DOCTYPE html>\n<html>\n<head>\n<title>{{ Title }}</title>\n'
+             '<link href="/index.css" rel="stylesheet">\n</head>\n'
+             '<body>\n<article>\n{{ Content }}\n</article>\n</body>\n</html>\n')
+
+def memory_corpus(paragraphs = 2000):
+    return "\n\n".join(_PARAGRAPH * 4 for _ in range(paragraphs))
+
+# --- corpus -----------------------------------------------------------------
+# documents are built from a seeded Random, so a given (size, seed) is the same
+# text on every machine and every run
+
+def _sentence(rng):
+    words = []
+    for _ in range(rng.randint(6, 14)):
+        word = rng.choice(_WORDS)
+        r = rng.random()
+        if r < 0.06:
+            word = f"**{word}**"
+        elif r < 0.10:
+            word = f"_{word}_"
+        elif r < 0.14:
+            word = f"`{word}`"
+        elif r < 0.19:
+            word = f"[{word}](/{rng.choice(_WORDS)}/{rng.randint(1, 999)})"
+        elif r < 0.21:
+            word = f"![{word}](/images/{rng.choice(_WORDS)}.png)"
+        words.append(word)
+    return " ".join(words).capitalize() + "."
+
+def _block(rng):
+    # weights favour paragraphs and links, as real pages do
+    kind = rng.choices(("p", "ul", "ol", "code", "quote", "h"), (50, 12, 8, 10, 10, 10))[0]
+    if kind == "p":
+        lines = [" ".join(_sentence(rng) for _ in range(rng.randint(1, 3))) for _ in range(rng.randint(1, 4))]
+        return "\n".join(lines)
+    if kind == "ul":
+        return "\n".join(f"- {_sentence(rng)}" for _ in range(rng.randint(2, 8)))
+    if kind == "ol":
+        return "\n".join(f"{i}. {_sentence(rng)}" for i in range(1, rng.randint(3, 9)))
+    if kind == "code":
+        lines = [f"{rng.choice(_WORDS)} = {rng.randint(0, 99)}" for _ in range(rng.randint(2, 12))]
+        return "```\n" + "\n".join(lines) + "\n```"
+    if kind == "quote":
+        return "\n".join(f"> {_sentence(rng)}" for _ in range(rng.randint(1, 4)))
+    return "#" * rng.randint(2, 4) + " " + _sentence(rng)[:-1]
+
+def make_document(size, seed = 0):
+    # a markdown document of roughly size bytes, starting with its title
+    rng = random.Random(seed)
+    parts = [f"# Document {seed}"]
+    total = len(parts[0])
+    while total < size:
+        block = _block(rng)
+        parts.append(block)
+        total += len(block) + 2
+    return "\n\n".join(parts) + "\n"
+
+def make_site(root, pages, page_size = 4096, seed = 0):
+    # content/ with pages spread over nested directories, plus template.html
+    root = Path(root)
+    content = root / "content"
+    for i in range(pages):
+        d = content / f"section{i % 10}" / f"part{i // 10 % 100}" / f"page{i}"
+        d.mkdir(parents=True, exist_ok=True)
+        (d / "index.md").write_text(make_document(page_size, seed + i))
+    template = root / "template.html"
+    template.write_text(_TEMPLATE)
+    return content, template
+
+_SIZE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*([kmg]?)b?", re.IGNORECASE)
+
+def parse_size(text):
+    m = _SIZE_RE.fullmatch(text.strip())
+    if m is None:
+        raise argparse.ArgumentTypeError(f"bad size: {text!r}")
+    return int(float(m.group(1)) * 1024 ** " kmg".index(m.group(2).lower() or " "))
+
+# --- timing -----------------------------------------------------------------
+
+def _best_of(repeat, fn):
+    # (fastest wall time, last result); the minimum is the least noisy
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+def bench_stages(size, repeat = 3, seed = 0):
+    # times each pipeline stage on its own, on the output of the stage before
+    markdown = make_document(size, seed)
+    template = Template(_TEMPLATE, "/bench/")
+    stages = {}
+    stages["markdown_to_blocks"], blocks = _best_of(repeat, lambda: markdown_to_blocks(markdown))
+    stages["block_to_block_type"], types = _best_of(repeat, lambda: [block_to_block_type(b) for b in blocks])
+    inline = [" ".join(line.strip() for line in b.split("\n"))
+              for b, t in zip(blocks, types) if t == BlockType.PARAGRAPH]
+    stages["text_to_textnodes"], _ = _best_of(repeat, lambda: [text_to_textnodes(t) for t in inline])
+    stages["markdown_to_html_node"], tree = _best_of(repeat, lambda: markdown_to_html_node(markdown, template.rewrite_url))
+    stages["to_html"], html = _best_of(repeat, tree.to_html)
+    stages["markdown_to_html"], _ = _best_of(repeat, lambda: markdown_to_html(markdown, template.rewrite_url))
+    stages["template"], page = _best_of(repeat, lambda: template.render(Title="Bench", Content=html))
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "page.html"
+        stages["write"], _ = _best_of(repeat, lambda: out.write_text(page))
+        stages["read"], _ = _best_of(repeat, out.read_text)
+    return {
+        "bytes": len(markdown),
+        "blocks": len(blocks),
+        "seconds": {name: round(t, 6) for name, t in stages.items()},
+        "mb_per_s": round(len(markdown) / stages["markdown_to_html"] / 1e6, 2),
+    }
+
+def bench_site(pages, page_size = 4096, jobs = 1, seed = 0):
+    # a full build of a synthetic site, cold, through the same code as main
+    from main import collect_pages, generate_page, generate_pages_parallel
+    with tempfile.TemporaryDirectory() as tmp:
+        content, template = make_site(tmp, pages, page_size, seed)
+        dest = Path(tmp) / "docs"
+        start = time.perf_counter()
+        plan = collect_pages(content, dest)
+        if jobs > 1:
+            generate_pages_parallel(plan, template, "/bench/", jobs, verbose=False)
+        else:
+            for from_path, dest_path in plan:
+                generate_page(from_path, template, dest_path, "/bench/", verbose=False)
+        elapsed = time.perf_counter() - start
+    return {
+        "pages": pages,
+        "page_bytes": page_size,
+        "jobs": jobs,
+        "seconds": {"build": round(elapsed, 6)},
+        "pages_per_s": round(pages / elapsed, 1),
+    }
+
+def bench_minify(pages, page_size = 4096, seed = 0, repeat = 3):
+    # bytes saved by --minify against the build time it adds, on the
+    # synthetic site rendered with the project's own template
+    from main import collect_pages, generate_page
+    project_template = Path(__file__).parent.parent / "template.html"
+    with tempfile.TemporaryDirectory() as tmp:
+        content, template = make_site(tmp, pages, page_size, seed)
+        if project_template.exists():
+            template.write_text(project_template.read_text())
+        results = {}
+        for name, minify in (("plain", False), ("minified", True)):
+            dest = Path(tmp) / name
+            plan = collect_pages(content, dest)
+            def build():
+                for from_path, dest_path in plan:
+                    generate_page(from_path, template, dest_path, "/bench/", verbose=False, minify=minify)
+            seconds, _ = _best_of(repeat, build)
+            size = sum(Path(dest_path).stat().st_size for _, dest_path in plan)
+            results[name] = (seconds, size)
+    (plain_s, plain_b), (min_s, min_b) = results["plain"], results["minified"]
+    return {
+        "pages": pages,
+        "bytes": {"plain": plain_b, "minified": min_b},
+        "saved_pct": round(100 * (plain_b - min_b) / plain_b, 2),
+        "seconds": {"plain": round(plain_s, 6), "minified": round(min_s, 6)},
+        "added_pct": round(100 * (min_s - plain_s) / plain_s, 2),
+    }
+
+# link/image inputs that are expensive for a backtracking url pattern
+PATHOLOGICAL = {
+    "unclosed_url": lambda n: "[a](" + "x" * n,
+    "unclosed_group": lambda n: "[a](x(" + "y" * n,
+    "nested_opens": lambda n: "[a](" + "x(" * (n // 2),
+    "link_prefixes": lambda n: "[a](b" * (n // 5),
+    "image_prefixes": lambda n: "![a](b c" * (n // 8),
+    "bracket_soup": lambda n: "[](" * (n // 3),
+}
+
+def _inline_or_error(text):
+    try:
+        return text_to_textnodes(text)
+    except Exception:
+        return None
+
+def bench_pathological(chars = 100000, repeat = 3):
+    results = {}
+    for name, make in PATHOLOGICAL.items():
+        text = make(chars)
+        def scan():
+            extract_markdown_links(text)
+            extract_markdown_images(text)
+            _inline_or_error(text)
+        seconds, _ = _best_of(repeat, scan)
+        results[name] = {"chars": len(text), "seconds": {"scan": round(seconds, 6)}}
+    return results
+
+def _count_nodes(node):
+    count = 1
+    for child in node.children or ():
+        count += _count_nodes(child)
+    return count
+
+def bench_memory(paragraphs = 2000):
+    # peak traced memory while the TextNode lists and the html tree of a
+    # large page are alive at the same time
+    markdown = memory_corpus(paragraphs)
+    tracemalloc.start()
+    start = time.perf_counter()
+    text_nodes = [text_to_textnodes(block) for block in markdown.split("\n\n")]
+    tree = markdown_to_html_node(markdown)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_text = sum(len(nodes) for nodes in text_nodes)
+    n_html = _count_nodes(tree)
+    return {
+        "text_nodes": n_text,
+        "html_nodes": n_html,
+        "retained_bytes": current,
+        "peak_bytes": peak,
+        "bytes_per_node": round(current / (n_text + n_html), 1),
+        "seconds": round(elapsed, 4),
+    }
+
+# --- baselines --------------------------------------------------------------
+
+def timings(results):
+    # {"stages.1MB.to_html": seconds, ...} for every timed entry in results
+    flat = {}
+    for group, runs in results.items():
+        if not isinstance(runs, dict):
+            continue
+        for name, run in runs.items():
+            if isinstance(run, dict) and isinstance(run.get("seconds"), dict):
+                for stage, seconds in run["seconds"].items():
+                    flat[f"{group}.{name}.{stage}"] = seconds
+    return flat
+
+def compare(results, baseline, threshold = 0.10, min_seconds = 0.001):
+    # timings that got slower than baseline by more than threshold; timings
+    # missing from either side, or too short to time reliably, are skipped
+    now, before = timings(results), timings(baseline)
+    regressions = []
+    for key in sorted(now.keys() & before.keys()):
+        if before[key] < min_seconds:
+            continue
+        if now[key] > before[key] * (1 + threshold):
+            regressions.append({
+                "timing": key,
+                "baseline": before[key],
+                "current": now[key],
+                "change": round(now[key] / before[key] - 1, 3),
+            })
+    return regressions
+
+def _size_label(size):
+    for unit, scale in (("GB", 1024 ** 3), ("MB", 1024 ** 2), ("KB", 1024)):
+        if size >= scale and size % scale == 0:
+            return f"{size // scale}{unit}"
+    return f"{size}B"
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description="Benchmarks for the site generator")
+    parser.add_argument("--size", type=parse_size, action="append",
+                        help="document size for the stage timings, e.g. 1KB or 100MB (repeatable)")
+    parser.add_argument("--pages", type=int, action="append",
+                        help="page count for a full site build (repeatable)")
+    parser.add_argument("--page-size", type=parse_size, default=4096)
+    parser.add_argument("-j", "--jobs", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pathological-chars", type=int, default=100000,
+                        help="input length for the pathological link/image cases")
+    parser.add_argument("--memory", action="store_true", help="also run the node memory benchmark")
+    parser.add_argument("--paragraphs", type=int, default=2000)
+    parser.add_argument("-o", "--output", help="write the results to this file as well")
+    parser.add_argument("--baseline", help="compare against results saved earlier")
+    parser.add_argument("--save-baseline", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="allowed slowdown against the baseline, as a fraction (default 0.10)")
+    parser.add_argument("--min-seconds", type=float, default=0.001,
+                        help="baseline timings shorter than this are not compared")
+    args = parser.parse_args(argv)
+    sizes = args.size or [parse_size("1KB"), parse_size("100KB"), parse_size("1MB")]
+    pages = args.pages or [100]
+
+    results = {
+        "python": sys.version.split()[0],
+        "stages": {_size_label(size): bench_stages(size, args.repeat, args.seed) for size in sizes},
+        "site": {f"{n}_pages": bench_site(n, args.page_size, args.jobs, args.seed) for n in pages},
+        "pathological": bench_pathological(args.pathological_chars, args.repeat),
+        "minify": {f"{n}_pages": bench_minify(n, args.page_size, args.seed, args.repeat) for n in pages},
+    }
+    if args.memory:
+        results["memory"] = bench_memory(args.paragraphs)
+
+    regressions = []
+    if args.baseline:
+        baseline = json.loads(Path(args.baseline).read_text())
+        regressions = compare(results, baseline, args.threshold, args.min_seconds)
+        results["regressions"] = regressions
+
+    text = json.dumps(results, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+    if args.save_baseline:
+        Path(args.save_baseline).write_text(text + "\n")
+    if regressions:
+        for r in regressions:
+            print(f"regression: {r['timing']} {r['baseline']:.6f}s -> {r['current']:.6f}s "
+                  f"(+{r['change'] * 100:.1f}%)", file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,4 +1,5 @@
 from enum import Enum
+from typing import NamedTuple
 
 class BlockType(Enum):
     PARAGRAPH = "paragraph"
@@ -8,17 +9,100 @@ class BlockType(Enum):
     UNORDERED_LIST = "unordered_list"
     ORDERED_LIST = "ordered_list"
 
+class Block(NamedTuple):
+    block_type: BlockType
+    text: str
+    # the block's lines after stripping, i.e. text.split("\n")
+    lines: list
+    # line range in the source, 0-based and end-exclusive
+    start: int
+    end: int
+
+def _iter_lines(source):
+    # lines without their "\n", from a string or any iterable of lines such
+    # as an open file, without splitting a whole document up front
+    if isinstance(source, str):
+        pos = 0
+        while True:
+            i = source.find("\n", pos)
+            if i == -1:
+                yield source[pos:]
+                return
+            yield source[pos:i]
+            pos = i + 1
+    for line in source:
+        yield line[:-1] if line.endswith("\n") else line
+
+def _strip_lines(lines):
+    # "\n".join(lines).strip(), but keeping the lines apart
+    first, last = 0, len(lines)
+    while first < last and not lines[first].strip():
+        first += 1
+    while last > first and not lines[last - 1].strip():
+        last -= 1
+    lines = lines[first:last]
+    if lines:
+        lines[0] = lines[0].lstrip()
+        lines[-1] = lines[-1].rstrip()
+    return lines
+
+def _scan_line_groups(source):
+    # yields (stripped lines, start, end) for each block.  Blocks end at an
+    # empty line, except inside a ``` fence, so code keeps its blank lines.
+    group = []
+    start = 0
+    in_fence = False
+    has_content = False
+    n = 0
+    for n, line in enumerate(_iter_lines(source)):
+        if line == "" and not in_fence:
+            lines = _strip_lines(group)
+            if lines:
+                yield lines, start, n
+            group = []
+            has_content = False
+            continue
+        if not group:
+            start = n
+        stripped = line.strip()
+        if stripped == "```":
+            if in_fence:
+                in_fence = False
+            elif not has_content:
+                in_fence = True
+        if stripped:
+            has_content = True
+        group.append(line)
+    if in_fence:
+        # a fence that never closes does not swallow the rest of the file;
+        # split what was buffered on empty lines as if there was no fence
+        sub = []
+        for i, line in enumerate(group, start):
+            if line == "":
+                lines = _strip_lines(sub)
+                if lines:
+                    yield lines, i - len(sub), i
+                sub = []
+            else:
+                sub.append(line)
+        group = sub
+        start = n + 1 - len(sub)
+    lines = _strip_lines(group)
+    if lines:
+        yield lines, start, n + 1
+
+def scan_blocks(source):
+    # single pass over the source lines, yielding typed Blocks
+    for lines, start, end in _scan_line_groups(source):
+        text = "\n".join(lines)
+        yield Block(block_to_block_type(text, lines), text, lines, start, end)
+
 def markdown_to_blocks(string):
-    parts = string.split('\n\n')
-    new_parts = []
-    for part in parts:
-        tmp = part.strip()
-        if tmp:
-            new_parts.append(tmp)
-    return new_parts
+    return ["\n".join(lines) for lines, _, _ in _scan_line_groups(string)]
 
 
-def block_to_block_type(block):
+def block_to_block_type(block, lines = None):
+    # lines, when given, must be block.split("\n"); it saves splitting again
     if block[0] == '#':
         heading = False
         heading_count = 0
@@ -39,7 +123,7 @@ def block_to_block_type(block):
     elif block.startswith("```\n") and block.endswith("\n```"):
         return BlockType.CODE
     elif block[0] == ">":
-        parts = block.split("\n")
+        parts = lines if lines is not None else block.split("\n")
         is_quote = True
         for part in parts:
             if part[0] != (">"):
@@ -47,7 +131,7 @@ def block_to_block_type(block):
         if is_quote:
             return BlockType.QUOTE
     elif block.startswith("- "):
-        parts = block.split("\n")
+        parts = lines if lines is not None else block.split("\n")
         is_unordered_list = True
         for part in parts:
             if part[0:2] != ("- "):
@@ -55,7 +139,7 @@ def block_to_block_type(block):
         if is_unordered_list:
             return BlockType.UNORDERED_LIST
     elif block[0:3] == "1. ":
-        parts = block.split("\n")
+        parts = lines if lines is not None else block.split("\n")
         index = 1
         list_exited = False
         for part in parts:
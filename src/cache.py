@@ -0,0 +1,474 @@
+import argparse
+import hashlib
+import http.client
+import json
+import os
+import re
+import shutil
+import sys
+import urllib.error
+import urllib.request
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Lock
+
+# bump whenever block rendering changes, so on-disk entries from an older
+# generator are never served
+RENDER_CACHE_VERSION = 1
+
+# bump whenever anything changes the bytes of a rendered page; part of every
+# artifact key, so machines running different generators never share pages
+GENERATOR_VERSION = 1
+
+_KEY_RE = re.compile(r"[0-9a-f]{64}")
+
+# artifacts are copied to and from pages this much at a time, so a large
+# page is never held whole
+ARTIFACT_CHUNK = 1 << 16
+
+# what a backend may raise when a disk or a cache server misbehaves;
+# http.client's protocol errors, such as IncompleteRead, are not OSErrors
+_BACKEND_ERRORS = (OSError, http.client.HTTPException)
+
+class RenderCache():
+    # maps (block text, block type) to the block's rendered html.  The memory
+    # tier is an LRU bounded by max_entries; the optional disk tier keeps
+    # entries across builds and is trimmed to max_disk_bytes by prune().
+    def __init__(self, max_entries = 4096, cache_dir = None, namespace = "", max_disk_bytes = 256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.cache_dir = Path(cache_dir) if cache_dir is not None else None
+        # anything besides the block that changes its html, e.g. the base path
+        self.namespace = namespace
+        self.max_disk_bytes = max_disk_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def key(self, block, block_type, compact = False):
+        h = hashlib.sha256()
+        for part in (str(RENDER_CACHE_VERSION), self.namespace, block_type.value, block):
+            h.update(part.encode())
+            h.update(b"\0")
+        if compact:
+            h.update(b"compact\0")
+        return h.hexdigest()
+
+    def _disk_path(self, key):
+        return self.cache_dir / key[:2] / key
+
+    def get(self, key):
+        html = self.entries.get(key)
+        if html is not None:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return html
+        if self.cache_dir is not None:
+            try:
+                html = self._disk_path(key).read_text()
+            except FileNotFoundError:
+                html = None
+            if html is not None:
+                self.disk_hits += 1
+                self._remember(key, html)
+                return html
+        self.misses += 1
+        return None
+
+    def put(self, key, html):
+        self._remember(key, html)
+        if self.cache_dir is not None:
+            p = self._disk_path(key)
+            p.parent.mkdir(parents=True, exist_ok=True)
+            tmp = p.with_name(f"{key}.{os.getpid()}.tmp")
+            tmp.write_text(html)
+            os.replace(tmp, p)
+
+    def _remember(self, key, html):
+        self.entries[key] = html
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def prune(self):
+        # drop the least recently written disk entries until under budget
+        if self.cache_dir is None or not self.cache_dir.exists():
+            return 0
+        files = []
+        total = 0
+        for p in self.cache_dir.glob("*/*"):
+            st = p.stat()
+            files.append((st.st_mtime, st.st_size, p))
+            total += st.st_size
+        removed = 0
+        for _, size, p in sorted(files):
+            if total <= self.max_disk_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def add_stats(self, stats):
+        self.hits += stats["hits"]
+        self.disk_hits += stats["disk_hits"]
+        self.misses += stats["misses"]
+        self.evictions += stats["evictions"]
+
+    def stats(self):
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+    def summary(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        rate = 100 * (self.hits + self.disk_hits) / lookups if lookups else 0
+        return (f"render cache: {self.hits} hits, {self.disk_hits} disk hits, "
+                f"{self.misses} misses ({rate:.1f}% hit rate), {self.evictions} evictions")
+
+
+class DirectoryBackend():
+    # artifacts as files named by their key under root.  A hit touches the
+    # file, so prune() evicts the least recently used first.
+    def __init__(self, root, max_bytes = 1 << 30):
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return self.root / key[:2] / key
+
+    def get(self, key):
+        p = self._path(key)
+        try:
+            data = p.read_bytes()
+        except FileNotFoundError:
+            return None
+        os.utime(p)
+        return data
+
+    def open(self, key):
+        # a binary stream of the artifact, or None
+        p = self._path(key)
+        try:
+            stream = open(p, "rb")
+        except FileNotFoundError:
+            return None
+        os.utime(p)
+        return stream
+
+    def put(self, key, data):
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{key}.{os.getpid()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, p)
+
+    def put_file(self, key, path):
+        p = self._path(key)
+        p.parent.mkdir(parents=True, exist_ok=True)
+        tmp = p.with_name(f"{key}.{os.getpid()}.tmp")
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, p)
+
+    def _files(self):
+        if not self.root.exists():
+            return []
+        files = []
+        for p in self.root.glob("*/*"):
+            if _KEY_RE.fullmatch(p.name):
+                st = p.stat()
+                files.append((st.st_mtime, st.st_size, p))
+        return files
+
+    def prune(self):
+        files = self._files()
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, p in sorted(files):
+            if total <= self.max_bytes:
+                break
+            p.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        return removed
+
+    def stats(self):
+        files = self._files()
+        return {"backend": "directory", "location": str(self.root), "entries": len(files),
+                "bytes": sum(size for _, size, _ in files), "max_bytes": self.max_bytes}
+
+class _SizedResponse():
+    # an http response read in chunks.  read(n) on a connection that drops
+    # early just ends, so the body is counted against its Content-Length.
+    def __init__(self, response):
+        self.response = response
+        self.remaining = int(response.headers.get("Content-Length") or 0)
+
+    def read(self, n):
+        chunk = self.response.read(n)
+        self.remaining -= len(chunk)
+        if not chunk and self.remaining > 0:
+            raise http.client.IncompleteRead(b"", self.remaining)
+        return chunk
+
+    def close(self):
+        self.response.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class HTTPBackend():
+    # GET and PUT {url}/{key}, 404 being a miss; the server evicts on its own
+    def __init__(self, url, timeout = 5):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+
+    def get(self, key):
+        try:
+            with urllib.request.urlopen(f"{self.url}/{key}", timeout=self.timeout) as response:
+                return response.read()
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code == 404:
+                return None
+            raise
+
+    def open(self, key):
+        try:
+            return _SizedResponse(urllib.request.urlopen(f"{self.url}/{key}", timeout=self.timeout))
+        except urllib.error.HTTPError as e:
+            e.close()
+            if e.code == 404:
+                return None
+            raise
+
+    def put(self, key, data):
+        request = urllib.request.Request(f"{self.url}/{key}", data=data, method="PUT")
+        with urllib.request.urlopen(request, timeout=self.timeout):
+            pass
+
+    def put_file(self, key, path):
+        # sent from the file as it is read; the length is given up front,
+        # since the server refuses uploads without one
+        with open(path, "rb") as fp:
+            request = urllib.request.Request(f"{self.url}/{key}", data=fp, method="PUT",
+                                             headers={"Content-Length": str(os.fstat(fp.fileno()).st_size)})
+            with urllib.request.urlopen(request, timeout=self.timeout):
+                pass
+
+    def prune(self):
+        return 0
+
+    def stats(self):
+        with urllib.request.urlopen(f"{self.url}/", timeout=self.timeout) as response:
+            return json.load(response)
+
+def open_backend(location, max_bytes = 1 << 30):
+    # a URL for a shared cache server, anything else is a local directory
+    if str(location).startswith(("http://", "https://")):
+        return HTTPBackend(str(location))
+    return DirectoryBackend(location, max_bytes)
+
+class ArtifactError(Exception):
+    # an artifact that broke off while it was being read; the page is
+    # rendered instead
+    pass
+
+class ArtifactCache():
+    # whole rendered pages, keyed by everything their bytes depend on, so an
+    # entry never goes stale and any machine may reuse any other's.  Backend
+    # failures only cost a render: they are counted, never raised.
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.errors = 0
+
+    def key(self, source_hash, template, base_path):
+        h = hashlib.sha256()
+        for part in (str(GENERATOR_VERSION), source_hash, template.digest, base_path):
+            h.update(part.encode())
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def get(self, key):
+        # the artifact as an iterator of byte chunks, or None.  A backend
+        # that fails partway through raises ArtifactError from the iterator.
+        stream = None
+        try:
+            stream = self.backend.open(key)
+            first = stream.read(ARTIFACT_CHUNK) if stream is not None else b""
+        except _BACKEND_ERRORS:
+            if stream is not None:
+                stream.close()
+            self.errors += 1
+            return None
+        if not first:
+            # an empty payload is never a rendered page
+            if stream is not None:
+                stream.close()
+            self.misses += 1
+            return None
+        self.hits += 1
+        return self._chunks(stream, first)
+
+    def _chunks(self, stream, first):
+        with stream:
+            yield first
+            try:
+                while chunk := stream.read(ARTIFACT_CHUNK):
+                    yield chunk
+            except _BACKEND_ERRORS as e:
+                self.hits -= 1
+                self.errors += 1
+                raise ArtifactError(str(e)) from e
+
+    def put(self, key, path):
+        # stores the finished page at path
+        try:
+            self.backend.put_file(key, path)
+        except _BACKEND_ERRORS:
+            self.errors += 1
+            return
+        self.stores += 1
+
+    def add_stats(self, stats):
+        self.hits += stats["hits"]
+        self.misses += stats["misses"]
+        self.stores += stats["stores"]
+        self.errors += stats["errors"]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "stores": self.stores, "errors": self.errors}
+
+    def summary(self):
+        lookups = self.hits + self.misses
+        rate = 100 * self.hits / lookups if lookups else 0
+        return (f"artifact cache: {self.hits} hits, {self.misses} misses ({rate:.1f}% hit rate), "
+                f"{self.stores} stored, {self.errors} errors")
+
+class _ArtifactHandler(BaseHTTPRequestHandler):
+    # GET / for stats, GET and PUT /{key} for artifacts
+    server_version = "ssg-artifacts/1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, status, body = b"", content_type = "application/octet-stream"):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _key(self):
+        key = self.path.strip("/")
+        if not _KEY_RE.fullmatch(key):
+            self._reply(400, b"bad key\n", "text/plain")
+            return None
+        return key
+
+    def do_GET(self):
+        backend = self.server.backend
+        if self.path == "/":
+            self._reply(200, json.dumps(backend.stats(), indent=1).encode(), "application/json")
+            return
+        key = self._key()
+        if key is None:
+            return
+        stream = backend.open(key)
+        if stream is None:
+            self._reply(404, b"not cached\n", "text/plain")
+            return
+        with stream:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(os.fstat(stream.fileno()).st_size))
+            self.end_headers()
+            shutil.copyfileobj(stream, self.wfile, ARTIFACT_CHUNK)
+
+    def do_PUT(self):
+        key = self._key()
+        if key is None:
+            return
+        length = self.headers.get("Content-Length")
+        if length is None:
+            self._reply(411, b"length required\n", "text/plain")
+            return
+        try:
+            length = int(length)
+        except ValueError:
+            self._reply(400, b"bad length\n", "text/plain")
+            return
+        # a client that hung up mid-upload leaves a short body; storing it
+        # would hand every other builder a truncated page as a hit
+        data = self.rfile.read(length) if length > 0 else b""
+        if not data or len(data) != length:
+            self.close_connection = True
+            self._reply(400, b"incomplete body\n", "text/plain")
+            return
+        with self.server.lock:
+            self.server.backend.put(key, data)
+            self.server.puts += 1
+            # trimming walks the whole directory, so not after every page
+            if self.server.puts % 64 == 0:
+                self.server.backend.prune()
+        self._reply(204)
+
+def make_artifact_server(backend, port = 8899, host = "127.0.0.1"):
+    # serves a directory backend to other machines' HTTPBackend, which only
+    # reach it when host is an address they can route to.  PUTs are not
+    # authenticated: anyone who can connect can store pages for every build.
+    server = ThreadingHTTPServer((host, port), _ArtifactHandler)
+    server.backend = backend
+    server.lock = Lock()
+    server.puts = 0
+    return server
+
+def main(argv = None):
+    default_dir = Path(__file__).parent.parent / ".artifacts"
+    parser = argparse.ArgumentParser(description="Inspect, trim or serve the shared artifact cache")
+    parser.add_argument("command", choices=["stats", "prune", "serve"])
+    parser.add_argument("location", nargs="?", default=default_dir,
+                        help="cache directory, or for stats a cache server URL (default .artifacts/)")
+    parser.add_argument("--max-mb", type=int, default=1024,
+                        help="size the directory is trimmed to, least recently used first (default 1024)")
+    parser.add_argument("--port", type=int, default=8899, help="port for serve (default 8899)")
+    parser.add_argument("--host", default="127.0.0.1",
+                        help="address serve listens on; 0.0.0.0 lets other machines in, and since uploads are "
+                             "not authenticated, only do that on a trusted network (default 127.0.0.1)")
+    args = parser.parse_args(argv)
+    backend = open_backend(args.location, args.max_mb * 1024 * 1024)
+    if args.command != "stats" and not isinstance(backend, DirectoryBackend):
+        parser.error(f"{args.command} needs a local directory")
+    if args.command == "stats":
+        try:
+            print(json.dumps(backend.stats(), indent=1))
+        except _BACKEND_ERRORS as e:
+            sys.exit(f"{args.location}: {e}")
+    elif args.command == "prune":
+        print(f"Removed {backend.prune()} artifacts")
+        print(json.dumps(backend.stats(), indent=1))
+    else:
+        server = make_artifact_server(backend, args.port, args.host)
+        host, port = server.server_address[:2]
+        print(f"Serving artifacts from {backend.root} on http://{host}:{port} (uploads are not authenticated)")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import gzip
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from output import temp_path
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# outputs worth compressing; images and fonts already are
+COMPRESSIBLE_SUFFIXES = frozenset({".html", ".htm", ".css", ".js", ".mjs", ".json", ".map",
+                                   ".svg", ".xml", ".txt", ".md", ".csv", ".ico", ".wasm"})
+
+# every suffix a compressed sibling may have, whether or not its encoder is
+# installed, so siblings left by an earlier build are still cleaned up
+SIBLING_SUFFIXES = (".gz", ".br")
+
+def _gzip(data):
+    # mtime=0 so the same page always compresses to the same bytes
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+def _brotli(data):
+    return brotli.compress(data, quality=11)
+
+def encoders():
+    # (suffix, compress) for every encoding available here
+    found = [(".gz", _gzip)]
+    if brotli is not None:
+        found.append((".br", _brotli))
+    return found
+
+def is_compressible(path):
+    return os.path.splitext(str(path))[1].lower() in COMPRESSIBLE_SUFFIXES
+
+def siblings(path):
+    return [f"{path}{suffix}" for suffix in SIBLING_SUFFIXES]
+
+def _is_current(path, sibling):
+    try:
+        return os.stat(sibling).st_mtime_ns >= os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return False
+
+def compress_file(path, min_bytes = 256, max_ratio = 0.9):
+    # returns [(sibling, "written" | "removed" | "small" | "ratio")].  A file
+    # too small or compressing too poorly gets no sibling, and loses any an
+    # earlier build left, which would now be out of date
+    data = Path(path).read_bytes()
+    results = []
+    for suffix, compress in encoders():
+        sibling = Path(f"{path}{suffix}")
+        if len(data) < min_bytes:
+            reason = "small"
+        else:
+            packed = compress(data)
+            reason = "ratio" if len(packed) > len(data) * max_ratio else None
+        if reason is not None:
+            if sibling.exists():
+                sibling.unlink()
+                results.append((str(sibling), "removed"))
+            results.append((str(sibling), reason))
+            continue
+        tmp = temp_path(sibling)
+        try:
+            tmp.write_bytes(packed)
+            os.replace(tmp, sibling)
+        except BaseException:
+            tmp.unlink(missing_ok=True)
+            raise
+        results.append((str(sibling), "written"))
+    return results
+
+class CompressStats():
+    def __init__(self):
+        self.written = 0
+        self.small = 0
+        self.ratio = 0
+        self.removed = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    def summary(self):
+        names = ", ".join(suffix[1:] for suffix, _ in encoders())
+        saved = f", {self.bytes_in} -> {self.bytes_out} bytes" if self.written else ""
+        return (f"Precompressed {self.written} files ({names}){saved}; skipped {self.small} small "
+                f"and {self.ratio} incompressible, removed {self.removed} stale")
+
+def precompress(changes, jobs = 8, min_bytes = 256, max_ratio = 0.9):
+    # compresses the text outputs this build changed, plus any whose siblings
+    # are missing or older (the first build with this on, or after a skip),
+    # and drops the siblings of outputs the build removed
+    stats = CompressStats()
+    for path in list(changes.removed_paths):
+        _drop_siblings(path, changes, stats)
+    todo = [path for path in sorted(changes.outputs) if is_compressible(path) and (path in changes.changed
+            or not all(_is_current(path, f"{path}{suffix}") for suffix, _ in encoders()))]
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(lambda path: compress_file(path, min_bytes, max_ratio), todo))
+    for path, outcome in zip(todo, results):
+        for sibling, what in outcome:
+            if what == "written":
+                stats.written += 1
+                stats.bytes_in += os.stat(path).st_size
+                stats.bytes_out += os.stat(sibling).st_size
+                changes.record(sibling, True)
+            elif what == "removed":
+                stats.removed += 1
+                changes.record_removed(sibling)
+            else:
+                setattr(stats, what, getattr(stats, what) + 1)
+    return stats
+
+def _drop_siblings(path, changes, stats = None):
+    for sibling in siblings(path):
+        if os.path.exists(sibling):
+            os.unlink(sibling)
+            changes.record_removed(sibling)
+            if stats is not None:
+                stats.removed += 1
+
+def compressed_siblings(changes):
+    # the compressed sibling of every output this build produced, mapped to
+    # its output
+    return {sibling: path for path in sorted(changes.outputs)
+            for sibling in siblings(path) if os.path.exists(sibling)}
+
+def keep_compressed(changes):
+    # compressed siblings of this build's outputs are outputs too, so
+    # remove_unexpected leaves them alone
+    changes.outputs.update(compressed_siblings(changes))
+
+def discard_compressed(changes):
+    # with precompression off, siblings of changed or removed outputs would
+    # be served out of date, so they go
+    for path in sorted(changes.changed) + list(changes.removed_paths):
+        _drop_siblings(path, changes)
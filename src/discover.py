@@ -0,0 +1,102 @@
+import hashlib
+import os
+import re
+from fnmatch import translate
+from functools import lru_cache
+
+# matched against each path component, or against the whole relative path
+# when the pattern has a "/": dotfiles, editor swap and backup files, drafts
+DEFAULT_IGNORE = (".*", "*~", "#*#", "*.swp", "*.swo", "*.swx", "*.tmp", "drafts", "*.draft.md")
+
+PAGE_SUFFIX = ".md"
+
+def is_page(rel):
+    return rel.endswith(PAGE_SUFFIX)
+
+def page_dest(rel, dest_dir):
+    # "blog/post.md" -> "{dest_dir}/blog/post.html"
+    return f"{dest_dir}/{rel[:-len(PAGE_SUFFIX)]}.html"
+
+@lru_cache(maxsize=8)
+def _compile_ignore(ignore):
+    # (name regex, path regex), each None when it has no patterns; one match
+    # per entry instead of one fnmatch per pattern
+    def combined(patterns):
+        return re.compile("|".join(translate(p) for p in patterns)) if patterns else None
+    return (combined([p for p in ignore if "/" not in p]),
+            combined([p for p in ignore if "/" in p]))
+
+def _ignored(name, rel, compiled):
+    names_re, paths_re = compiled
+    return ((names_re is not None and names_re.match(name) is not None)
+            or (paths_re is not None and paths_re.match(rel) is not None))
+
+def is_ignored(rel, ignore = DEFAULT_IGNORE):
+    # rel is "/"-separated and relative to content/; any ignored component
+    # ignores everything below it
+    compiled = _compile_ignore(tuple(ignore))
+    parts = rel.split("/")
+    return any(_ignored(name, "/".join(parts[:i + 1]), compiled) for i, name in enumerate(parts))
+
+def shard_of(rel, count):
+    # which of count shards builds rel, 0-based; a digest rather than hash()
+    # so every machine and every run agrees
+    digest = hashlib.sha1(rel.encode()).digest()
+    return int.from_bytes(digest[:8], "big") % count
+
+class BuildPlan():
+    # everything a build will produce, known before any page is rendered
+    def __init__(self, root = ""):
+        # the content directory the sources were found under
+        self.root = root
+        # (source, dest) of every markdown page, in path order
+        self.pages = []
+        # (source, dest, stat) of every other file under content/
+        self.assets = []
+        # relative paths skipped by an ignore pattern
+        self.ignored = []
+
+    def summary(self):
+        return f"Planned {len(self.pages)} pages, {len(self.assets)} assets ({len(self.ignored)} ignored)"
+
+    def shard(self, index, count):
+        # the part of the plan shard index of count (1-based) builds, split on
+        # the source path relative to content/ so the split is the same on
+        # every machine whatever the checkout is called
+        part = BuildPlan(self.root)
+        prefix = len(self.root) + 1
+        mine = lambda source: shard_of(source[prefix:], count) == index - 1
+        part.pages = [page for page in self.pages if mine(page[0])]
+        part.assets = [asset for asset in self.assets if mine(asset[0])]
+        part.ignored = self.ignored
+        return part
+
+def discover(content_dir, dest_dir, ignore = DEFAULT_IGNORE):
+    # one scandir per directory, walked with an explicit stack; DirEntry
+    # answers is_dir/is_file and stat from what the listing already returned
+    plan = BuildPlan(str(content_dir))
+    compiled = _compile_ignore(tuple(ignore))
+    dest_dir = str(dest_dir)
+    stack = [(str(content_dir), "")]
+    while stack:
+        root, rel = stack.pop()
+        with os.scandir(root) as it:
+            for entry in it:
+                entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+                # parents were checked on the way down
+                if _ignored(entry.name, entry_rel, compiled):
+                    plan.ignored.append(entry_rel)
+                elif entry.is_dir():
+                    stack.append((entry.path, entry_rel))
+                elif not entry.is_file():
+                    continue
+                elif is_page(entry.name):
+                    plan.pages.append((entry.path, page_dest(entry_rel, dest_dir)))
+                else:
+                    plan.assets.append((entry.path, f"{dest_dir}/{entry_rel}", entry.stat()))
+    # the same order as a sorted depth-first walk, whatever scandir returned
+    by_path = lambda item: item[0].split("/")
+    plan.pages.sort(key=by_path)
+    plan.assets.sort(key=by_path)
+    plan.ignored.sort()
+    return plan
@@ -1,6 +1,24 @@
+import re
 from typing import final
 
+# elements that take no content and no end tag
+VOID_TAGS = frozenset({"area", "base", "br", "col", "embed", "hr", "img", "input", "link", "meta", "source", "track", "wbr"})
+# elements whose text is shown as written; compact output leaves them alone
+PRESERVE_TAGS = frozenset({"pre", "code", "textarea", "script", "style"})
+# html whitespace; a no-break space is text and never collapsed
+_WHITESPACE_RE = re.compile(r"[ \t\n\r\f]+")
+
+def collapse_whitespace(text):
+    # what a browser shows of ordinary text: every run as one space.  Most
+    # fragments have only single spaces, which a few substring checks rule
+    # out far faster than the regex can
+    if "  " not in text and "\n" not in text and "\t" not in text and "\r" not in text and "\f" not in text:
+        return text
+    return _WHITESPACE_RE.sub(" ", text)
+
 class HTMLNode():
+    __slots__ = ("tag", "value", "children", "props")
+
     def __init__(self, tag = None, value = None, children = None, props = None):
         self.tag = tag
         self.value = value
@@ -10,8 +28,14 @@ class HTMLNode():
     def __repr__(self):
         return f"tag = {self.tag}, val = {self.value}, children = {self.children}, props = {self.props_to_html()}"
 
-    def to_html(self):
+    # compact output collapses whitespace runs in text outside PRESERVE_TAGS
+    # and drops the end tag of empty void elements, as it serializes
+    def to_html(self, compact = False):
+        return "".join(self.iter_html(compact))
+    def iter_html(self, compact = False):
         raise NotImplementedError("to html isnt implemented yet")
+    def write_html(self, fp, compact = False):
+        fp.writelines(self.iter_html(compact))
     def props_to_html(self):
         retstr = ""
         if self.props:
@@ -20,23 +44,52 @@ class HTMLNode():
         return retstr
 
 class LeafNode(HTMLNode):
+    __slots__ = ()
+
     @final
     def __init__(self, tag, value, props = None):
-        super().__init__(tag, value, None, props)
-    def to_html(self):
+        # set the slots directly; this runs once per inline fragment
+        self.tag = tag
+        self.value = value
+        self.children = None
+        self.props = props
+    def to_html(self, compact = False):
         if self.value is None:
             raise ValueError("value was none")
         if not self.tag:
-            return self.value
+            return collapse_whitespace(self.value) if compact else self.value
         propstr = ""
         if self.props:
             propstr = self.props_to_html()
-        return f"<{self.tag}{propstr}>{self.value}</{self.tag}>"
+        value = self.value
+        if compact:
+            if not value and self.tag in VOID_TAGS:
+                return f"<{self.tag}{propstr}>"
+            if self.tag not in PRESERVE_TAGS:
+                value = collapse_whitespace(value)
+        return f"<{self.tag}{propstr}>{value}</{self.tag}>"
+    def iter_html(self, compact = False):
+        yield self.to_html(compact)
+
+class RawHTMLNode(LeafNode):
+    # html serialized earlier, e.g. a block from the render cache, which was
+    # made compact or not then; it is passed through either way
+    __slots__ = ()
+
+    def to_html(self, compact = False):
+        if self.value is None:
+            raise ValueError("value was none")
+        return self.value
 
 class ParentNode(HTMLNode):
+    __slots__ = ()
+
     def __init__(self, tag, children, props = None):
-        super().__init__(tag, None, children, props)
-    def to_html(self):
+        self.tag = tag
+        self.value = None
+        self.children = children
+        self.props = props
+    def open_tag(self):
         if not self.tag:
             raise ValueError("tag was none")
         if not self.children:
@@ -44,8 +97,21 @@ class ParentNode(HTMLNode):
         propstr = ""
         if self.props:
             propstr = self.props_to_html()
-        retstr = f"<{self.tag}{propstr}>"
-        for i in self.children:
-            retstr += i.to_html()
-        retstr += f"</{self.tag}>"
-        return retstr
+        return f"<{self.tag}{propstr}>"
+    def iter_html(self, compact = False):
+        # walk the subtree with an explicit stack so every chunk is yielded
+        # exactly once, instead of being re-copied at each level above it.
+        # Compact output stops below the first preserved element.
+        yield self.open_tag()
+        stack = [(self, iter(self.children), compact and self.tag not in PRESERVE_TAGS)]
+        while stack:
+            node, children, squeeze = stack[-1]
+            for child in children:
+                if isinstance(child, ParentNode):
+                    yield child.open_tag()
+                    stack.append((child, iter(child.children), squeeze and child.tag not in PRESERVE_TAGS))
+                    break
+                yield from child.iter_html(squeeze)
+            else:
+                stack.pop()
+                yield f"</{node.tag}>"
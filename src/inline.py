@@ -1,29 +1,95 @@
-from textnode import TextNode, TextType
+from textnode import TextNode, TextType, text_fragment_to_html
+from bisect import bisect_right
+from typing import NamedTuple
 import re
 
-# URL allows balanced parentheses groups, but does not allow spaces.
-# Handles parentheses (one level deep) inside the URL.
-_MD_URL = r"[^()\s]+(?:\([^()\s]*\)[^()\s]*)*"
+# A link or image is [label](url).  The label has no brackets; the url has no
+# spaces and may hold parenthesised groups one level deep, e.g. wiki/Foo_(bar).
+# It used to be one regex with nested quantifiers; it is scanned by hand now,
+# with runs of ordinary characters matched by single-class patterns, so every
+# character is visited a bounded number of times whatever the parentheses do.
+_LABEL_RUN = re.compile(r"[^\[\]]*")
+_URL_RUN = re.compile(r"[^()\s]*")
+
+def _scan_link(text, i):
+    # text[i] is "[": returns (label, url, url_start, end) for a whole
+    # [label](url) starting there, or None
+    j = _LABEL_RUN.match(text, i + 1).end()
+    if not text.startswith("](", j):
+        return None
+    url_start = j + 2
+    k = _URL_RUN.match(text, url_start).end()
+    if k == url_start:
+        return None
+    n = len(text)
+    while k < n and text[k] == "(":
+        k = _URL_RUN.match(text, k + 1).end()
+        if k == n or text[k] != ")":
+            return None
+        k = _URL_RUN.match(text, k + 1).end()
+    if k == n or text[k] != ")":
+        return None
+    return text[i + 1:j], text[url_start:k], url_start, k + 1
+
+def _find_links(text, image):
+    # (start, end, label, url, url_start) of every image, or every link not
+    # preceded by "!", left to right and non-overlapping
+    opener = "![" if image else "["
+    i = text.find(opener)
+    while i != -1:
+        if not image and i > 0 and text[i - 1] == "!":
+            i = text.find(opener, i + 1)
+            continue
+        found = _scan_link(text, i + len(opener) - 1)
+        if found is None:
+            i = text.find(opener, i + 1)
+            continue
+        label, url, url_start, end = found
+        yield i, end, label, url, url_start
+        i = text.find(opener, end)
+
+_IMAGE_OPEN_RE = re.compile(r"!\[")
+_LINK_OPEN_RE = re.compile(r"(?<!!)\[")  # any link-like "[" not preceded by "!"
+
+def _find_openers(text, image):
+    open_re = _IMAGE_OPEN_RE if image else _LINK_OPEN_RE
+    return [m.start() for m in open_re.finditer(text)]
 
 def extract_markdown_images(text):
-    return re.findall(rf"!\[([^\[\]]*)\]\(({_MD_URL})\)", text)
+    return [(label, url) for _, _, label, url, _ in _find_links(text, True)]
 
 def extract_markdown_links(text):
-    return re.findall(rf"(?<!!)\[([^\[\]]*)\]\(({_MD_URL})\)", text)
-
-_IMAGE_TOKEN_RE = re.compile(rf"!\[([^\[\]]*)\]\(({_MD_URL})\)")
-_IMAGE_OPEN_RE  = re.compile(r"!\[")
+    return [(label, url) for _, _, label, url, _ in _find_links(text, False)]
 
 def _protected_url_spans(text: str):
     spans = []
-    for m in _LINK_TOKEN_RE.finditer(text):
-        spans.append(m.span(2))   # protect only the URL
-    for m in _IMAGE_TOKEN_RE.finditer(text):
-        spans.append(m.span(2))
-    return spans
+    for image in (False, True):
+        for _, _, _, url, url_start in _find_links(text, image):
+            spans.append((url_start, url_start + len(url)))   # protect only the URL
+    return _merge_spans(spans)
+
+def _merge_spans(spans):
+    # sorted, non-overlapping (starts, ends) so lookups can bisect
+    starts = []
+    ends = []
+    for s, e in sorted(spans):
+        if ends and s <= ends[-1]:
+            ends[-1] = max(ends[-1], e)
+        else:
+            starts.append(s)
+            ends.append(e)
+    return starts, ends
+
+def _span_end(i: int, spans):
+    # end of the protected span containing i, or -1 if i is unprotected
+    starts, ends = spans
+    j = bisect_right(starts, i) - 1
+    if j >= 0 and i < ends[j]:
+        return ends[j]
+    return -1
 
 def _index_in_spans(i: int, spans):
-    return any(s <= i < e for s, e in spans)
+    return _span_end(i, spans) != -1
 
 def split_nodes_delimiter(old_nodes, delimiter, text_type):
     new_list = []
@@ -37,41 +103,30 @@ def split_nodes_delimiter(old_nodes, delimiter, text_type):
         text = node.text
         spans = _protected_url_spans(text)
 
-        # count delimiter occurrences OUTSIDE protected spans
-        count = 0
-        i = 0
-        while i <= len(text) - dlen:
-            if text[i:i+dlen] == delimiter and not _index_in_spans(i, spans):
-                count += 1
-                i += dlen
+        # find delimiter occurrences OUTSIDE protected spans, jumping straight
+        # from one candidate to the next and over whole protected spans
+        marks = []
+        i = text.find(delimiter)
+        while i != -1:
+            end = _span_end(i, spans)
+            if end != -1:
+                i = text.find(delimiter, end)
             else:
-                i += 1
+                marks.append(i)
+                i = text.find(delimiter, i + dlen)
 
-        if count % 2 != 0:
+        if len(marks) % 2 != 0:
             raise Exception("no even amount of delimiters")
 
-        # split on delimiter occurrences OUTSIDE protected spans
-        parts = []
-        buf = []
-        i = 0
+        # split on those occurrences; odd-numbered parts are delimited
+        pos = 0
         toggle = False
-        while i < len(text):
-            if i <= len(text) - dlen and text[i:i+dlen] == delimiter and not _index_in_spans(i, spans):
-                parts.append(("".join(buf), toggle))
-                buf = []
-                toggle = not toggle
-                i += dlen
-            else:
-                buf.append(text[i])
-                i += 1
-        parts.append(("".join(buf), toggle))
-
-        for part, is_delimited in parts:
-            if not part and is_delimited:
-                new_list.append(TextNode("", text_type))
-            if not part:
-                continue
-            new_list.append(TextNode(part, text_type if is_delimited else TextType.TEXT))
+        for i in marks + [len(text)]:
+            part = text[pos:i]
+            if part or toggle:
+                new_list.append(TextNode(part, text_type if toggle else TextType.TEXT))
+            pos = i + dlen
+            toggle = not toggle
 
     return new_list
 
@@ -125,11 +180,18 @@ def new_old_split_nodes_delimiter(old_nodes, delimiter, text_type):
 
     return new_list
 
-def split_nodes_images_helper(text):
-    pattern = rf"!\[[^\]]*\]\({_MD_URL}\)"
-    return re.sub(pattern, ",", text)
+def _all_openers_covered(opens, matches):
+    # both lists are in text order, so a single merge walk tells whether every
+    # opener starts inside some token
+    j = 0
+    for i in opens:
+        while j < len(matches) and matches[j][1] <= i:
+            j += 1
+        if j == len(matches) or matches[j][0] > i:
+            return False
+    return True
 
-def split_nodes_image(old_nodes):
+def _split_nodes_tokens(old_nodes, image, text_type, error):
     new_list = []
     for node in old_nodes:
         if node.text_type != TextType.TEXT:
@@ -137,72 +199,113 @@ def split_nodes_image(old_nodes):
             continue
         text = node.text
 
-        # Validate: any image-like opener must belong to a valid token
-        opens = list(_IMAGE_OPEN_RE.finditer(text))
-        matches = list(_IMAGE_TOKEN_RE.finditer(text))
-        if opens:
-            covered = [False] * len(opens)
-            for m in matches:
-                s, e = m.span()
-                for j, o in enumerate(opens):
-                    if s <= o.start() < e:
-                        covered[j] = True
-            if not all(covered):
-                raise Exception("Invalid markdown image")
-        images = extract_markdown_images(text)
-        string_parts = split_nodes_images_helper(text).split(',')
-        for i, part in enumerate(string_parts):
-            if part:
-                new_list.append(TextNode(part, TextType.TEXT))
-            if i < len(images):
-                new_list.append(TextNode(images[i][0], TextType.IMAGE, images[i][1]))
+        # Validate: any opener must belong to a valid token
+        matches = list(_find_links(text, image))
+        if not _all_openers_covered(_find_openers(text, image), matches):
+            raise Exception(error)
 
-    return new_list
+        pos = 0
+        for start, end, label, url, _ in matches:
+            if start > pos:
+                new_list.append(TextNode(text[pos:start], TextType.TEXT))
+            new_list.append(TextNode(label, text_type, url))
+            pos = end
+        if pos < len(text):
+            new_list.append(TextNode(text[pos:], TextType.TEXT))
 
-_LINK_TOKEN_RE = re.compile(rf"(?<!!)\[([^\[\]]*)\]\(({_MD_URL})\)")
-_LINK_OPEN_RE  = re.compile(r"(?<!!)\[")  # any link-like "[" not preceded by "!"
+    return new_list
 
-def split_nodes_links_helper(text):
-    # links only, not images
-    pattern = rf"(?<!!)\[[^\]]*\]\({_MD_URL}\)"
-    return re.sub(pattern, ",", text)
+def split_nodes_image(old_nodes):
+    return _split_nodes_tokens(old_nodes, True, TextType.IMAGE, "Invalid markdown image")
 
 def split_nodes_link(old_nodes):
-    new_list = []
-    for node in old_nodes:
-        if node.text_type != TextType.TEXT:
-            new_list.append(node)
-            continue
-        text = node.text
+    return _split_nodes_tokens(old_nodes, False, TextType.LINK, "Invalid markdown link")
 
-        # 1) Validate: any link-like opener must belong to a valid token
-        opens = list(_LINK_OPEN_RE.finditer(text))
-        matches = list(_LINK_TOKEN_RE.finditer(text))
-        if opens:
-            covered = [False] * len(opens)
-            for m in matches:
-                s, e = m.span()
-                for j, o in enumerate(opens):
-                    if s <= o.start() < e:
-                        covered[j] = True
-            if not all(covered):
-                raise Exception("Invalid markdown link")
+# A paragraph is scanned a single time for every inline construct.  Image and
+# link tokens are taken whole, which keeps their URLs (and labels) from being
+# mistaken for emphasis delimiters; a "[" or "![" that does not start a valid
+# token is kept as an "open" token.
+_INLINE_MARK_RE = re.compile(r"\*\*|_|`|!?\[")
 
-        links = extract_markdown_links(text)
-        string_parts = split_nodes_links_helper(text).split(',')
-        for i, part in enumerate(string_parts):
-            if part:
-                new_list.append(TextNode(part, TextType.TEXT))
-            if i < len(links):
-                new_list.append(TextNode(links[i][0], TextType.LINK, links[i][1]))
+class _Token(NamedTuple):
+    kind: str       # "image", "link", "delim" or "open"
+    start: int
+    end: int
+    text: str       # the delimiter or opener, or the image alt / link label
+    url: str = None
 
-    return new_list
+def _inline_tokens(text):
+    tokens = []
+    search = _INLINE_MARK_RE.search
+    m = search(text)
+    while m is not None:
+        mark = m.group()
+        if mark[-1] == "[":
+            found = _scan_link(text, m.end() - 1)
+            if found is not None:
+                label, url, _, end = found
+                tokens.append(_Token("image" if mark == "![" else "link", m.start(), end, label, url))
+                m = search(text, end)
+                continue
+            tokens.append(_Token("open", m.start(), m.end(), mark))
+        else:
+            tokens.append(_Token("delim", m.start(), m.end(), mark))
+        m = search(text, m.end())
+    return tokens
+
+# delimiters in the order the old split_nodes_delimiter passes applied them;
+# an outer delimiter wins over anything inside its span
+_DELIMITERS = (("**", TextType.BOLD), ("_", TextType.ITALIC), ("`", TextType.CODE))
+
+def _tokenize_span(text, tokens, start, end, level, new_list, make):
+    # make(text, text_type, url=None) builds one output fragment
+    if level == len(_DELIMITERS):
+        pos = start
+        for t in tokens:
+            if t.kind == "open":
+                if t.text.startswith("!"):
+                    raise Exception("Invalid markdown image")
+                raise Exception("Invalid markdown link")
+            if t.start > pos:
+                new_list.append(make(text[pos:t.start], TextType.TEXT))
+            if t.kind == "image":
+                new_list.append(make(t.text, TextType.IMAGE, t.url))
+            elif "![" in t.url:
+                # the image pass runs before the link pass, so an image opener
+                # inside a link URL has always been rejected
+                raise Exception("Invalid markdown image")
+            else:
+                new_list.append(make(t.text, TextType.LINK, t.url))
+            pos = t.end
+        if pos < end:
+            new_list.append(make(text[pos:end], TextType.TEXT))
+        return
+
+    delimiter, text_type = _DELIMITERS[level]
+    marks = [i for i, t in enumerate(tokens) if t.kind == "delim" and t.text == delimiter]
+    if len(marks) % 2 != 0:
+        raise Exception("no even amount of delimiters")
+    pos = start
+    first = 0
+    for a, b in zip(marks[::2], marks[1::2]):
+        opener, closer = tokens[a], tokens[b]
+        _tokenize_span(text, tokens[first:a], pos, opener.start, level + 1, new_list, make)
+        new_list.append(make(text[opener.end:closer.start], text_type))
+        pos = closer.end
+        first = b + 1
+    _tokenize_span(text, tokens[first:], pos, end, level + 1, new_list, make)
 
 def text_to_textnodes(text):
-    new_list = [TextNode(text,TextType.TEXT)]
-    new_list = (split_nodes_delimiter(new_list, "**", TextType.BOLD))
-    new_list = (split_nodes_delimiter(new_list, "_", TextType.ITALIC))
-    new_list = (split_nodes_delimiter(new_list, "`", TextType.CODE))
-    new_list = (split_nodes_image(new_list))
-    new_list = (split_nodes_link(new_list))
+    tokens = _inline_tokens(text)
+    new_list = []
+    _tokenize_span(text, tokens, 0, len(text), 0, new_list, TextNode)
     return new_list
+
+def text_to_html_fragments(text, rewrite_url = None, compact = False):
+    # same tokenizer, but each fragment is emitted as its html string
+    def make(fragment, text_type, url = None):
+        return text_fragment_to_html(fragment, text_type, url, rewrite_url, compact)
+    tokens = _inline_tokens(text)
+    fragments = []
+    _tokenize_span(text, tokens, 0, len(text), 0, fragments, make)
+    return fragments
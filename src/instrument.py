@@ -0,0 +1,182 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager, nullcontext
+from pathlib import Path
+
+# page time histogram buckets, upper bounds in ms
+_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000)
+
+def percentile(values, p):
+    # nearest-rank percentile of an already sorted list
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * p // 100))
+    return values[int(rank) - 1]
+
+def _format_bytes(n):
+    for unit in ("B", "KB", "MB"):
+        if abs(n) < 1024:
+            return f"{n:.1f} {unit}" if unit != "B" else f"{n} B"
+        n /= 1024
+    return f"{n:.1f} GB"
+
+class NullProfiler():
+    # stands in when profiling is off: every hook is the same no-op context
+    enabled = False
+    _null = nullcontext()
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def page(self, source, dest):
+        return self._null
+
+    def stage(self, name):
+        return self._null
+
+NULL_PROFILER = NullProfiler()
+
+class Profiler():
+    # wall time and allocations per pipeline stage, totalled for the build and
+    # attributed to the page being rendered, plus a chrome://tracing event log
+    enabled = True
+
+    def __init__(self, trace_memory = True):
+        self.trace_memory = trace_memory
+        self.stages = {}
+        self.pages = []
+        self.events = []
+        self.peak_bytes = 0
+        self.elapsed = 0.0
+        self._page = None
+        self._tracing = False
+        self._origin = time.perf_counter()
+
+    def start(self):
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._tracing = True
+        self._origin = time.perf_counter()
+
+    def stop(self):
+        self.elapsed = time.perf_counter() - self._origin
+        if self._tracing:
+            self.peak_bytes = max(self.peak_bytes, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+            self._tracing = False
+
+    def _event(self, name, category, start, seconds):
+        self.events.append({
+            "name": name,
+            "cat": category,
+            "ph": "X",
+            "ts": round((start - self._origin) * 1e6, 1),
+            "dur": round(seconds * 1e6, 1),
+            "pid": 0,
+            "tid": 0,
+        })
+
+    @contextmanager
+    def page(self, source, dest):
+        record = {"source": str(source), "dest": str(dest), "seconds": 0.0, "stages": {}}
+        self._page = record
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["seconds"] = time.perf_counter() - start
+            self._page = None
+            self.pages.append(record)
+            self._event(str(dest), "page", start, record["seconds"])
+
+    @contextmanager
+    def stage(self, name):
+        # stages do not nest, so the traced peak can be reset for each one and
+        # read back as the most memory the stage had allocated at once
+        base = 0
+        if self._tracing:
+            base, peak = tracemalloc.get_traced_memory()
+            self.peak_bytes = max(self.peak_bytes, peak)
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            allocated = 0
+            if self._tracing:
+                peak = tracemalloc.get_traced_memory()[1]
+                self.peak_bytes = max(self.peak_bytes, peak)
+                allocated = peak - base
+            total = self.stages.setdefault(name, {"calls": 0, "seconds": 0.0, "alloc_bytes": 0})
+            total["calls"] += 1
+            total["seconds"] += seconds
+            total["alloc_bytes"] += allocated
+            if self._page is not None:
+                page_stage = self._page["stages"].setdefault(name, {"seconds": 0.0, "alloc_bytes": 0})
+                page_stage["seconds"] += seconds
+                page_stage["alloc_bytes"] += allocated
+            self._event(name, "stage", start, seconds)
+
+    def page_times(self):
+        return sorted(page["seconds"] for page in self.pages)
+
+    def histogram(self):
+        # [(label, count)] of page times over _BUCKETS_MS
+        counts = [0] * (len(_BUCKETS_MS) + 1)
+        for seconds in self.page_times():
+            ms = seconds * 1000
+            i = 0
+            while i < len(_BUCKETS_MS) and ms >= _BUCKETS_MS[i]:
+                i += 1
+            counts[i] += 1
+        labels = [f"<{b} ms" for b in _BUCKETS_MS] + [f">={_BUCKETS_MS[-1]} ms"]
+        return list(zip(labels, counts))
+
+    def slowest(self, n = 10):
+        return sorted(self.pages, key=lambda page: page["seconds"], reverse=True)[:n]
+
+    def to_dict(self, top = 10):
+        times = self.page_times()
+        return {
+            "elapsed_seconds": self.elapsed,
+            "peak_bytes": self.peak_bytes,
+            "pages": len(self.pages),
+            "stages": self.stages,
+            "page_seconds": {f"p{p}": percentile(times, p) for p in (50, 95, 99)},
+            "histogram": dict(self.histogram()),
+            "slowest": self.slowest(top),
+        }
+
+    def write_trace(self, path, top = 10):
+        # chrome://tracing and Perfetto read traceEvents; the summary rides along
+        data = {"traceEvents": self.events, "displayTimeUnit": "ms", "profile": self.to_dict(top)}
+        Path(path).write_text(json.dumps(data, indent=1))
+
+    def summary(self, top = 10):
+        times = self.page_times()
+        lines = [f"profile: {len(self.pages)} pages in {self.elapsed * 1000:.1f} ms, "
+                 f"peak traced memory {_format_bytes(self.peak_bytes)}"]
+        lines.append(f"  {'stage':<10} {'calls':>7} {'total ms':>10} {'share':>7} {'allocated':>11}")
+        for name, total in self.stages.items():
+            share = 100 * total["seconds"] / self.elapsed if self.elapsed else 0
+            lines.append(f"  {name:<10} {total['calls']:>7} {total['seconds'] * 1000:>10.1f} "
+                         f"{share:>6.1f}% {_format_bytes(total['alloc_bytes']):>11}")
+        if times:
+            p50, p95, p99 = (percentile(times, p) * 1000 for p in (50, 95, 99))
+            lines.append(f"  page time p50 {p50:.2f} ms, p95 {p95:.2f} ms, p99 {p99:.2f} ms")
+            histogram = self.histogram()
+            widest = max(count for _, count in histogram)
+            for label, count in histogram:
+                if count:
+                    lines.append(f"  {label:>10} {'#' * max(1, 40 * count // widest)} {count}")
+            lines.append(f"  slowest {min(top, len(times))} pages:")
+            for page in self.slowest(top):
+                stage, spent = max(page["stages"].items(), key=lambda item: item[1]["seconds"], default=("", None))
+                where = f" ({stage} {spent['seconds'] * 1000:.2f} ms)" if spent else ""
+                lines.append(f"  {page['seconds'] * 1000:>9.2f} ms  {page['dest']}{where}")
+        return "\n".join(lines)
@@ -1,89 +1,492 @@
-from markdown import markdown_to_html_node
-from os import listdir, path, mkdir
+from markdown import iter_markdown_html, markdown_to_html_node
+from manifest import (BUILD_MANIFEST, SHARD_MANIFEST, Manifest, build_manifest_path, hash_bytes, hash_file,
+                      is_build_output)
+from template import load_template
+from assets import ASSET_MANIFEST, AssetManifest
+from cache import GENERATOR_VERSION, ArtifactCache, ArtifactError, RenderCache, open_backend
+from sync import sync_directory
+from instrument import NULL_PROFILER, Profiler
+from discover import DEFAULT_IGNORE, discover
+from output import ChangeLog, remove_unexpected, write_if_changed
+from compress import compressed_siblings, discard_compressed, keep_compressed, precompress
+from os import cpu_count
 from pathlib import Path
-import shutil
-from shutil import copy, rmtree
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+import argparse
+import codecs
 import sys
-def copy_from_static_to_public(folder_path,file_list):
-    if folder_path == "":
-        # print("removing public and making it")
-        rmtree("public")
-        mkdir("public")
-    for f in file_list:
-        file_path = f"static{folder_path}/{f}"
-        file_path_public =  f"public/{folder_path}/{f}"
-        if path.isdir(file_path):
-            mkdir(file_path_public)
-            copy_from_static_to_public(f"{folder_path}/{f}", listdir(file_path))
-        elif path.isfile(file_path):
-            copy(file_path,file_path_public)
-
-def copy_directory_recursive(src: Path, dst: Path) -> None:
-    if not dst.exists():
-        dst.mkdir()
-
-    for f in src.iterdir():
-        new_f = dst / f.name
-        if f.is_dir():
-            copy_directory_recursive(f, new_f)
-        else:
-            print(f"Copying {f} to {new_f}")
-            shutil.copy(f, new_f)
+
+# sources are read through a large buffer and handed on line by line
+_READ_BUFFER = 1 << 20
 
 def extract_title(markdown):
+    # markdown may also be an iterable of lines, such as an open file
     if markdown:
-        lines = markdown.split('\n')
+        lines = markdown.split('\n') if isinstance(markdown, str) else markdown
         for line in lines:
             if not line.isspace() and line.lstrip()[0:2] == "# ":
                 return line.lstrip()[2:].strip()
     raise ValueError
-def generate_page(from_path, template_path, dest_path, base_path):
+def _generate_page_staged(from_path, template_path, dest_path, base_path, verbose, cache, profiler, assets, minify):
+    # the same page as the streaming path, but each stage runs to completion
+    # before the next so the profiler can time it on its own
+    with profiler.stage("read"):
+        template = load_template(template_path, base_path, assets, minify)
+        from_content = Path(from_path).read_text()
+    with profiler.stage("parse"):
+        tree = markdown_to_html_node(from_content, template.rewrite_url, cache, minify)
+        title = extract_title(from_content)
+    with profiler.stage("serialize"):
+        html_content = tree.to_html(minify)
+    with profiler.stage("template"):
+        page = template.render(Title=title, Content=html_content)
+    if verbose:
+        print(dest_path)
+    with profiler.stage("write"):
+        p = Path(dest_path); p.parent.mkdir(parents=True, exist_ok=True)
+        return write_if_changed(p, [page])
+def generate_page(from_path, template_path, dest_path, base_path, verbose = True, cache = None, profiler = NULL_PROFILER, artifacts = None, source_hash = None, assets = None, minify = False):
     # print(f"generating page from {from_path} to {dest_path} using {template_path}")
-    from_content = Path(from_path).read_text()
-    template_content = Path(template_path).read_text()
-    html_node = markdown_to_html_node(from_content)
-    html_node_content = html_node.to_html()
-    title = extract_title(from_content)
-    template_content = template_content.replace("{{ Title }}", title)
-    template_content = template_content.replace("{{ Content }}", html_node_content)
-    template_content = template_content.replace('href="/', f'href="{base_path}')
-    template_content = template_content.replace('src="/', f'src="{base_path}')
-    print(dest_path)
+    # returns whether dest_path changed; identical output is not rewritten
+    if artifacts is not None:
+        return _generate_page_artifact(from_path, template_path, dest_path, base_path, verbose, cache, profiler, artifacts, source_hash, assets, minify)
+    if profiler.enabled:
+        return _generate_page_staged(from_path, template_path, dest_path, base_path, verbose, cache, profiler, assets, minify)
+    # the source is read twice and never held whole: once for the title, which
+    # the template needs before the body, then block by block while the body
+    # is rendered straight into the output file
+    template = load_template(template_path, base_path, assets, minify)
+    with open(from_path, buffering=_READ_BUFFER) as src:
+        title = extract_title(src)
+    if verbose:
+        print(dest_path)
     p = Path(dest_path); p.parent.mkdir(parents=True, exist_ok=True)
-    p.write_text(template_content)
-def generate_page_recursively(dir_path_content, template_path, dest_dir_path, base_path):
-    content_list = listdir(dir_path_content)
-    for content in content_list:
-        content_path = f"{dir_path_content}/{content}"
-        dir_path = f"{dest_dir_path}/{content}"
-        # print(dir_path)
-        if path.isdir(content_path):
-            generate_page_recursively(content_path,template_path,dir_path, base_path)
+    with open(from_path, buffering=_READ_BUFFER) as src:
+        html_content = iter_markdown_html(src, template.rewrite_url, cache, minify)
+        return write_if_changed(p, template.render_chunks(Title=title, Content=html_content))
+def _generate_page_artifact(from_path, template_path, dest_path, base_path, verbose, cache, profiler, artifacts, source_hash, assets, minify):
+    # a page some build, here or elsewhere, already rendered from the same
+    # source, template and base path is copied out of the artifact cache
+    # without being parsed; anything else is rendered and then stored
+    with profiler.stage("artifact"):
+        template = load_template(template_path, base_path, assets, minify)
+        key = artifacts.key(source_hash or hash_file(from_path), template, base_path)
+        chunks = artifacts.get(key)
+    if chunks is not None:
+        if verbose:
+            print(dest_path)
+        try:
+            with profiler.stage("write"):
+                p = Path(dest_path); p.parent.mkdir(parents=True, exist_ok=True)
+                # streamed from the cache into the page, like a render
+                return write_if_changed(p, codecs.iterdecode(chunks, "utf-8"))
+        except ArtifactError:
+            pass
+    changed = generate_page(from_path, template_path, dest_path, base_path, verbose and chunks is None, cache, profiler,
+                            assets=assets, minify=minify)
+    with profiler.stage("artifact"):
+        artifacts.put(key, dest_path)
+    return changed
+def generate_page_incremental(from_path, template_path, dest_path, base_path, manifest, template_hash, cache = None, profiler = NULL_PROFILER, artifacts = None, assets = None, minify = False):
+    with profiler.stage("hash"):
+        source_hash = hash_file(from_path)
+    if manifest.is_fresh(dest_path, source_hash, template_hash, base_path):
+        manifest.mark(dest_path)
+        return False
+    changed = generate_page(from_path, template_path, dest_path, base_path, cache=cache, profiler=profiler,
+                            artifacts=artifacts, source_hash=source_hash, assets=assets, minify=minify)
+    manifest.record(dest_path, from_path, source_hash, template_hash, base_path)
+    return changed
+def template_hash_of(template_path, assets = None, minify = False):
+    # what the manifest compares pages against: the generator, the template
+    # and, with fingerprinting, the asset names every page's links resolve to
+    template_hash = hash_bytes(f"{GENERATOR_VERSION}\0{hash_file(template_path)}".encode())
+    if assets:
+        template_hash = hash_bytes(f"{template_hash}\0{assets.digest}".encode())
+    if minify:
+        template_hash = hash_bytes(f"{template_hash}\0minify".encode())
+    return template_hash
+def cache_namespace(base_path, assets = None):
+    # what besides a block changes its rendered html: links are rewritten
+    # under the base path and, with fingerprinting, to the asset names
+    if assets:
+        return f"{base_path}\0{assets.digest}"
+    return base_path
+def generate_pages(pages, template_path, base_path, manifest = None, template_hash = None, cache = None, changes = None, artifacts = None, assets = None, minify = False):
+    if manifest is not None and template_hash is None:
+        template_hash = template_hash_of(template_path, assets, minify)
+    for from_path, dest_path in pages:
+        if manifest is not None:
+            changed = generate_page_incremental(from_path, template_path, dest_path, base_path, manifest, template_hash, cache,
+                                                artifacts=artifacts, assets=assets, minify=minify)
         else:
-            generate_page(content_path, template_path,f"{dir_path.rstrip(".md")}.html", base_path)
+            changed = generate_page(from_path, template_path, dest_path, base_path, cache=cache, artifacts=artifacts, assets=assets,
+                                    minify=minify)
+        if changes is not None:
+            changes.record(dest_path, changed)
+def generate_page_recursively(dir_path_content, template_path, dest_dir_path, base_path, manifest = None, template_hash = None, cache = None, ignore = DEFAULT_IGNORE, minify = False):
+    pages = collect_pages(dir_path_content, dest_dir_path, ignore)
+    generate_pages(pages, template_path, base_path, manifest, template_hash, cache, minify=minify)
+def collect_pages(dir_path_content, dest_dir_path, ignore = DEFAULT_IGNORE):
+    # the markdown pages of the build plan, in path order
+    return discover(dir_path_content, dest_dir_path, ignore).pages
 
+class BuildError(Exception):
+    def __init__(self, failures):
+        self.failures = failures
+        lines = [f"{from_path}: {error}" for from_path, error in failures]
+        super().__init__(f"{len(failures)} page(s) failed to build:\n" + "\n".join(lines))
 
+_worker_cache = None
+_worker_artifacts = None
 
-def main():
-    if len(sys.argv) == 2:
-        basepath = sys.argv[1]
-    else:
-        basepath = "/"
+def _init_worker(cache_config, artifact_backend = None):
+    global _worker_cache, _worker_artifacts
+    if cache_config is not None:
+        _worker_cache = RenderCache(**cache_config)
+    if artifact_backend is not None:
+        _worker_artifacts = ArtifactCache(artifact_backend)
+
+def _stats_delta(counter, before):
+    if before is None:
+        return None
+    after = counter.stats()
+    return {k: after[k] - before[k] for k in after}
+
+def _generate_page_job(job):
+    # returns (error or None, whether the output changed, render cache and
+    # artifact cache counters for this page) to the parent
+    from_path, template_path, dest_path, base_path, source_hash, assets, minify = job
+    before = _worker_cache.stats() if _worker_cache is not None else None
+    artifacts_before = _worker_artifacts.stats() if _worker_artifacts is not None else None
+    error = None
+    changed = False
+    try:
+        changed = generate_page(from_path, template_path, dest_path, base_path, verbose=False, cache=_worker_cache,
+                                artifacts=_worker_artifacts, source_hash=source_hash, assets=assets, minify=minify)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    return error, changed, _stats_delta(_worker_cache, before), _stats_delta(_worker_artifacts, artifacts_before)
+
+def generate_pages_parallel(pages, template_path, base_path, jobs, manifest = None, template_hash = None, cache = None, changes = None, artifacts = None, assets = None, minify = False, verbose = True):
+    if manifest is not None and template_hash is None:
+        template_hash = template_hash_of(template_path, assets, minify)
+    todo = []
+    for from_path, dest_path in pages:
+        source_hash = None
+        if manifest is not None:
+            source_hash = hash_file(from_path)
+            if manifest.is_fresh(dest_path, source_hash, template_hash, base_path):
+                manifest.mark(dest_path)
+                if changes is not None:
+                    changes.record(dest_path, False)
+                continue
+        todo.append((from_path, dest_path, source_hash))
+    if not todo:
+        return
+
+    # every page is independent CPU work, so hand them to worker processes in
+    # chunks and report the results in plan order once they come back
+    job_list = [(from_path, str(template_path), dest_path, base_path, source_hash, assets, minify) for from_path, dest_path, source_hash in todo]
+    chunksize = max(1, len(job_list) // (jobs * 4))
+    # each worker keeps its own cache with the same settings as the parent's
+    cache_config = None
+    if cache is not None:
+        cache_config = {"max_entries": cache.max_entries, "cache_dir": cache.cache_dir,
+                        "namespace": cache.namespace, "max_disk_bytes": cache.max_disk_bytes}
+    # backends are plain settings, so each worker gets a copy of the parent's
+    artifact_backend = artifacts.backend if artifacts is not None else None
+    with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(cache_config, artifact_backend)) as pool:
+        results = list(pool.map(_generate_page_job, job_list, chunksize=chunksize))
+
+    failures = []
+    for (from_path, dest_path, source_hash), (error, changed, cache_stats, artifact_stats) in zip(todo, results):
+        if cache_stats is not None:
+            cache.add_stats(cache_stats)
+        if artifact_stats is not None:
+            artifacts.add_stats(artifact_stats)
+        if error is not None:
+            print(f"{dest_path}: {error}")
+            failures.append((from_path, error))
+            continue
+        if verbose:
+            print(dest_path)
+        if changes is not None:
+            changes.record(dest_path, changed)
+        if manifest is not None:
+            manifest.record(dest_path, from_path, source_hash, template_hash, base_path)
+    if failures:
+        raise BuildError(failures)
+
+def generate_pages_profiled(pages, template_path, base_path, profiler, manifest = None, template_hash = None, cache = None, changes = None, artifacts = None, assets = None, minify = False):
+    # serial, so page timings are not skewed by workers competing for CPU
+    if manifest is not None and template_hash is None:
+        template_hash = template_hash_of(template_path, assets, minify)
+    for from_path, dest_path in pages:
+        with profiler.page(from_path, dest_path):
+            if manifest is not None:
+                changed = generate_page_incremental(from_path, template_path, dest_path, base_path, manifest, template_hash, cache, profiler,
+                                                    artifacts, assets, minify)
+            else:
+                changed = generate_page(from_path, template_path, dest_path, base_path, cache=cache, profiler=profiler,
+                                        artifacts=artifacts, assets=assets, minify=minify)
+        if changes is not None:
+            changes.record(dest_path, changed)
+
+def prune_empty_parents(path, dest_root):
+    # remove the directories above a deleted output that it left empty,
+    # stopping at dest_root
+    dest_root = Path(dest_root)
+    parent = Path(path).parent
+    while parent != dest_root and dest_root in parent.parents and parent.is_dir() and not any(parent.iterdir()):
+        parent.rmdir()
+        parent = parent.parent
+
+def remove_stale_outputs(manifest, dest_root, changes = None):
+    # delete pages whose markdown source disappeared since the last build,
+    # along with any directories that are left empty by doing so
+    for dest in manifest.stale():
+        p = Path(dest)
+        print(f"Removing {p}")
+        p.unlink(missing_ok=True)
+        manifest.forget(dest)
+        if changes is not None:
+            changes.record_removed(p)
+        prune_empty_parents(p, dest_root)
+
+def parse_shard(text):
+    # "I/N" -> (I, N), with shards numbered from 1
+    try:
+        index, count = (int(part) for part in text.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {text!r}")
+    if not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"shard {index} is not between 1 and {count}")
+    return index, count
+
+def parse_args(argv = None):
+    parser = argparse.ArgumentParser(description="Build the site from content/ into docs/")
+    parser.add_argument("basepath", nargs="?", default="/")
+    parser.add_argument("--incremental", action="store_true",
+                        help="keep docs/ and only regenerate pages whose source, template or base path changed")
+    parser.add_argument("-j", "--jobs", type=int, default=1,
+                        help="render pages in N worker processes (0 = one per CPU)")
+    parser.add_argument("--cache", action="store_true",
+                        help="reuse the rendered html of blocks that repeat across pages")
+    parser.add_argument("--cache-size", type=int, default=4096, metavar="N",
+                        help="blocks kept in the in-memory render cache (default 4096)")
+    parser.add_argument("--cache-dir", type=Path, default=None,
+                        help="also keep rendered blocks on disk in this directory (implies --cache)")
+    parser.add_argument("--artifacts", default=None, metavar="DIR|URL",
+                        help="reuse whole pages rendered by any earlier build, here or on another machine, from a "
+                             "shared cache directory, such as .artifacts/, or cache server URL; see cache.py")
+    parser.add_argument("--artifacts-max-mb", type=int, default=1024, metavar="N",
+                        help="trim a local --artifacts directory to N MB after the build (default 1024)")
+    parser.add_argument("--precompress", action="store_true",
+                        help="write .gz (and .br, when brotli is installed) next to every changed text output, "
+                             "for nginx gzip_static")
+    parser.add_argument("--precompress-min-bytes", type=int, default=256, metavar="N",
+                        help="leave outputs smaller than N bytes uncompressed (default 256)")
+    parser.add_argument("--precompress-max-ratio", type=float, default=0.9, metavar="R",
+                        help="drop a compressed copy larger than R times the original (default 0.9)")
+    parser.add_argument("--fingerprint", action="store_true",
+                        help="also publish static/ files under content-hashed names such as index.3f9a1c2b7d.css, "
+                             "rewrite the template's and pages' links to them and list them in "
+                             "docs/asset-manifest.json")
+    parser.add_argument("--minify", action="store_true",
+                        help="drop the template's indentation and collapse whitespace in rendered text; "
+                             "pre, code, textarea, script and style are kept as written")
+    parser.add_argument("--link", action=argparse.BooleanOptionalAction, default=False,
+                        help="hardlink static files into docs/ instead of copying them; faster, but an in-place "
+                             "edit of a static file then changes docs/ before the build and is not reported "
+                             "as a change (default --no-link)")
+    parser.add_argument("--watch", action="store_true",
+                        help="after building, serve docs/ and rebuild whatever changes (implies --incremental)")
+    parser.add_argument("--port", type=int, default=8888,
+                        help="port for the --watch dev server or the --daemon build server (default 8888)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="after building, keep running and build pages, subtrees or the site on request "
+                             "over HTTP (implies --incremental and --cache)")
+    parser.add_argument("--socket", type=Path, default=None,
+                        help="serve --daemon requests on this unix socket instead of a TCP port")
+    parser.add_argument("--changes", default=None, metavar="FILE",
+                        help="write the docs/ files this build wrote or removed as JSON to FILE; with -, to stdout, "
+                             "and the build logs to stderr")
+    parser.add_argument("--ignore", action="append", default=[], metavar="GLOB",
+                        help="skip content files or directories matching GLOB, on top of "
+                             "dotfiles, editor swap files and drafts (repeatable)")
+    parser.add_argument("--out", type=Path, default=None,
+                        help="build into this directory instead of docs/; it must be empty, missing or "
+                             "the output of an earlier build, whose manifest is kept under .builds/ (or $SSG_BUILDS_DIR)")
+    parser.add_argument("--shard", type=parse_shard, default=None, metavar="I/N",
+                        help="build only shard I of N, split by a hash of each source path, into "
+                             "shard-I-of-N/ (or --out) with its own manifest; combine with merge.py")
+    parser.add_argument("--profile", action="store_true",
+                        help="time every build stage and page, print a report and write a JSON trace (builds serially)")
+    parser.add_argument("--profile-out", type=Path, default=None,
+                        help="where --profile writes its trace (default profile.json in the project root)")
+    parser.add_argument("--profile-top", type=int, default=10, metavar="N",
+                        help="slowest pages listed by --profile (default 10)")
+    args = parser.parse_args(argv)
+    if args.shard is not None and (args.watch or args.daemon):
+        parser.error("--shard builds once; it cannot be combined with --watch or --daemon")
+    if args.precompress and (args.watch or args.daemon):
+        parser.error("--precompress is for deploys; it cannot be combined with --watch or --daemon")
+    if args.fingerprint and (args.watch or args.daemon):
+        parser.error("--fingerprint is for deploys; it cannot be combined with --watch or --daemon")
+    return args
+
+def main(argv = None):
+    args = parse_args(argv)
+    if args.changes != "-":
+        return build_site(args)
+    # stdout carries nothing but the JSON, so deploy tooling can read it;
+    # the build logs to stderr
+    stdout = sys.stdout
+    with redirect_stdout(sys.stderr):
+        build_site(args, stdout)
+
+def build_site(args, stdout = None):
+    basepath = args.basepath
     print(basepath)
     project_root = Path(__file__).parent.parent
 
+    profiler = Profiler() if args.profile else NULL_PROFILER
+    profiler.start()
+
     dest_path = project_root / "docs"
+    if args.shard is not None:
+        dest_path = project_root / "shard-{}-of-{}".format(*args.shard)
+    if args.out is not None:
+        dest_path = args.out
+    if args.shard is not None:
+        # merge.py finds the outputs by their recorded paths
+        dest_path = dest_path.resolve()
     static_dir = project_root / "static"
-    if dest_path.exists():
-        shutil.rmtree(dest_path)
+    builds_docs = Path(dest_path).resolve() == (project_root / "docs").resolve()
+    # builds anywhere but docs/ keep a manifest per output directory, so
+    # builds into different directories never see each other's outputs
+    manifest_path = project_root / BUILD_MANIFEST if builds_docs else build_manifest_path(project_root, dest_path)
+    if not builds_docs and not is_build_output(dest_path, manifest_path):
+        sys.exit(f"{dest_path} is not empty and no earlier build wrote to it; "
+                 f"refusing to remove what is in it. Empty it or choose another --out.")
+    incremental = args.shard is not None or args.incremental or args.watch or args.daemon
+    manifest = None
+    if args.shard is not None:
+        # always incremental: the manifest lists what the shard produced, and
+        # merge.py reads it back from the output directory
+        manifest = Manifest.load(dest_path / SHARD_MANIFEST, dest_path)
+        index, count = args.shard
+        manifest.shard = {"index": index, "count": count, "root": str(dest_path)}
+    elif incremental:
+        manifest = Manifest.load(manifest_path, dest_path)
+    else:
+        # a full build still records what it wrote: it replaces whatever an
+        # earlier build left, which a later --incremental build would
+        # otherwise trust, and marks the directory as a build's own
+        manifest = Manifest(manifest_path, root=str(Path(dest_path).resolve()))
+    # docs/ is no longer wiped first: unchanged outputs keep their bytes and
+    # mtimes, and leftovers are removed once the build knows its outputs
+    changes = ChangeLog(dest_path)
+    legacy = Path(dest_path) / BUILD_MANIFEST
+    if not builds_docs and legacy.exists():
+        # left in the output by builds that kept their manifest there
+        print(f"Removing {legacy}")
+        legacy.unlink()
+        changes.record_removed(legacy)
 
-    copy_directory_recursive(static_dir, dest_path)
-    # copy_from_static_to_public()
     from_path = project_root / "content"
     template_path = project_root / "template.html"
+    ignore = DEFAULT_IGNORE + tuple(args.ignore)
+    # the whole plan is known before anything is written or rendered
+    with profiler.stage("walk"):
+        plan = discover(from_path, dest_path, ignore)
+        if args.shard is not None:
+            plan = plan.shard(*args.shard)
+    print(plan.summary() + (" for shard {} of {}".format(*args.shard) if args.shard else ""))
+
+    # files under content/ that are not markdown ship like static files; of
+    # several shards, only the first ships static/, but every shard needs
+    # the fingerprinted names to render links with
+    ships_static = args.shard is None or args.shard[0] == 1
+    assets = None
+    with profiler.stage("static"):
+        if args.fingerprint:
+            asset_manifest = AssetManifest.load(dest_path / ASSET_MANIFEST)
+            assets = asset_manifest.fingerprint(static_dir)
+            if ships_static:
+                changes.record(asset_manifest.path, asset_manifest.save())
+                if manifest is not None:
+                    manifest.record_asset(asset_manifest.path, static_dir)
+        sync_directory(static_dir if ships_static else None, dest_path, manifest, link=args.link,
+                       extra=plan.assets, changes=changes, names=assets.names if assets else None)
     print(template_path)
 
-    generate_page_recursively(from_path, template_path, dest_path, basepath)
+    cache = None
+    if args.cache or args.cache_dir is not None or args.daemon:
+        cache = RenderCache(args.cache_size, args.cache_dir, namespace=cache_namespace(basepath, assets))
+
+    artifacts = None
+    if args.artifacts is not None:
+        artifacts = ArtifactCache(open_backend(args.artifacts, args.artifacts_max_mb * 1024 * 1024))
+
+    jobs = args.jobs if args.jobs > 0 else cpu_count() or 1
+    if profiler.enabled:
+        generate_pages_profiled(plan.pages, template_path, basepath, profiler, manifest, cache=cache, changes=changes,
+                                artifacts=artifacts, assets=assets, minify=args.minify)
+    elif jobs == 1:
+        generate_pages(plan.pages, template_path, basepath, manifest, cache=cache, changes=changes, artifacts=artifacts,
+                       assets=assets, minify=args.minify)
+    else:
+        try:
+            generate_pages_parallel(plan.pages, template_path, basepath, jobs, manifest, cache=cache, changes=changes,
+                                    artifacts=artifacts, assets=assets, minify=args.minify)
+        except BuildError as e:
+            if manifest is not None:
+                manifest.save()
+            sys.exit(str(e))
+    if incremental:
+        remove_stale_outputs(manifest, dest_path, changes)
+    else:
+        if args.precompress:
+            keep_compressed(changes)
+        remove_unexpected(dest_path, changes, keep=[manifest.path] if manifest is not None else ())
+    if args.precompress:
+        # zlib and brotli release the GIL, so threads compress in parallel
+        with profiler.stage("compress"):
+            stats = precompress(changes, cpu_count() or 1, args.precompress_min_bytes, args.precompress_max_ratio)
+        print(stats.summary())
+    else:
+        discard_compressed(changes)
+    if manifest is not None:
+        manifest.compressed = compressed_siblings(changes)
+        manifest.save()
+    print(changes.summary())
+    if args.changes:
+        changes.save(args.changes, stdout)
+    if cache is not None:
+        cache.prune()
+        print(cache.summary())
+    if artifacts is not None:
+        artifacts.backend.prune()
+        print(artifacts.summary())
+    if profiler.enabled:
+        profiler.stop()
+        print(profiler.summary(args.profile_top))
+        trace_path = args.profile_out or project_root / "profile.json"
+        profiler.write_trace(trace_path, args.profile_top)
+        print(f"Wrote profile trace to {trace_path}")
+
+    if args.watch:
+        from watch import watch
+        watch(from_path, static_dir, template_path, dest_path, basepath, manifest, cache, args.port, link=args.link, ignore=ignore,
+              minify=args.minify)
+    elif args.daemon:
+        from server import BuildServer, serve_builds
+        builder = BuildServer(from_path, static_dir, template_path, dest_path, basepath, manifest, cache,
+                              link=args.link, ignore=ignore, minify=args.minify)
+        serve_builds(builder, args.port, socket_path=args.socket)
 
 if __name__ == "__main__":
     main()
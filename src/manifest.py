@@ -0,0 +1,138 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+
+# kept in the project root for builds into docs/
+BUILD_MANIFEST = ".build-manifest.json"
+
+# builds anywhere else keep theirs in here, one per resolved output
+# directory: a manifest holds the build host's paths, so it stays out of
+# any tree that gets published.  The environment variable moves it, e.g.
+# into a test's temporary directory.
+BUILDS_DIR = ".builds"
+BUILDS_DIR_ENV = "SSG_BUILDS_DIR"
+
+# written into the output directory of a --shard build, for merge.py
+SHARD_MANIFEST = ".shard-manifest.json"
+
+def hash_bytes(data):
+    return hashlib.sha256(data).hexdigest()
+
+def hash_file(file_path):
+    # hashed in chunks, so large sources are never read into memory whole
+    with open(file_path, "rb") as fp:
+        return hashlib.file_digest(fp, "sha256").hexdigest()
+
+def build_manifest_path(project_root, dest_root):
+    key = hashlib.sha256(str(Path(dest_root).resolve()).encode()).hexdigest()[:16]
+    builds_dir = os.environ.get(BUILDS_DIR_ENV) or Path(project_root) / BUILDS_DIR
+    return Path(builds_dir) / f"{key}.json"
+
+def is_build_output(dest_root, manifest_path = None):
+    # whether dest_root is missing, empty or was written by an earlier build,
+    # i.e. whether a build or merge may delete files in it that it did not
+    # produce.  manifest_path is where that build would have recorded it.
+    dest_root = Path(dest_root)
+    if not dest_root.exists():
+        return True
+    if manifest_path is not None and Path(manifest_path).exists():
+        return True
+    # a BUILD_MANIFEST in the tree is from a build that still kept it there;
+    # the next build owns the directory and removes it
+    if (dest_root / BUILD_MANIFEST).exists() or (dest_root / SHARD_MANIFEST).exists():
+        return True
+    return not any(dest_root.iterdir())
+
+class Manifest():
+    # maps each output path to the inputs it was rendered from, so a build can
+    # tell which pages are still up to date and which outputs lost their source
+    def __init__(self, manifest_path, entries = None, assets = None, shard = None, root = None, compressed = None):
+        self.path = Path(manifest_path)
+        self.entries = entries if entries is not None else {}
+        # static files copied into the output, mapped to their source
+        self.assets = assets if assets is not None else {}
+        # {"index", "count", "root"} when the build was one shard of a larger
+        # one, root being the output directory the shard was built into
+        self.shard = shard
+        # precompressed siblings of outputs, mapped to the output, so merge.py
+        # ships them with the rest of a shard
+        self.compressed = compressed if compressed is not None else {}
+        # the resolved output directory the recorded outputs are under
+        self.root = root
+        self.seen = set()
+        self.seen_assets = set()
+
+    @classmethod
+    def load(cls, manifest_path, root = None):
+        # a manifest recorded for another output directory is not loaded: its
+        # outputs would all look stale here, and be deleted from over there
+        p = Path(manifest_path)
+        root = str(Path(root).resolve()) if root is not None else None
+        try:
+            data = json.loads(p.read_text())
+        except (FileNotFoundError, ValueError):
+            return cls(p, root=root)
+        if data.get("version") != MANIFEST_VERSION:
+            return cls(p, root=root)
+        if root is not None and data.get("root", root) != root:
+            print(f"Ignoring {p}: it was recorded for {data['root']}, not {root}")
+            return cls(p, root=root)
+        return cls(p, data.get("entries", {}), data.get("assets", {}), data.get("shard"), root or data.get("root"),
+                   data.get("compressed", {}))
+
+    def save(self):
+        data = {"version": MANIFEST_VERSION, "entries": self.entries, "assets": self.assets}
+        if self.shard is not None:
+            data["shard"] = self.shard
+        if self.root is not None:
+            data["root"] = self.root
+        if self.compressed:
+            data["compressed"] = self.compressed
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(data, indent=1, sort_keys=True))
+
+    def is_fresh(self, dest_path, source_hash, template_hash, base_path):
+        entry = self.entries.get(str(dest_path))
+        if entry is None or not Path(dest_path).exists():
+            return False
+        return (entry["source_hash"] == source_hash
+                and entry["template_hash"] == template_hash
+                and entry["base_path"] == base_path)
+
+    def begin_build(self):
+        # a long-lived manifest serves many builds; each whole-site build
+        # must visit every output again for stale() to mean anything
+        self.seen.clear()
+        self.seen_assets.clear()
+
+    def mark(self, dest_path):
+        self.seen.add(str(dest_path))
+
+    def record(self, dest_path, source_path, source_hash, template_hash, base_path):
+        self.entries[str(dest_path)] = {
+            "source": str(source_path),
+            "source_hash": source_hash,
+            "template_hash": template_hash,
+            "base_path": base_path,
+        }
+        self.mark(dest_path)
+
+    def stale(self):
+        # outputs recorded by an earlier build whose source was not visited this run
+        return sorted(dest for dest in self.entries if dest not in self.seen)
+
+    def forget(self, dest_path):
+        self.entries.pop(str(dest_path), None)
+
+    def record_asset(self, dest_path, source_path):
+        self.assets[str(dest_path)] = str(source_path)
+        self.seen_assets.add(str(dest_path))
+
+    def stale_assets(self):
+        return sorted(dest for dest in self.assets if dest not in self.seen_assets)
+
+    def forget_asset(self, dest_path):
+        self.assets.pop(str(dest_path), None)
@@ -1,58 +1,117 @@
-from htmlnode import ParentNode, LeafNode
+from htmlnode import ParentNode, LeafNode, RawHTMLNode
 from textnode import text_node_to_html_node, TextNode, TextType
-from inline import text_to_textnodes
-from blocks import block_to_block_type, BlockType, markdown_to_blocks
+from inline import text_to_textnodes, text_to_html_fragments
+from blocks import BlockType, scan_blocks
 #md->blocks->inline->textnode->html
-def text_to_children(text):
+def text_to_children(text, rewrite_url = None):
     text_nodes = text_to_textnodes(text)
     children = []
     for text_node in text_nodes:
-        html_node = text_node_to_html_node(text_node)
+        html_node = text_node_to_html_node(text_node, rewrite_url)
         children.append(html_node)
     return children
-def markdown_to_html_node(markdown):
-    block_list = markdown_to_blocks(markdown)
+# the helpers below take the block's lines, as yielded by scan_blocks
+def _paragraph_text(lines):
+    return " ".join([line.strip() for line in lines])
+def _heading(lines):
+    paragraph = _paragraph_text(lines)
+    stripped_par = paragraph.lstrip('#')
+    stripped_par = stripped_par.lstrip(' ')
+    headings = min(len(paragraph) - len(paragraph.lstrip('#')), 6)
+    return headings, stripped_par
+def _quote_text(lines):
+    return "\n".join([line.lstrip("> ") for line in lines])
+def _code_text(lines):
+    paragraph = "\n".join([line.strip() for line in lines])
+    return paragraph.lstrip("""```""").rstrip("""```""").lstrip("\n").lstrip(" ")# ai couldnt write code this bad
+def _list_items(lines, block_type):
+    if block_type == BlockType.UNORDERED_LIST:
+        return [item[2:] for item in lines]
+    return [item.split(". ", 1)[1] for item in lines]
+_LIST_TAGS = {BlockType.UNORDERED_LIST: "ul", BlockType.ORDERED_LIST: "ol"}
+
+def block_to_html_node(block, block_type, rewrite_url = None, lines = None):
+    if lines is None:
+        lines = block.split("\n")
+    match block_type:
+        case BlockType.PARAGRAPH:
+            return ParentNode("p", text_to_children(_paragraph_text(lines), rewrite_url))
+        case BlockType.HEADING:
+            headings, text = _heading(lines)
+            return ParentNode(f"h{headings}", text_to_children(text, rewrite_url))
+        case BlockType.QUOTE:
+            return ParentNode("blockquote", text_to_children(_quote_text(lines), rewrite_url))
+        case BlockType.CODE:
+            return ParentNode("pre", [text_node_to_html_node(TextNode(_code_text(lines), TextType.CODE))])
+        case BlockType.UNORDERED_LIST | BlockType.ORDERED_LIST:
+            html_items = [ParentNode("li", text_to_children(item, rewrite_url)) for item in _list_items(lines, block_type)]
+            return ParentNode(_LIST_TAGS[block_type], html_items)
+
+def _wrap(tag, parts):
+    # mirrors ParentNode.to_html, which refuses to render without children
+    if not parts:
+        raise ValueError("no children")
+    return f"<{tag}>{''.join(parts)}</{tag}>"
+
+def block_to_html(block, block_type, rewrite_url = None, lines = None, compact = False):
+    # same html as block_to_html_node(...).to_html(compact), built as strings
+    # directly
+    if lines is None:
+        lines = block.split("\n")
+    match block_type:
+        case BlockType.PARAGRAPH:
+            return _wrap("p", text_to_html_fragments(_paragraph_text(lines), rewrite_url, compact))
+        case BlockType.HEADING:
+            headings, text = _heading(lines)
+            return _wrap(f"h{headings}", text_to_html_fragments(text, rewrite_url, compact))
+        case BlockType.QUOTE:
+            return _wrap("blockquote", text_to_html_fragments(_quote_text(lines), rewrite_url, compact))
+        case BlockType.CODE:
+            return f"<pre><code>{_code_text(lines)}</code></pre>"
+        case BlockType.UNORDERED_LIST | BlockType.ORDERED_LIST:
+            html_items = [_wrap("li", text_to_html_fragments(item, rewrite_url, compact)) for item in _list_items(lines, block_type)]
+            return _wrap(_LIST_TAGS[block_type], html_items)
+
+def _cached_block_html(block, rewrite_url, cache, compact = False):
+    key = cache.key(block.text, block.block_type, compact)
+    html = cache.get(key)
+    if html is None:
+        html = block_to_html(block.text, block.block_type, rewrite_url, block.lines, compact)
+        cache.put(key, html)
+    return html
+
+def markdown_to_html_node(markdown, rewrite_url = None, cache = None, compact = False):
+    # markdown may be a string or an iterable of lines, e.g. an open file.
+    # compact only matters with a cache: cached blocks are stored serialized,
+    # so they are made compact, or not, when first rendered
     paragraph_node = []
-    for block in block_list:
-        block_type = block_to_block_type(block)
-        match block_type:
-            case BlockType.PARAGRAPH:
-                paragraph = " ".join([line.strip() for line in block.splitlines(True)])
-                text_nodes = text_to_textnodes(paragraph)
-                kids = [text_node_to_html_node(tn) for tn in text_nodes]
-                paragraph_node.append(ParentNode("p",kids))
-            case BlockType.HEADING:
-                paragraph = " ".join([line.strip() for line in block.splitlines(True)])
-                stripped_par = paragraph.lstrip('#')
-                stripped_par = stripped_par.lstrip(' ')
-                text_nodes = text_to_textnodes(stripped_par)
-                kids = [text_node_to_html_node(tn) for tn in text_nodes]
-                headings = min(len(paragraph) - len(paragraph.lstrip('#')), 6)
-                paragraph_node.append(ParentNode(f"h{headings}",kids))
-            case BlockType.QUOTE:
-                paragraph = "\n".join([line.lstrip("> ").rstrip("\n") for line in block.splitlines(True)])
-                text_nodes = text_to_textnodes(paragraph)
-                kids = [text_node_to_html_node(tn) for tn in text_nodes]
-                paragraph_node.append(ParentNode("blockquote",kids))
-            case BlockType.CODE:
-                paragraph = "\n".join([line.strip() for line in block.splitlines(True)])
-                kids = [text_node_to_html_node(TextNode(paragraph.lstrip("""```""").rstrip("""```""").lstrip("\n").lstrip(" "),TextType.CODE))]# ai couldnt write code this bad
-                paragraph_node.append(ParentNode("pre",kids))
-            case BlockType.UNORDERED_LIST:
-                items = block.split("\n")
-                html_items = []
-                for item in items:
-                    text = item[2:]
-                    children = text_to_children(text)
-                    html_items.append(ParentNode("li", children))
-                paragraph_node.append(ParentNode("ul", html_items))
-            case BlockType.ORDERED_LIST:
-                items = block.split("\n")
-                html_items = []
-                for item in items:
-                    parts = item.split(". ", 1)
-                    text = parts[1]
-                    children = text_to_children(text)
-                    html_items.append(ParentNode("li", children))
-                paragraph_node.append(ParentNode("ol", html_items))
+    for block in scan_blocks(markdown):
+        if cache is None:
+            paragraph_node.append(block_to_html_node(block.text, block.block_type, rewrite_url, block.lines))
+        else:
+            # cached blocks come back as ready-made html, kept as a raw leaf
+            paragraph_node.append(RawHTMLNode(None, _cached_block_html(block, rewrite_url, cache, compact)))
     return ParentNode("div", paragraph_node, None)
+
+def iter_markdown_html(markdown, rewrite_url = None, cache = None, compact = False):
+    # the html of markdown_to_html, one block at a time.  Fed a file iterator
+    # only the current block is ever held in memory.
+    empty = True
+    for block in scan_blocks(markdown):
+        if empty:
+            yield "<div>"
+            empty = False
+        if cache is None:
+            yield block_to_html(block.text, block.block_type, rewrite_url, block.lines, compact)
+        else:
+            yield _cached_block_html(block, rewrite_url, cache, compact)
+    if empty:
+        # same error as _wrap, raised before anything was yielded
+        raise ValueError("no children")
+    yield "</div>"
+
+def markdown_to_html(markdown, rewrite_url = None, cache = None, compact = False):
+    # fast path for callers that only want the html string: byte-identical to
+    # markdown_to_html_node(markdown).to_html(compact) without building either
+    # the TextNode lists or the HTMLNode tree
+    return "".join(iter_markdown_html(markdown, rewrite_url, cache, compact))
@@ -0,0 +1,151 @@
+from manifest import BUILD_MANIFEST, SHARD_MANIFEST, Manifest, build_manifest_path, is_build_output
+from output import ChangeLog, remove_unexpected, same_content
+from sync import sync_file
+from contextlib import nullcontext, redirect_stdout
+from pathlib import Path
+import argparse
+import sys
+
+PROJECT_ROOT = Path(__file__).parent.parent
+
+class MergeError(Exception):
+    def __init__(self, problems):
+        self.problems = problems
+        super().__init__(f"{len(problems)} problem(s) merging shards:\n" + "\n".join(problems))
+
+def load_shard(shard_dir):
+    # the manifest a --shard build left in its output directory
+    path = Path(shard_dir) / SHARD_MANIFEST
+    if not path.exists():
+        raise MergeError([f"{shard_dir}: no {SHARD_MANIFEST}, not a --shard build"])
+    manifest = Manifest.load(path)
+    if manifest.shard is None:
+        raise MergeError([f"{path}: unreadable or not written by a --shard build"])
+    return manifest
+
+def _relative(dest, manifest):
+    # outputs are recorded under the directory the shard was built into,
+    # which need not be where its files are now, e.g. copied off a build host
+    return Path(dest).relative_to(manifest.shard["root"]).as_posix()
+
+def shard_outputs(manifest, shard_dir):
+    # (path relative to the shard, file in the shard, what it was built from)
+    recorded = [(dest, entry["source"]) for dest, entry in manifest.entries.items()]
+    recorded += list(manifest.assets.items())
+    recorded += list(manifest.compressed.items())
+    for dest, source in recorded:
+        rel = _relative(dest, manifest)
+        yield rel, Path(shard_dir) / rel, source
+
+def merge_shards(shard_dirs, dest_dir, link = True, manifest_path = None, own_dest = False):
+    # checks every shard before touching dest_dir: all N shards of one build,
+    # rendered from the same template and base path, no output claimed twice
+    # and every recorded file present.  Then dest_dir is made to match the
+    # union, leaving files whose bytes did not change alone.  Unless own_dest
+    # says it is the site's docs/, dest_dir must be empty or an earlier
+    # build's, and a manifest is kept under .builds/ to say so next time.
+    dest_dir = Path(dest_dir)
+    problems = []
+    if not own_dest:
+        owner = build_manifest_path(PROJECT_ROOT, dest_dir)
+        if not is_build_output(dest_dir, owner):
+            raise MergeError([f"{dest_dir} is not empty and no earlier build wrote to it; "
+                              f"refusing to remove what is in it. Empty it or choose another --out."])
+        if manifest_path is None:
+            manifest_path = owner
+    shards = [(Path(d), load_shard(d)) for d in shard_dirs]
+
+    counts = {manifest.shard["count"] for _, manifest in shards}
+    if len(counts) > 1:
+        problems.append(f"shards disagree on the shard count: {sorted(counts)}")
+    else:
+        count = counts.pop()
+        indexes = sorted(manifest.shard["index"] for _, manifest in shards)
+        missing = sorted(set(range(1, count + 1)) - set(indexes))
+        if missing:
+            problems.append(f"missing shard(s) {', '.join(map(str, missing))} of {count}")
+        repeated = sorted({i for i in indexes if indexes.count(i) > 1})
+        if repeated:
+            problems.append(f"shard(s) {', '.join(map(str, repeated))} given more than once")
+    inputs = {(entry["template_hash"], entry["base_path"])
+              for _, manifest in shards for entry in manifest.entries.values()}
+    if len(inputs) > 1:
+        problems.append("shards were built from different templates or base paths")
+
+    outputs = {}
+    for shard_dir, manifest in shards:
+        index = manifest.shard["index"]
+        for rel, path, source in shard_outputs(manifest, shard_dir):
+            if rel in outputs:
+                other, _, other_source = outputs[rel]
+                problems.append(f"{rel}: built by shard {other} from {other_source} "
+                                f"and by shard {index} from {source}")
+            elif not path.is_file():
+                problems.append(f"{rel}: recorded by shard {index} but missing from {shard_dir}")
+            else:
+                outputs[rel] = (index, path, source)
+    if problems:
+        raise MergeError(problems)
+
+    changes = ChangeLog(dest_dir)
+    for rel in sorted(outputs):
+        _, path, _ = outputs[rel]
+        target = dest_dir / rel
+        if same_content(path, target):
+            changes.record(target, False)
+        else:
+            sync_file(path, target, link)
+            changes.record(target, True)
+    remove_unexpected(dest_dir, changes, keep=[manifest_path] if manifest_path is not None else ())
+
+    if manifest_path is not None:
+        # the merged tree as one ordinary build would have recorded it, so
+        # later --incremental builds of dest_dir start warm
+        merged = Manifest(manifest_path, root=str(dest_dir.resolve()))
+        for _, manifest in shards:
+            for dest, entry in manifest.entries.items():
+                merged.entries[str(dest_dir / _relative(dest, manifest))] = entry
+            for dest, source in manifest.assets.items():
+                merged.assets[str(dest_dir / _relative(dest, manifest))] = source
+            for sibling, dest in manifest.compressed.items():
+                merged.compressed[str(dest_dir / _relative(sibling, manifest))] = str(dest_dir / _relative(dest, manifest))
+        merged.save()
+    return changes
+
+def main(argv = None):
+    project_root = PROJECT_ROOT
+    parser = argparse.ArgumentParser(description="Combine the output of main.py --shard builds into one docs/ tree")
+    parser.add_argument("shards", nargs="+", type=Path, help="the output directory of every shard")
+    parser.add_argument("--out", type=Path, default=project_root / "docs",
+                        help="directory to merge into (default docs/); any other must be empty, missing or "
+                             "the output of an earlier build or merge, whose manifest is kept under .builds/ "
+                             "(or $SSG_BUILDS_DIR)")
+    parser.add_argument("--manifest", type=Path, default=None,
+                        help="where to write the build manifest of the merged tree (default .build-manifest.json "
+                             "for docs/, .builds/ for any other --out)")
+    parser.add_argument("--no-link", action="store_true",
+                        help="copy files out of the shards instead of hardlinking them")
+    parser.add_argument("--changes", default=None, metavar="FILE",
+                        help="write the files the merge wrote or removed as JSON to FILE; with -, to stdout, "
+                             "and the merge logs to stderr")
+    args = parser.parse_args(argv)
+    own_dest = args.out.resolve() == (project_root / "docs").resolve()
+    manifest_path = args.manifest
+    if manifest_path is None and own_dest:
+        # replaces what an earlier build of docs/ recorded, which later
+        # --incremental builds would otherwise trust
+        manifest_path = project_root / BUILD_MANIFEST
+    # with --changes -, stdout carries nothing but the JSON
+    stdout = sys.stdout
+    with redirect_stdout(sys.stderr) if args.changes == "-" else nullcontext():
+        try:
+            changes = merge_shards(args.shards, args.out, link=not args.no_link, manifest_path=manifest_path,
+                                   own_dest=own_dest)
+        except MergeError as e:
+            sys.exit(str(e))
+        print(changes.summary())
+    if args.changes:
+        changes.save(args.changes, stdout)
+
+if __name__ == "__main__":
+    main()
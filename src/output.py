@@ -0,0 +1,118 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+_COMPARE_CHUNK = 1 << 16
+
+def temp_path(path):
+    # a sibling of path, so os.replace stays on one filesystem
+    path = Path(path)
+    return path.with_name(f".{path.name}.{os.getpid()}.tmp")
+
+def same_content(a, b):
+    # size first, then the bytes in chunks; never holds either file whole
+    try:
+        if os.stat(a).st_size != os.stat(b).st_size:
+            return False
+    except FileNotFoundError:
+        return False
+    with open(a, "rb") as fa, open(b, "rb") as fb:
+        while True:
+            chunk = fa.read(_COMPARE_CHUNK)
+            if chunk != fb.read(_COMPARE_CHUNK):
+                return False
+            if not chunk:
+                return True
+
+def write_if_changed(path, chunks):
+    # writes the chunks to a temp file, then either drops it because path
+    # already holds the same bytes or renames it over path in one step, so
+    # readers never see a half-written file.  Returns whether path changed.
+    path = Path(path)
+    tmp = temp_path(path)
+    try:
+        with open(tmp, "w") as fp:
+            fp.writelines(chunks)
+        if same_content(tmp, path):
+            tmp.unlink()
+            return False
+        os.replace(tmp, path)
+        return True
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+
+class ChangeLog():
+    # every output a build produced, and which of them it actually changed or
+    # removed, so deploys and cache purges only touch what the edit touched
+    def __init__(self, root):
+        self.root = Path(root)
+        self.outputs = set()
+        # the outputs among them whose bytes this build changed
+        self.changed = set()
+        self.written = []
+        self.removed = []
+        self.removed_paths = []
+        self.unchanged = 0
+
+    def _rel(self, path):
+        try:
+            return Path(path).relative_to(self.root).as_posix()
+        except ValueError:
+            return str(path)
+
+    def record(self, path, changed):
+        self.outputs.add(str(path))
+        if changed:
+            self.changed.add(str(path))
+            self.written.append(self._rel(path))
+        else:
+            self.unchanged += 1
+
+    def record_removed(self, path):
+        self.removed_paths.append(str(path))
+        self.removed.append(self._rel(path))
+
+    def summary(self):
+        return f"Changed {len(self.written)} files, removed {len(self.removed)}, {self.unchanged} unchanged"
+
+    def to_dict(self):
+        return {"root": str(self.root), "written": sorted(self.written), "removed": sorted(self.removed)}
+
+    def save(self, path, stdout = None):
+        # "-" is stdout, or the stream given for it while the build logs
+        # elsewhere
+        text = json.dumps(self.to_dict(), indent=1)
+        if str(path) == "-":
+            print(text, file=stdout or sys.stdout)
+        else:
+            Path(path).write_text(text + "\n")
+
+def remove_unexpected(dest_root, changes, keep = ()):
+    # without a manifest there is no record of earlier builds: anything under
+    # dest_root this build did not produce, or was told to keep, is left over,
+    # so it goes, along with directories emptied by that
+    dest_root = Path(dest_root)
+    keep = {str(p) for p in keep}
+    if not dest_root.exists():
+        return
+    stack = [str(dest_root)]
+    dirs = []
+    while stack:
+        root = stack.pop()
+        dirs.append(root)
+        with os.scandir(root) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.path not in changes.outputs and entry.path not in keep:
+                    print(f"Removing {entry.path}")
+                    os.unlink(entry.path)
+                    changes.record_removed(entry.path)
+    # deepest first, so a parent sees its children gone
+    for d in reversed(dirs[1:]):
+        with os.scandir(d) as it:
+            empty = next(it, None) is None
+        if empty:
+            os.rmdir(d)
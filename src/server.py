@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from socketserver import ThreadingMixIn, UnixStreamServer
+from urllib.parse import parse_qs, urlparse
+
+from compress import discard_compressed
+from discover import DEFAULT_IGNORE, discover, is_ignored, is_page, page_dest
+from main import generate_page, generate_page_incremental, prune_empty_parents, remove_stale_outputs, template_hash_of
+from manifest import hash_file
+from output import ChangeLog
+from sync import sync_directory
+
+class BuildRequestError(Exception):
+    # a request that names something outside the build; status is the HTTP code
+    def __init__(self, message, status = 400):
+        super().__init__(message)
+        self.status = status
+
+class BuildServer():
+    # one long-lived build: the manifest, the render cache and the compiled
+    # template stay in memory between requests, which are served one at a time
+    def __init__(self, content_dir, static_dir, template_path, dest_dir, base_path, manifest, cache = None, link = False, ignore = DEFAULT_IGNORE, minify = False):
+        self.content_dir = Path(content_dir)
+        self.static_dir = Path(static_dir)
+        self.template_path = Path(template_path)
+        self.dest_dir = Path(dest_dir)
+        self.base_path = base_path
+        self.manifest = manifest
+        self.cache = cache
+        self.link = link
+        self.ignore = ignore
+        self.minify = minify
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.builds = 0
+
+    def _rel(self, rel):
+        # a "/"-separated path relative to content/, refusing anything outside
+        rel = rel.strip("/")
+        root = self.content_dir.resolve()
+        target = (root / rel).resolve()
+        if target != root and root not in target.parents:
+            raise BuildRequestError(f"{rel} is outside the content directory")
+        return target.relative_to(root).as_posix() if target != root else ""
+
+    def _plan(self, page, subtree):
+        if page is not None:
+            rel = self._rel(page)
+            if not is_page(rel) or is_ignored(rel, self.ignore):
+                raise BuildRequestError(f"{rel} is not a page")
+            source = self.content_dir / rel
+            if not source.is_file():
+                raise BuildRequestError(f"{rel} does not exist", 404)
+            return [(str(source), page_dest(rel, self.dest_dir))]
+        plan = discover(self.content_dir, self.dest_dir, self.ignore)
+        if subtree is None:
+            return plan
+        rel = self._rel(subtree)
+        prefix = f"{self.content_dir}/{rel}/" if rel else f"{self.content_dir}/"
+        pages = [(source, dest) for source, dest in plan.pages if source.startswith(prefix)]
+        if not pages:
+            raise BuildRequestError(f"no pages under {rel or '/'}", 404)
+        return pages
+
+    def build(self, page = None, subtree = None, force = False):
+        # page and subtree are relative to content/; with neither the whole
+        # site is built, static files and stale outputs included
+        received = time.perf_counter()
+        with self.lock:
+            start = time.perf_counter()
+            plan = self._plan(page, subtree)
+            site = page is None and subtree is None
+            pages = plan.pages if site else plan
+            changes = ChangeLog(self.dest_dir)
+            if site:
+                self.manifest.begin_build()
+                sync_directory(self.static_dir, self.dest_dir, self.manifest, self.link, extra=plan.assets, changes=changes)
+            planned = time.perf_counter()
+
+            template_hash = template_hash_of(self.template_path, minify=self.minify)
+            errors = []
+            for from_path, dest_path in pages:
+                try:
+                    if force:
+                        changed = generate_page(from_path, self.template_path, dest_path, self.base_path, verbose=False, cache=self.cache,
+                                                minify=self.minify)
+                        self.manifest.record(dest_path, from_path, hash_file(from_path), template_hash, self.base_path)
+                    else:
+                        changed = generate_page_incremental(from_path, self.template_path, dest_path, self.base_path,
+                                                            self.manifest, template_hash, self.cache, minify=self.minify)
+                    changes.record(dest_path, changed)
+                except Exception as e:
+                    errors.append({"source": from_path, "error": f"{type(e).__name__}: {e}"})
+            rendered = time.perf_counter()
+
+            if site and not errors:
+                remove_stale_outputs(self.manifest, self.dest_dir, changes)
+            # rebuilt pages are not recompressed, and a stale sibling would
+            # outlive the next --incremental build, which sees the page as fresh
+            discard_compressed(changes)
+            for dest in changes.removed_paths:
+                prune_empty_parents(dest, self.dest_dir)
+            self.manifest.save()
+            self.builds += 1
+            done = time.perf_counter()
+
+        ms = lambda seconds: round(seconds * 1000, 3)
+        result = changes.to_dict()
+        result.update({
+            "pages": len(pages),
+            "unchanged": changes.unchanged,
+            "errors": errors,
+            "timing_ms": {
+                "queued": ms(start - received),
+                "plan": ms(planned - start),
+                "render": ms(rendered - planned),
+                "finish": ms(done - rendered),
+                "total": ms(done - received),
+            },
+        })
+        return result
+
+    def status(self):
+        status = {
+            "uptime_s": round(time.time() - self.started, 1),
+            "builds": self.builds,
+            "pages": len(self.manifest.entries),
+            "base_path": self.base_path,
+        }
+        if self.cache is not None:
+            status["cache"] = dict(self.cache.stats(), entries=len(self.cache.entries))
+        return status
+
+class _BuildHandler(BaseHTTPRequestHandler):
+    # GET  /status
+    # GET  /build?page=blog/post.md | ?subtree=blog | (whole site) [&force=1]
+    # POST /build with the same fields as a JSON object
+    server_version = "ssg-build/1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def address_string(self):
+        # unix socket peers have no address
+        return self.client_address[0] if self.client_address else "unix"
+
+    def _reply(self, status, data):
+        body = json.dumps(data, indent=1).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _build(self, fields):
+        try:
+            result = self.server.builder.build(fields.get("page"), fields.get("subtree"), bool(fields.get("force")))
+        except BuildRequestError as e:
+            self._reply(e.status, {"error": str(e)})
+            return
+        except Exception as e:
+            self._reply(500, {"error": f"{type(e).__name__}: {e}"})
+            return
+        self._reply(500 if result["errors"] else 200, result)
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == "/status":
+            self._reply(200, self.server.builder.status())
+        elif url.path == "/build":
+            query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            if "force" in query:
+                query["force"] = query["force"] not in ("", "0", "false")
+            self._build(query)
+        else:
+            self._reply(404, {"error": f"no such endpoint: {url.path}"})
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/build":
+            self._reply(404, {"error": f"no such endpoint: {self.path}"})
+            return
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            fields = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._reply(400, {"error": "body is not JSON"})
+            return
+        if not isinstance(fields, dict):
+            self._reply(400, {"error": "body must be a JSON object"})
+            return
+        self._build(fields)
+
+class _UnixHTTPServer(ThreadingMixIn, UnixStreamServer):
+    daemon_threads = True
+
+def make_server(builder, port = 8888, host = "127.0.0.1", socket_path = None):
+    if socket_path is not None:
+        Path(socket_path).unlink(missing_ok=True)
+        server = _UnixHTTPServer(str(socket_path), _BuildHandler)
+    else:
+        server = ThreadingHTTPServer((host, port), _BuildHandler)
+    server.builder = builder
+    return server
+
+def serve_builds(builder, port = 8888, host = "127.0.0.1", socket_path = None):
+    server = make_server(builder, port, host, socket_path)
+    if socket_path is not None:
+        where = socket_path
+    else:
+        host, port = server.server_address[:2]
+        where = f"http://{host}:{port}"
+    print(f"Build server listening on {where}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if socket_path is not None:
+            Path(socket_path).unlink(missing_ok=True)
+        builder.manifest.save()
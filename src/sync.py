@@ -0,0 +1,102 @@
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from output import temp_path
+
+def walk_files(root, rel = ""):
+    # (relative path, DirEntry) for every file, using scandir's cached stats
+    with os.scandir(root) as it:
+        for entry in it:
+            entry_rel = f"{rel}/{entry.name}" if rel else entry.name
+            if entry.is_dir():
+                yield from walk_files(entry.path, entry_rel)
+            elif entry.is_file():
+                yield entry_rel, entry
+
+def is_up_to_date(src_stat, dst):
+    try:
+        dst_stat = os.stat(dst)
+    except FileNotFoundError:
+        return False
+    return (dst_stat.st_size == src_stat.st_size
+            and dst_stat.st_mtime_ns == src_stat.st_mtime_ns)
+
+def sync_file(src, dst, link = False):
+    # copy with metadata so the mtime comparison in is_up_to_date holds on the
+    # next run, or hardlink when asked and possible.  A hardlinked output is
+    # the source: an in-place edit changes it before any build runs, and the
+    # build then sees nothing to sync or report.  Either way the new file is
+    # made under a temp name and renamed over dst.
+    dst = Path(dst)
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = temp_path(dst)
+    tmp.unlink(missing_ok=True)
+    how = "copied"
+    try:
+        if link:
+            try:
+                os.link(src, tmp)
+                how = "linked"
+            except OSError:
+                pass
+        if how == "copied":
+            shutil.copy2(src, tmp)
+        os.replace(tmp, dst)
+    except BaseException:
+        tmp.unlink(missing_ok=True)
+        raise
+    return how
+
+def sync_directory(src, dst, manifest = None, link = False, jobs = 8, extra = (), changes = None, names = None):
+    # mirror src into dst, touching only files whose size or mtime differ.
+    # extra holds (source, target, stat) of files from elsewhere, such as the
+    # assets of a build plan, synced in the same pass.  With a manifest, files
+    # synced by an earlier run whose source is gone are removed too.  A src of
+    # None syncs only the extra files.  names maps a path relative to src to
+    # another it is also published under, e.g. a fingerprinted name; the
+    # original stays for the url()s in stylesheets and paths built in scripts,
+    # which no build rewrites.
+    dst = Path(dst)
+    files = []
+    if src is not None:
+        src = Path(src)
+        names = names or {}
+        for rel, entry in walk_files(src):
+            st = entry.stat()
+            files.append((entry.path, dst / rel, st))
+            if rel in names:
+                files.append((entry.path, dst / names[rel], st))
+    files.extend(extra)
+    todo = []
+    unchanged = 0
+    for source, target, stat in files:
+        if manifest is not None:
+            manifest.record_asset(target, source)
+        if is_up_to_date(stat, target):
+            unchanged += 1
+            if changes is not None:
+                changes.record(target, False)
+        else:
+            todo.append((source, target))
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        results = list(pool.map(lambda job: sync_file(job[0], job[1], link), todo))
+    for (source, target), how in zip(todo, results):
+        print(f"{how.capitalize()} {source} to {target}")
+        if changes is not None:
+            changes.record(target, True)
+
+    removed = 0
+    if manifest is not None:
+        for target in manifest.stale_assets():
+            print(f"Removing {target}")
+            Path(target).unlink(missing_ok=True)
+            manifest.forget_asset(target)
+            removed += 1
+            if changes is not None:
+                changes.record_removed(target)
+
+    print(f"Synced {src or 'content assets'}: {len(todo)} updated, {unchanged} unchanged, {removed} removed")
+    return [target for _, target in todo]
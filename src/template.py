@@ -0,0 +1,127 @@
+import hashlib
+import re
+from functools import lru_cache
+from pathlib import Path
+
+from htmlnode import PRESERVE_TAGS
+
+_SLOT_RE = re.compile(r"\{\{ (\w+) \}\}")
+_ROOT_URL_RE = re.compile(r'(href|src)="/([^"]*)')
+
+# minify: elements kept byte for byte, comments (but not IE conditionals),
+# and whitespace runs, skipping quoted attribute values, which are kept as
+# written like the preserved elements
+_PRESERVED_RE = re.compile(rf"(<({'|'.join(sorted(PRESERVE_TAGS))})\b.*?</\2\s*>)", re.S | re.I)
+_COMMENT_RE = re.compile(r"<!--(?!\[if).*?-->", re.S)
+_SPACE_RE = re.compile(r"""=[ \t\r\n\f]*(?:"[^"]*"|'[^']*')|([ \t\r\n\f]+)""")
+_TAG_NAME_RE = re.compile(r"</?([!\w-]+)")
+
+# tags whitespace beside which never renders: block-level elements and
+# whatever lives in <head>
+_BLOCK_TAGS = frozenset({
+    "!doctype", "html", "head", "body", "title", "meta", "link", "base", "script", "style", "noscript",
+    "address", "article", "aside", "blockquote", "dd", "details", "dialog", "div", "dl", "dt",
+    "fieldset", "figcaption", "figure", "footer", "form", "h1", "h2", "h3", "h4", "h5", "h6", "header",
+    "hgroup", "hr", "li", "main", "nav", "ol", "p", "pre", "section", "summary", "table", "tbody", "td",
+    "tfoot", "th", "thead", "tr", "ul",
+})
+
+def _tag_at(text, pos):
+    m = _TAG_NAME_RE.match(text, pos)
+    return m.group(1).lower() if m else None
+
+def _space(m):
+    # a run with a line break beside a block-level tag is indentation and
+    # goes; beside text or an inline tag it separates words, so it stays as
+    # one space, like any other run
+    if m.group(1) is None:
+        return m.group(0)
+    if "\n" not in m.group(1):
+        return " "
+    text = m.string
+    if m.start() > 0 and text[m.start() - 1] == ">" and _tag_at(text, text.rfind("<", 0, m.start())) in _BLOCK_TAGS:
+        return ""
+    if m.end() < len(text) and text[m.end()] == "<" and _tag_at(text, m.end()) in _BLOCK_TAGS:
+        return ""
+    return " "
+
+def minify_template(text):
+    parts = _PRESERVED_RE.split(text)
+    out = []
+    # split() puts each preserved element at 3k+1 and its tag name at 3k+2
+    for i in range(0, len(parts), 3):
+        # a preserved element next to the chunk stands in as that tag
+        head = f"</{parts[i - 1]}>" if i > 0 else ""
+        tail = f"<{parts[i + 2]}>" if i + 1 < len(parts) else ""
+        chunk = head + _COMMENT_RE.sub("", parts[i]) + tail
+        chunk = _SPACE_RE.sub(_space, chunk)
+        out.append(chunk[len(head):len(chunk) - len(tail)])
+        if tail:
+            out.append(parts[i + 1])
+    return "".join(out).strip()
+
+class Template():
+    # a template is split once into literal text and named {{ Slot }}s, so
+    # rendering a page is a single join instead of a replace per placeholder
+    def __init__(self, text, base_path = "/", assets = None, minify = False):
+        self.base_path = base_path
+        # an AssetMap of fingerprinted static names, or None
+        self.assets = assets
+        # pages rendered with a minified template get compact content too
+        self.minify = minify
+        if minify:
+            text = minify_template(text)
+        # root-relative links in the template itself are rewritten here, once;
+        # links inside rendered content go through rewrite_url instead
+        text = _ROOT_URL_RE.sub(lambda m: f'{m.group(1)}="{self.rewrite_url("/" + m.group(2))}', text)
+        # identifies what pages are rendered with, for caches shared by builds
+        self.digest = hashlib.sha256(text.encode()).hexdigest()
+        if assets:
+            # content links are rewritten through the map as well
+            self.digest = hashlib.sha256(f"{self.digest}\0{assets.digest}".encode()).hexdigest()
+        if minify:
+            # a template may have nothing to minify, but its content will
+            self.digest = hashlib.sha256(f"{self.digest}\0minify".encode()).hexdigest()
+        self.literals = []
+        self.slots = []
+        pos = 0
+        for m in _SLOT_RE.finditer(text):
+            self.literals.append(text[pos:m.start()])
+            self.slots.append(m.group(1))
+            pos = m.end()
+        self.literals.append(text[pos:])
+
+    def rewrite_url(self, url):
+        if url.startswith("/"):
+            path = url[1:]
+            if self.assets:
+                path = self.assets.url_path(path)
+            return self.base_path + path
+        return url
+
+    def render_chunks(self, **values):
+        # a value may be a string or an iterable of strings, such as the
+        # chunks of HTMLNode.iter_html(), which are passed through as-is
+        yield self.literals[0]
+        for name, literal in zip(self.slots, self.literals[1:]):
+            value = values.get(name)
+            if value is None:
+                # unknown placeholders are left in the page untouched
+                yield f"{{{{ {name} }}}}"
+            elif isinstance(value, str):
+                yield value
+            else:
+                yield from value
+            yield literal
+
+    def render(self, **values):
+        return "".join(self.render_chunks(**values))
+
+@lru_cache(maxsize=16)
+def _load_template(template_path, base_path, mtime_ns, size, assets, minify):
+    return Template(Path(template_path).read_text(), base_path, assets, minify)
+
+def load_template(template_path, base_path = "/", assets = None, minify = False):
+    # cached per process; the stat key picks up edits to the template file
+    st = Path(template_path).stat()
+    return _load_template(str(template_path), base_path, st.st_mtime_ns, st.st_size, assets, minify)
@@ -0,0 +1,121 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from assets import AssetManifest, AssetMap, fingerprint_name, is_fingerprinted
+from cache import RenderCache
+from main import cache_namespace, generate_page, template_hash_of
+from sync import sync_directory
+from template import Template
+
+class TestFingerprintNames(unittest.TestCase):
+    def test_hash_goes_before_the_suffix(self):
+        self.assertEqual(fingerprint_name("index.css", "3f9a1c2b7d00ff"), "index.3f9a1c2b7d.css")
+        self.assertEqual(fingerprint_name("images/a.b.png", "0123456789ab"), "images/a.b.0123456789.png")
+        self.assertEqual(fingerprint_name("LICENSE", "0123456789ab"), "LICENSE.0123456789")
+
+    def test_fixed_names(self):
+        for rel in ["index.css", "images/tom.png", "js/app.js"]:
+            self.assertTrue(is_fingerprinted(rel), rel)
+        for rel in ["robots.txt", "favicon.ico", "about/index.html", ".well-known"]:
+            self.assertFalse(is_fingerprinted(rel), rel)
+
+    def test_url_path_keeps_query_and_fragment(self):
+        assets = AssetMap({"index.css": "index.abc.css"})
+        self.assertEqual(assets.url_path("index.css"), "index.abc.css")
+        self.assertEqual(assets.url_path("index.css?v=2#top"), "index.abc.css?v=2#top")
+        self.assertEqual(assets.url_path("blog/tom"), "blog/tom")
+
+    def test_maps_compare_by_content(self):
+        self.assertEqual(AssetMap({"a": "b"}), AssetMap({"a": "b"}))
+        self.assertEqual(hash(AssetMap({"a": "b"})), hash(AssetMap({"a": "b"})))
+        self.assertNotEqual(AssetMap({"a": "b"}).digest, AssetMap({"a": "c"}).digest)
+
+class TestAssetPipeline(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.static = self.root / "static"
+        (self.static / "images").mkdir(parents=True)
+        (self.static / "index.css").write_text("body {}")
+        (self.static / "images" / "tom.png").write_bytes(b"png")
+        (self.static / "robots.txt").write_text("")
+        self.dest = self.root / "docs"
+        self.out = io.StringIO()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_manifest_rehashes_only_touched_files(self):
+        manifest = AssetManifest.load(self.dest / "asset-manifest.json")
+        assets = manifest.fingerprint(self.static)
+        self.assertEqual(sorted(assets.names), ["images/tom.png", "index.css"])
+        self.assertTrue(manifest.save())
+        self.assertFalse(manifest.save())
+
+        again = AssetManifest.load(self.dest / "asset-manifest.json")
+        # a stale digest is kept while size and mtime match: nothing is reread
+        again.records["index.css"]["name"] = "index.cached.css"
+        self.assertEqual(again.fingerprint(self.static).names["index.css"], "index.cached.css")
+        (self.static / "index.css").write_text("body { margin: 0 }")
+        self.assertNotEqual(again.fingerprint(self.static).names["index.css"], "index.cached.css")
+
+    def test_static_files_published_under_fingerprinted_names(self):
+        assets = AssetManifest(self.root / "m.json").fingerprint(self.static)
+        with redirect_stdout(self.out):
+            sync_directory(self.static, self.dest, names=assets.names)
+        published = sorted(p.relative_to(self.dest).as_posix() for p in self.dest.rglob("*") if p.is_file())
+        self.assertEqual(published, sorted(["robots.txt", "index.css", "images/tom.png", *assets.names.values()]))
+
+    def test_stylesheet_references_still_resolve(self):
+        # url()s in a stylesheet are relative to it and are not rewritten
+        (self.static / "index.css").write_text("body { background: url(images/tom.png) }")
+        assets = AssetManifest(self.root / "m.json").fingerprint(self.static)
+        with redirect_stdout(self.out):
+            sync_directory(self.static, self.dest, names=assets.names)
+        css = self.dest / assets.names["index.css"]
+        self.assertEqual(css.read_text(), "body { background: url(images/tom.png) }")
+        self.assertEqual((css.parent / "images" / "tom.png").read_bytes(), b"png")
+
+    def test_template_and_content_links_are_rewritten(self):
+        assets = AssetMap({"index.css": "index.abc.css", "images/tom.png": "images/tom.def.png"})
+        template = self.root / "template.html"
+        template.write_text('<link href="/index.css"><a href="/blog/">{{ Title }}</a>{{ Content }}')
+        source = self.root / "page.md"
+        source.write_text("# Tom\n\n![Tom](/images/tom.png) and [css](/index.css) and ![x](https://x/tom.png)")
+        dest = self.root / "page.html"
+        with redirect_stdout(self.out):
+            generate_page(source, template, dest, "/site/", assets=assets)
+        html = dest.read_text()
+        self.assertIn('<link href="/site/index.abc.css">', html)
+        self.assertIn('<a href="/site/blog/">', html)
+        self.assertIn('src="/site/images/tom.def.png"', html)
+        self.assertIn('href="/site/index.abc.css"', html)
+        self.assertIn('src="https://x/tom.png"', html)
+
+    def test_new_fingerprints_invalidate_cached_blocks(self):
+        template = self.root / "template.html"
+        template.write_text("{{ Content }}")
+        source = self.root / "page.md"
+        source.write_text("# Tom\n\n![Tom](/images/tom.png)")
+        dest = self.root / "page.html"
+        for name in ["images/tom.1.png", "images/tom.2.png"]:
+            assets = AssetMap({"images/tom.png": name})
+            # a fresh cache per build, sharing only the disk tier
+            cache = RenderCache(cache_dir=self.root / "cache", namespace=cache_namespace("/", assets))
+            with redirect_stdout(self.out):
+                generate_page(source, template, dest, "/", cache=cache, assets=assets)
+            self.assertIn(f'src="/{name}"', dest.read_text())
+        self.assertEqual(cache_namespace("/", AssetMap()), "/")
+
+    def test_new_fingerprints_invalidate_pages(self):
+        template = self.root / "template.html"
+        template.write_text("{{ Content }}")
+        self.assertNotEqual(template_hash_of(template, AssetMap({"a": "a.1"})), template_hash_of(template, AssetMap({"a": "a.2"})))
+        self.assertEqual(template_hash_of(template, AssetMap()), template_hash_of(template))
+        self.assertNotEqual(Template("x", assets=AssetMap({"a": "a.1"})).digest, Template("x").digest)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+import io
+import unittest
+from contextlib import redirect_stdout
+
+from bench import bench_minify, bench_site, compare, make_document, parse_size, timings
+from blocks import BlockType, scan_blocks
+
+class TestCorpus(unittest.TestCase):
+    def test_document_is_deterministic(self):
+        self.assertEqual(make_document(4096, seed=3), make_document(4096, seed=3))
+        self.assertNotEqual(make_document(4096, seed=3), make_document(4096, seed=4))
+
+    def test_document_size_and_mix(self):
+        md = make_document(64 * 1024)
+        self.assertGreaterEqual(len(md), 64 * 1024)
+        self.assertLess(len(md), 66 * 1024)
+        self.assertTrue(md.startswith("# Document 0\n"))
+        types = {block.block_type for block in scan_blocks(md)}
+        self.assertEqual(types, set(BlockType))
+
+    def test_parse_size(self):
+        self.assertEqual(parse_size("1KB"), 1024)
+        self.assertEqual(parse_size("100mb"), 100 * 1024 * 1024)
+        self.assertEqual(parse_size("512"), 512)
+        self.assertEqual(parse_size("1.5K"), 1536)
+
+class TestCompare(unittest.TestCase):
+    def results(self, build, parse):
+        return {
+            "python": "3",
+            "stages": {"1MB": {"bytes": 1, "seconds": {"parse": parse, "tiny": 0.00001}}},
+            "site": {"10_pages": {"seconds": {"build": build}}},
+        }
+
+    def test_timings_are_flattened(self):
+        self.assertEqual(timings(self.results(2.0, 1.0)),
+                         {"stages.1MB.parse": 1.0, "stages.1MB.tiny": 0.00001, "site.10_pages.build": 2.0})
+
+    def test_regressions_over_threshold(self):
+        baseline = self.results(2.0, 1.0)
+        self.assertEqual(compare(self.results(2.1, 1.05), baseline, 0.10), [])
+        regressions = compare(self.results(2.5, 1.05), baseline, 0.10)
+        self.assertEqual([r["timing"] for r in regressions], ["site.10_pages.build"])
+        self.assertEqual(regressions[0]["change"], 0.25)
+
+    def test_short_timings_are_not_compared(self):
+        now = self.results(2.0, 1.0)
+        now["stages"]["1MB"]["seconds"]["tiny"] = 0.001
+        self.assertEqual(compare(now, self.results(2.0, 1.0), 0.10), [])
+
+class TestSiteBench(unittest.TestCase):
+    def test_parallel_build_prints_nothing(self):
+        out = io.StringIO()
+        with redirect_stdout(out):
+            result = bench_site(4, page_size=512, jobs=2)
+        self.assertEqual(out.getvalue(), "")
+        self.assertEqual(result["pages"], 4)
+
+class TestMinifyBench(unittest.TestCase):
+    def test_reports_bytes_saved_and_time_added(self):
+        result = bench_minify(3, page_size=1024, repeat=1)
+        self.assertLess(result["bytes"]["minified"], result["bytes"]["plain"])
+        self.assertGreater(result["saved_pct"], 0)
+        self.assertEqual(set(result["seconds"]), {"plain", "minified"})
+
+if __name__ == "__main__":
+    unittest.main()
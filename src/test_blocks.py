@@ -1,6 +1,8 @@
 import unittest
 
-from blocks import BlockType, block_to_block_type, markdown_to_blocks
+import io
+
+from blocks import BlockType, block_to_block_type, markdown_to_blocks, scan_blocks
 
 
 class TestMarkdownToBlocks(unittest.TestCase):
@@ -158,5 +160,37 @@ class TestBlockToBlockType(unittest.TestCase):
         self.assertEqual(block_to_block_type(md2), BlockType.PARAGRAPH)
 
 
+class TestScanBlocks(unittest.TestCase):
+    def test_yields_typed_blocks_with_line_ranges(self):
+        md = "# Title\n\nSome text\nmore text\n\n\n- a\n- b\n"
+        blocks = list(scan_blocks(md))
+        self.assertEqual([b.block_type for b in blocks],
+                         [BlockType.HEADING, BlockType.PARAGRAPH, BlockType.UNORDERED_LIST])
+        self.assertEqual([b.text for b in blocks], markdown_to_blocks(md))
+        self.assertEqual([(b.start, b.end) for b in blocks], [(0, 1), (2, 4), (6, 8)])
+        self.assertEqual(blocks[2].lines, ["- a", "- b"])
+
+    def test_fenced_code_keeps_blank_lines(self):
+        md = "intro\n\n```\nx = 1\n\ny = 2\n```\n\nafter"
+        blocks = list(scan_blocks(md))
+        self.assertEqual(len(blocks), 3)
+        self.assertEqual(blocks[1].block_type, BlockType.CODE)
+        self.assertEqual(blocks[1].text, "```\nx = 1\n\ny = 2\n```")
+        self.assertEqual((blocks[1].start, blocks[1].end), (2, 7))
+
+    def test_unclosed_fence_splits_as_before(self):
+        md = "```\nx\n\ny"
+        self.assertEqual(markdown_to_blocks(md), ["```\nx", "y"])
+        self.assertEqual([(b.start, b.end) for b in scan_blocks(md)], [(0, 2), (3, 4)])
+
+    def test_file_iterator_matches_string(self):
+        md = "  A  \n\n```\ncode\n\n```\n\n> q\n> r\n"
+        self.assertEqual(list(scan_blocks(io.StringIO(md))), list(scan_blocks(md)))
+
+    def test_empty_document(self):
+        self.assertEqual(list(scan_blocks("")), [])
+        self.assertEqual(list(scan_blocks("\n \n\t\n")), [])
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,254 @@
+import http.client
+import io
+import json
+import os
+import socket
+import tempfile
+import unittest
+import urllib.error
+from contextlib import redirect_stderr, redirect_stdout
+from pathlib import Path
+from threading import Thread
+
+from blocks import BlockType
+from cache import ARTIFACT_CHUNK, ArtifactCache, DirectoryBackend, HTTPBackend, RenderCache, main, make_artifact_server
+from main import generate_page, generate_pages_parallel, parse_args
+from markdown import markdown_to_html_node
+from template import Template
+
+class TestRenderCache(unittest.TestCase):
+    def test_miss_then_hit(self):
+        cache = RenderCache()
+        key = cache.key("hello", BlockType.PARAGRAPH)
+        self.assertIsNone(cache.get(key))
+        cache.put(key, "<p>hello</p>")
+        self.assertEqual(cache.get(key), "<p>hello</p>")
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_depends_on_type_and_namespace(self):
+        cache = RenderCache()
+        self.assertNotEqual(cache.key("x", BlockType.PARAGRAPH), cache.key("x", BlockType.QUOTE))
+        self.assertNotEqual(
+            RenderCache(namespace="/").key("x", BlockType.PARAGRAPH),
+            RenderCache(namespace="/site/").key("x", BlockType.PARAGRAPH),
+        )
+
+    def test_lru_eviction(self):
+        cache = RenderCache(max_entries=2)
+        cache.put("a", "A")
+        cache.put("b", "B")
+        cache.get("a")
+        cache.put("c", "C")
+        self.assertEqual(list(cache.entries), ["a", "c"])
+        self.assertEqual(cache.evictions, 1)
+
+    def test_disk_tier_survives_new_instance(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            first = RenderCache(cache_dir=tmp)
+            key = first.key("hello", BlockType.PARAGRAPH)
+            first.put(key, "<p>hello</p>")
+            second = RenderCache(cache_dir=tmp)
+            self.assertEqual(second.get(key), "<p>hello</p>")
+            self.assertEqual(second.disk_hits, 1)
+
+    def test_prune_trims_disk_to_budget(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            cache = RenderCache(cache_dir=tmp, max_disk_bytes=10)
+            for i in range(5):
+                cache.put(cache.key(str(i), BlockType.PARAGRAPH), "x" * 4)
+            cache.prune()
+            total = sum(p.stat().st_size for p in Path(tmp).glob("*/*"))
+            self.assertLessEqual(total, 10)
+
+    def test_cached_render_matches_uncached(self):
+        md = "# Title\n\nSame **block**\n\n- a\n- [b](/x)\n\nSame **block**\n\n```\ncode\n```"
+        cache = RenderCache()
+        expected = markdown_to_html_node(md).to_html()
+        self.assertEqual(markdown_to_html_node(md, cache=cache).to_html(), expected)
+        self.assertEqual(markdown_to_html_node(md, cache=cache).to_html(), expected)
+        self.assertEqual(cache.misses, 4)
+        self.assertEqual(cache.hits, 6)
+
+
+class TestArtifactCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.template = self.root / "template.html"
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.source = self.root / "page.md"
+        self.source.write_text("# Page\n\nSome **text**.")
+        self.out = io.StringIO()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_key_covers_every_input(self):
+        artifacts = ArtifactCache(DirectoryBackend(self.root / "a"))
+        template = Template("<p>{{ Content }}</p>")
+        key = artifacts.key("abc", template, "/")
+        self.assertEqual(key, artifacts.key("abc", Template("<p>{{ Content }}</p>"), "/"))
+        self.assertNotEqual(key, artifacts.key("abd", template, "/"))
+        self.assertNotEqual(key, artifacts.key("abc", Template("<div>{{ Content }}</div>"), "/"))
+        self.assertNotEqual(key, artifacts.key("abc", template, "/blog/"))
+
+    def test_directory_prune_evicts_least_recently_used(self):
+        backend = DirectoryBackend(self.root / "a", max_bytes=8)
+        keys = [f"{i:064x}" for i in range(3)]
+        for age, key in enumerate(keys):
+            backend.put(key, b"xxxx")
+            os.utime(backend._path(key), (age, age))
+        backend.get(keys[0])
+        self.assertEqual(backend.prune(), 1)
+        self.assertIsNone(backend.get(keys[1]))
+        self.assertEqual(backend.stats()["entries"], 2)
+
+    def page(self, dest, artifacts):
+        with redirect_stdout(self.out):
+            return generate_page(self.source, self.template, dest, "/", artifacts=artifacts)
+
+    def test_hit_skips_rendering(self):
+        location = self.root / "a"
+        first = ArtifactCache(DirectoryBackend(location))
+        self.assertTrue(self.page(self.root / "one.html", first))
+        self.assertEqual((first.misses, first.stores), (1, 1))
+
+        # a fresh checkout: new process, new cache object, same directory
+        second = ArtifactCache(DirectoryBackend(location))
+        self.assertTrue(self.page(self.root / "two.html", second))
+        self.assertEqual(second.stats(), {"hits": 1, "misses": 0, "stores": 0, "errors": 0})
+        self.assertEqual((self.root / "two.html").read_text(), (self.root / "one.html").read_text())
+
+        # the cached bytes are used as they are, without parsing the source
+        (stored,) = location.glob("*/*")
+        stored.write_bytes(b"from the cache")
+        self.page(self.root / "three.html", second)
+        self.assertEqual((self.root / "three.html").read_text(), "from the cache")
+
+    def test_parallel_workers_share_the_cache(self):
+        location = self.root / "a"
+        pages = []
+        for i in range(4):
+            source = self.root / f"p{i}.md"
+            source.write_text(f"# Page {i}\n\nBody {i}.")
+            pages.append((str(source), str(self.root / "out" / f"p{i}.html")))
+        first = ArtifactCache(DirectoryBackend(location))
+        with redirect_stdout(self.out):
+            generate_pages_parallel(pages, self.template, "/", 2, artifacts=first)
+        self.assertEqual((first.misses, first.stores), (4, 4))
+        second = ArtifactCache(DirectoryBackend(location))
+        with redirect_stdout(self.out):
+            generate_pages_parallel(pages, self.template, "/", 2, artifacts=second)
+        self.assertEqual(second.hits, 4)
+
+    def test_http_backend(self):
+        server = make_artifact_server(DirectoryBackend(self.root / "served"), port=0)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        url = "http://{}:{}".format(*server.server_address[:2])
+
+        first = ArtifactCache(HTTPBackend(url))
+        self.page(self.root / "one.html", first)
+        second = ArtifactCache(HTTPBackend(url))
+        self.page(self.root / "two.html", second)
+        self.assertEqual((first.stores, second.hits), (1, 1))
+        self.assertEqual((self.root / "two.html").read_text(), (self.root / "one.html").read_text())
+        self.assertEqual(HTTPBackend(url).stats()["entries"], 1)
+        with self.assertRaises(urllib.error.HTTPError) as cm:
+            HTTPBackend(url).get("not-a-key")
+        cm.exception.close()
+        self.assertEqual(cm.exception.code, 400)
+
+    def serve(self):
+        server = make_artifact_server(DirectoryBackend(self.root / "served"), port=0)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server.server_address[:2]
+
+    def raw_put(self, address, head, body):
+        with socket.create_connection(address, timeout=5) as sock:
+            sock.sendall(head + b"\r\n" + body)
+            sock.shutdown(socket.SHUT_WR)
+            reply = b""
+            while chunk := sock.recv(4096):
+                reply += chunk
+        return int(reply.split()[1])
+
+    def test_truncated_put_is_not_stored(self):
+        address = self.serve()
+        key = "a" * 64
+        head = f"PUT /{key} HTTP/1.1\r\nHost: x\r\nContent-Length: 1000\r\n".encode()
+        self.assertEqual(self.raw_put(address, head, b"<html><body>part"), 400)
+        self.assertIsNone(HTTPBackend("http://{}:{}".format(*address)).get(key))
+
+    def test_put_without_length_is_refused(self):
+        address = self.serve()
+        key = "b" * 64
+        self.assertEqual(self.raw_put(address, f"PUT /{key} HTTP/1.1\r\nHost: x\r\n".encode(), b""), 411)
+        self.assertIsNone(HTTPBackend("http://{}:{}".format(*address)).get(key))
+
+    def test_empty_payload_is_a_miss(self):
+        backend = DirectoryBackend(self.root / "a")
+        backend.put("c" * 64, b"")
+        artifacts = ArtifactCache(backend)
+        self.assertIsNone(artifacts.get("c" * 64))
+        self.assertEqual((artifacts.hits, artifacts.misses), (0, 1))
+
+    def test_unreachable_server_only_costs_a_render(self):
+        artifacts = ArtifactCache(HTTPBackend("http://127.0.0.1:9", timeout=1))
+        self.assertTrue(self.page(self.root / "one.html", artifacts))
+        self.assertEqual(artifacts.stats(), {"hits": 0, "misses": 0, "stores": 0, "errors": 2})
+
+    def test_broken_server_responses_only_cost_a_render(self):
+        class Flaky():
+            def open(self, key):
+                raise http.client.IncompleteRead(b"<html")
+            def put_file(self, key, path):
+                raise http.client.BadStatusLine("garbage")
+        artifacts = ArtifactCache(Flaky())
+        self.assertTrue(self.page(self.root / "one.html", artifacts))
+        self.assertEqual(artifacts.stats(), {"hits": 0, "misses": 0, "stores": 0, "errors": 2})
+
+    def test_artifact_cut_off_midway_is_rendered_instead(self):
+        class Cut(io.BytesIO):
+            def read(self, n):
+                if self.tell():
+                    raise http.client.IncompleteRead(b"")
+                return super().read(4)
+        class Backend():
+            def open(self, key):
+                return Cut(b"<html><body>part")
+            def put_file(self, key, path):
+                pass
+        artifacts = ArtifactCache(Backend())
+        self.assertTrue(self.page(self.root / "one.html", artifacts))
+        self.assertIn("<title>Page</title>", (self.root / "one.html").read_text())
+        self.assertEqual(artifacts.stats(), {"hits": 0, "misses": 0, "stores": 1, "errors": 1})
+
+    def test_large_page_streams_in_chunks(self):
+        self.source.write_text("# Page\n\n" + "word " * 100000)
+        location = self.root / "a"
+        self.page(self.root / "one.html", ArtifactCache(DirectoryBackend(location)))
+        chunks = ArtifactCache(DirectoryBackend(location)).get(next(location.glob("*/*")).name)
+        sizes = [len(chunk) for chunk in chunks]
+        self.assertGreater(len(sizes), 1)
+        self.assertLessEqual(max(sizes), ARTIFACT_CHUNK)
+        self.assertEqual(sum(sizes), (self.root / "one.html").stat().st_size)
+
+    def test_artifacts_option_never_takes_the_base_path(self):
+        args = parse_args(["--artifacts", ".artifacts", "/site/"])
+        self.assertEqual((args.artifacts, args.basepath), (".artifacts", "/site/"))
+        with redirect_stderr(self.out), self.assertRaises(SystemExit):
+            parse_args(["/site/", "--artifacts"])
+
+    def test_stats_command(self):
+        DirectoryBackend(self.root / "a").put("0" * 64, b"abc")
+        with redirect_stdout(self.out):
+            main(["stats", str(self.root / "a")])
+        stats = json.loads(self.out.getvalue())
+        self.assertEqual((stats["entries"], stats["bytes"]), (1, 3))
+
+if __name__ == "__main__":
+    unittest.main()
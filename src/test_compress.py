@@ -0,0 +1,92 @@
+import gzip
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from compress import compress_file, discard_compressed, encoders, is_compressible, keep_compressed, precompress
+from output import ChangeLog, remove_unexpected
+
+class TestPrecompress(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.page = self.root / "index.html"
+        self.page.write_text("<p>hello</p>" * 100)
+        self.out = io.StringIO()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def changes(self, *changed):
+        changes = ChangeLog(self.root)
+        for p in self.root.rglob("*"):
+            if p.is_file() and p.suffix not in (".gz", ".br"):
+                changes.record(p, p in changed)
+        return changes
+
+    def test_compressible(self):
+        self.assertTrue(is_compressible("docs/index.html"))
+        self.assertTrue(is_compressible("docs/INDEX.CSS"))
+        self.assertFalse(is_compressible("docs/photo.png"))
+
+    def test_gzip_is_deterministic_and_round_trips(self):
+        self.assertEqual(compress_file(self.page)[0], (f"{self.page}.gz", "written"))
+        first = Path(f"{self.page}.gz").read_bytes()
+        compress_file(self.page)
+        self.assertEqual(Path(f"{self.page}.gz").read_bytes(), first)
+        self.assertEqual(gzip.decompress(first), self.page.read_bytes())
+
+    def test_small_and_incompressible_files_are_skipped(self):
+        small = self.root / "small.css"
+        small.write_text("a{}")
+        self.assertEqual(compress_file(small)[0], (f"{small}.gz", "small"))
+        noise = self.root / "noise.txt"
+        noise.write_bytes(os.urandom(4096))
+        Path(f"{noise}.gz").write_bytes(b"left by an older build")
+        self.assertEqual(compress_file(noise)[:2], [(f"{noise}.gz", "removed"), (f"{noise}.gz", "ratio")])
+        self.assertFalse(Path(f"{noise}.gz").exists())
+
+    def test_only_changed_or_missing_siblings_are_compressed(self):
+        other = self.root / "blog" / "post.html"
+        other.parent.mkdir()
+        other.write_text("<p>post</p>" * 100)
+        stats = precompress(self.changes(self.page, other))
+        self.assertEqual(stats.written, 2 * len(encoders()))
+        self.assertGreater(stats.bytes_in, stats.bytes_out)
+
+        # unchanged with current siblings: nothing to do
+        self.assertEqual(precompress(self.changes()).written, 0)
+        # a sibling went missing, so that page is redone even though unchanged
+        Path(f"{other}.gz").unlink()
+        changes = self.changes()
+        self.assertEqual(precompress(changes).written, len(encoders()))
+        self.assertIn("blog/post.html.gz", changes.written)
+
+    def test_siblings_follow_their_output(self):
+        precompress(self.changes(self.page))
+        gz = Path(f"{self.page}.gz")
+        # kept by remove_unexpected while the page is an output
+        changes = self.changes()
+        keep_compressed(changes)
+        with redirect_stdout(self.out):
+            remove_unexpected(self.root, changes)
+        self.assertTrue(gz.exists())
+        # dropped with the page
+        changes = ChangeLog(self.root)
+        self.page.unlink()
+        changes.record_removed(self.page)
+        precompress(changes)
+        self.assertFalse(gz.exists())
+        self.assertIn("index.html.gz", changes.removed)
+
+    def test_discarded_when_precompression_is_off(self):
+        precompress(self.changes(self.page))
+        self.page.write_text("<p>edited</p>" * 100)
+        discard_compressed(self.changes(self.page))
+        self.assertFalse(Path(f"{self.page}.gz").exists())
+
+if __name__ == "__main__":
+    unittest.main()
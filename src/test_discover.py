@@ -0,0 +1,79 @@
+import shutil
+import tempfile
+import unittest
+from pathlib import Path
+
+from discover import DEFAULT_IGNORE, discover, is_ignored, page_dest, shard_of
+
+class TestPageDest(unittest.TestCase):
+    def test_only_the_suffix_is_replaced(self):
+        # rstrip(".md") used to eat trailing m, d and . characters too
+        self.assertEqual(page_dest("command.md", "docs"), "docs/command.html")
+        self.assertEqual(page_dest("blog/read.md.md", "docs"), "docs/blog/read.md.html")
+        self.assertEqual(page_dest("index.md", "docs"), "docs/index.html")
+
+class TestIgnore(unittest.TestCase):
+    def test_default_patterns(self):
+        for rel in [".git/config", "blog/.hidden.md", "post.md~", "#post.md#", ".post.md.swp",
+                    "drafts/idea.md", "blog/drafts/idea.md", "idea.draft.md"]:
+            self.assertTrue(is_ignored(rel), rel)
+        for rel in ["index.md", "blog/post.md", "images/a.png", "draftsman.md"]:
+            self.assertFalse(is_ignored(rel), rel)
+
+    def test_path_patterns_match_from_the_content_root(self):
+        ignore = DEFAULT_IGNORE + ("blog/private",)
+        self.assertTrue(is_ignored("blog/private/x.md", ignore))
+        self.assertFalse(is_ignored("private/x.md", ignore))
+
+class TestDiscover(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.content = Path(self.tmp.name) / "content"
+        for rel in ["index.md", "command.md", "b/index.md", "a/z.md", "a/sub/index.md",
+                    "a/photo.png", "drafts/wip.md", "a/.index.md.swp", ".DS_Store"]:
+            p = self.content / rel
+            p.parent.mkdir(parents=True, exist_ok=True)
+            p.write_text(rel)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_plan(self):
+        plan = discover(self.content, "docs")
+        c = str(self.content)
+        self.assertEqual(plan.pages, [
+            (f"{c}/a/sub/index.md", "docs/a/sub/index.html"),
+            (f"{c}/a/z.md", "docs/a/z.html"),
+            (f"{c}/b/index.md", "docs/b/index.html"),
+            (f"{c}/command.md", "docs/command.html"),
+            (f"{c}/index.md", "docs/index.html"),
+        ])
+        self.assertEqual([(source, dest) for source, dest, _ in plan.assets], [(f"{c}/a/photo.png", "docs/a/photo.png")])
+        self.assertEqual(plan.assets[0][2].st_size, len("a/photo.png"))
+        self.assertEqual(plan.ignored, [".DS_Store", "a/.index.md.swp", "drafts"])
+        self.assertEqual(plan.summary(), "Planned 5 pages, 1 assets (3 ignored)")
+
+    def test_extra_ignore(self):
+        plan = discover(self.content, "docs", DEFAULT_IGNORE + ("a",))
+        self.assertEqual([dest for _, dest in plan.pages], ["docs/b/index.html", "docs/command.html", "docs/index.html"])
+        self.assertEqual(plan.assets, [])
+
+    def test_shards_partition_the_plan(self):
+        plan = discover(self.content, "docs")
+        parts = [plan.shard(i, 3) for i in (1, 2, 3)]
+        self.assertEqual(sorted(page for part in parts for page in part.pages), sorted(plan.pages))
+        self.assertEqual(sum(len(part.assets) for part in parts), len(plan.assets))
+        # decided by the path under content/, not by where content/ lives
+        moved = Path(self.tmp.name) / "elsewhere" / "content"
+        shutil.copytree(self.content, moved)
+        elsewhere = discover(moved, "docs")
+        self.assertEqual([[dest for _, dest in elsewhere.shard(i, 3).pages] for i in (1, 2, 3)],
+                         [[dest for _, dest in part.pages] for part in parts])
+
+    def test_shard_of_is_stable(self):
+        # a digest, so these hold across runs and machines unlike hash()
+        self.assertEqual([shard_of(f"p{i}.md", 4) for i in range(8)], [0, 3, 1, 1, 3, 0, 1, 1])
+        self.assertEqual(shard_of("blog/post.md", 1), 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,6 +2,9 @@ import unittest
 
 from textnode import TextNode, TextType
 from inline import extract_markdown_images, extract_markdown_links, split_nodes_delimiter, split_nodes_image, split_nodes_link, text_to_textnodes  # adjust if needed
+import time
+
+from inline import _index_in_spans, _merge_spans, _scan_link
 
 
 class TestSplitNodesDelimiter(unittest.TestCase):
@@ -678,5 +681,176 @@ class TestTextToTextNodes(unittest.TestCase):
         text = "bad `code"
         with self.assertRaises(Exception):
             text_to_textnodes(text)
+
+
+class TestSplitNodesTokensLinear(unittest.TestCase):
+    def test_split_links_keeps_commas(self):
+        nodes = split_nodes_link([TextNode("a, [b](https://b.com), c", TextType.TEXT)])
+        self.assertEqual(
+            nodes,
+            [
+                TextNode("a, ", TextType.TEXT),
+                TextNode("b", TextType.LINK, "https://b.com"),
+                TextNode(", c", TextType.TEXT),
+            ],
+        )
+
+    def test_split_images_keeps_commas_without_images(self):
+        nodes = split_nodes_image([TextNode("one, two, three", TextType.TEXT)])
+        self.assertEqual(nodes, [TextNode("one, two, three", TextType.TEXT)])
+
+    def test_opener_inside_url_is_covered(self):
+        nodes = split_nodes_link([TextNode("[a](x[y) z", TextType.TEXT)])
+        self.assertEqual(nodes, [TextNode("a", TextType.LINK, "x[y"), TextNode(" z", TextType.TEXT)])
+
+    def test_uncovered_opener_after_many_links_raises(self):
+        text = " ".join(f"[l{i}](https://ex.com/{i})" for i in range(500)) + " [oops"
+        with self.assertRaises(Exception):
+            split_nodes_link([TextNode(text, TextType.TEXT)])
+
+    def test_many_links_split_in_order(self):
+        text = " ".join(f"[l{i}](u{i})" for i in range(500))
+        nodes = split_nodes_link([TextNode(text, TextType.TEXT)])
+        links = [n for n in nodes if n.text_type == TextType.LINK]
+        self.assertEqual(links[-1], TextNode("l499", TextType.LINK, "u499"))
+        self.assertEqual(len(nodes), 999)
+
+
+class TestLinkScanner(unittest.TestCase):
+    def test_scan_link_parts(self):
+        text = "see [wiki](https://en.wikipedia.org/wiki/Foo_(bar)) now"
+        label, url, url_start, end = _scan_link(text, 4)
+        self.assertEqual((label, url), ("wiki", "https://en.wikipedia.org/wiki/Foo_(bar)"))
+        self.assertEqual(text[url_start:end], url + ")")
+        self.assertEqual(text[end:], " now")
+
+    def test_scan_link_rejects(self):
+        for text in ["[a]()", "[a](x y)", "[a](x", "[a](x(y)", "[a](x((y)))", "[a]((x))", "[a[b](x)", "[a] (x)"]:
+            self.assertIsNone(_scan_link(text, 0), text)
+
+    def test_groups_and_trailing_text_in_url(self):
+        self.assertEqual(_scan_link("[a](x()y(z)w)", 0)[1], "x()y(z)w")
+
+
+class TestPathologicalUrls(unittest.TestCase):
+    # inputs that make a backtracking url pattern do a lot of work; the
+    # scanner must finish them in time proportional to their length
+    N = 50000
+    BUDGET = 2.0  # seconds, generous on purpose
+
+    def assertFast(self, fn, *args):
+        start = time.perf_counter()
+        try:
+            result = fn(*args)
+        except Exception as e:
+            result = e
+        self.assertLess(time.perf_counter() - start, self.BUDGET)
+        return result
+
+    def test_unclosed_url(self):
+        text = "[a](" + "x" * self.N
+        self.assertEqual(self.assertFast(extract_markdown_links, text), [])
+        self.assertIsInstance(self.assertFast(text_to_textnodes, text), Exception)
+
+    def test_unclosed_group(self):
+        text = "[a](x(" + "y" * self.N + " z)"
+        self.assertEqual(self.assertFast(extract_markdown_links, text), [])
+
+    def test_many_nested_opens(self):
+        text = "[a](" + "x(" * self.N
+        self.assertEqual(self.assertFast(extract_markdown_links, text), [])
+
+    def test_many_unterminated_links(self):
+        text = "[a](b" * (self.N // 5)
+        self.assertEqual(self.assertFast(extract_markdown_links, text), [])
+        self.assertIsInstance(self.assertFast(split_nodes_link, [TextNode(text, TextType.TEXT)]), Exception)
+
+    def test_many_unterminated_images(self):
+        text = "![a](b c" * (self.N // 8)
+        self.assertEqual(self.assertFast(extract_markdown_images, text), [])
+
+    def test_long_valid_url_with_groups(self):
+        url = "x" + "(y)z" * (self.N // 4)
+        nodes = self.assertFast(text_to_textnodes, f"[a]({url}) tail")
+        self.assertEqual(nodes, [TextNode("a", TextType.LINK, url), TextNode(" tail", TextType.TEXT)])
+
+
+class TestProtectedSpans(unittest.TestCase):
+    def test_merge_spans_sorts_and_merges(self):
+        self.assertEqual(_merge_spans([(10, 12), (0, 3), (2, 5), (5, 7)]), ([0, 10], [7, 12]))
+
+    def test_index_in_spans(self):
+        spans = _merge_spans([(2, 4), (8, 9)])
+        self.assertEqual([i for i in range(10) if _index_in_spans(i, spans)], [2, 3, 8])
+
+    def test_delimiters_in_many_link_urls_are_skipped(self):
+        text = " ".join(f"[l{i}](https://ex.com/{i}_x)" for i in range(200)) + " _it_"
+        nodes = split_nodes_delimiter([TextNode(text, TextType.TEXT)], "_", TextType.ITALIC)
+        self.assertEqual(nodes[-1], TextNode("it", TextType.ITALIC))
+        self.assertEqual(len(nodes), 2)
+
+
+def staged_text_to_textnodes(text):
+    # the original five-pass pipeline, used as the reference for the tokenizer
+    nodes = [TextNode(text, TextType.TEXT)]
+    nodes = split_nodes_delimiter(nodes, "**", TextType.BOLD)
+    nodes = split_nodes_delimiter(nodes, "_", TextType.ITALIC)
+    nodes = split_nodes_delimiter(nodes, "`", TextType.CODE)
+    nodes = split_nodes_image(nodes)
+    return split_nodes_link(nodes)
+
+
+class TestTextToTextNodesMatchesStagedPipeline(unittest.TestCase):
+    SAMPLES = [
+        "plain",
+        "**bold** and _it_ and `code`",
+        "**a _b_ `c`** _d `x`_ `f`",
+        "***x***",
+        "a `` b ____ c",
+        "[l](https://ex.com/a_b**c`d) _i_",
+        "![p](/img_1.png) **b** [l](/x)",
+        "**[l](/x)** _![p](/y)_ `[z`",
+        "See [wiki](https://en.wikipedia.org/wiki/Foo_(bar)) now",
+        "x(y) [l](a(b)c) ![i](a(b)c) (z)",
+        "![a](u)[b](v)![c](w)",
+        "! [x](u) !! ![y](v)",
+        "](x) ] ) [ok](u)",
+        "unicode _café_ [über](https://ex.com/ü)",
+    ]
+
+    def test_samples(self):
+        for text in self.SAMPLES:
+            with self.subTest(text=text):
+                self.assertEqual(text_to_textnodes(text), staged_text_to_textnodes(text))
+
+    def test_invalid_samples_raise(self):
+        for text in ["**a", "_a", "`a", "a [b", "a ![b](u", "**a** _b", "[x](![y](z))", "[a](x![b)"]:
+            with self.subTest(text=text):
+                with self.assertRaises(Exception):
+                    staged_text_to_textnodes(text)
+                with self.assertRaises(Exception):
+                    text_to_textnodes(text)
+
+    def test_commas_are_kept(self):
+        self.assertEqual(
+            text_to_textnodes("Hello, [a](u), world"),
+            [
+                TextNode("Hello, ", TextType.TEXT),
+                TextNode("a", TextType.LINK, "u"),
+                TextNode(", world", TextType.TEXT),
+            ],
+        )
+
+    def test_delimiters_in_link_label_stay_in_label(self):
+        self.assertEqual(
+            text_to_textnodes("see [snake_case](u) here"),
+            [
+                TextNode("see ", TextType.TEXT),
+                TextNode("snake_case", TextType.LINK, "u"),
+                TextNode(" here", TextType.TEXT),
+            ],
+        )
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,64 @@
+import json
+import tempfile
+import unittest
+from pathlib import Path
+
+from instrument import NULL_PROFILER, Profiler, percentile
+
+class TestPercentile(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = [float(v) for v in range(1, 101)]
+        self.assertEqual(percentile(values, 50), 50.0)
+        self.assertEqual(percentile(values, 95), 95.0)
+        self.assertEqual(percentile(values, 99), 99.0)
+        self.assertEqual(percentile([7.0], 99), 7.0)
+        self.assertEqual(percentile([], 50), 0.0)
+
+class TestProfiler(unittest.TestCase):
+    def test_stages_are_totalled_and_attributed_to_pages(self):
+        profiler = Profiler()
+        profiler.start()
+        with profiler.stage("walk"):
+            pass
+        for name in ["a", "b"]:
+            with profiler.page(f"{name}.md", f"{name}.html"):
+                with profiler.stage("parse"):
+                    data = [0] * 10000
+                with profiler.stage("write"):
+                    pass
+        profiler.stop()
+        self.assertEqual(list(profiler.stages), ["walk", "parse", "write"])
+        self.assertEqual(profiler.stages["parse"]["calls"], 2)
+        self.assertGreater(profiler.stages["parse"]["alloc_bytes"], 8 * 10000)
+        self.assertEqual([p["dest"] for p in profiler.pages], ["a.html", "b.html"])
+        self.assertEqual(set(profiler.pages[0]["stages"]), {"parse", "write"})
+        self.assertGreater(profiler.peak_bytes, 0)
+        self.assertEqual(sum(count for _, count in profiler.histogram()), 2)
+        self.assertIn("slowest 2 pages:", profiler.summary())
+        del data
+
+    def test_trace_is_chrome_trace_json(self):
+        profiler = Profiler(trace_memory=False)
+        profiler.start()
+        with profiler.page("a.md", "a.html"):
+            with profiler.stage("parse"):
+                pass
+        profiler.stop()
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "trace.json"
+            profiler.write_trace(path)
+            data = json.loads(path.read_text())
+        self.assertEqual([(e["name"], e["ph"]) for e in data["traceEvents"]], [("parse", "X"), ("a.html", "X")])
+        self.assertEqual(data["profile"]["pages"], 1)
+        self.assertEqual(data["profile"]["peak_bytes"], 0)
+
+    def test_null_profiler_is_inert(self):
+        self.assertFalse(NULL_PROFILER.enabled)
+        NULL_PROFILER.start()
+        with NULL_PROFILER.page("a.md", "a.html"):
+            with NULL_PROFILER.stage("parse"):
+                pass
+        NULL_PROFILER.stop()
+
+if __name__ == "__main__":
+    unittest.main()
@@ -26,5 +26,25 @@ class testLeafNode(unittest.TestCase):
         node = LeafNode("span", "X", {"class": "badge"})
         self.assertEqual(node.to_html(), '<span class="badge">X</span>')
 
+    def test_leaf_is_slotted_and_has_no_children(self):
+        node = LeafNode("p", "x")
+        self.assertIsNone(node.children)
+        self.assertFalse(hasattr(node, "__dict__"))
+
+class TestLeafNodeCompact(unittest.TestCase):
+    def test_text_whitespace_collapses(self):
+        self.assertEqual(LeafNode(None, "a \n  b").to_html(compact=True), "a b")
+        self.assertEqual(LeafNode("b", "a\t\tb").to_html(compact=True), "<b>a b</b>")
+        # a no-break space is text, not whitespace
+        self.assertEqual(LeafNode(None, "a\xa0\xa0b").to_html(compact=True), "a\xa0\xa0b")
+
+    def test_code_is_kept_as_written(self):
+        self.assertEqual(LeafNode("code", "a  \n b").to_html(compact=True), "<code>a  \n b</code>")
+
+    def test_void_element_has_no_end_tag(self):
+        node = LeafNode("img", "", {"src": "/a.png", "alt": "two  spaces"})
+        self.assertEqual(node.to_html(compact=True), '<img src="/a.png" alt="two  spaces">')
+        self.assertEqual(node.to_html(), '<img src="/a.png" alt="two  spaces"></img>')
+
 if __name__ == "__main__":
     unittest.main()
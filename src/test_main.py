@@ -1,5 +1,19 @@
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
 import unittest
-from main import extract_title
+from unittest import mock
+from pathlib import Path
+import main as main_module
+from main import BuildError, collect_pages, extract_title, generate_page, generate_page_recursively, generate_pages_parallel, remove_stale_outputs
+from manifest import BUILD_MANIFEST, BUILDS_DIR_ENV, Manifest, build_manifest_path
+from instrument import Profiler
+
+PROJECT_ROOT = Path(__file__).parent.parent
 
 class testExtractTitle(unittest.TestCase):
 
@@ -66,5 +80,217 @@ class testExtractTitle(unittest.TestCase):
         with self.assertRaises(ValueError):
             extract_title(None)
 
+    def test_reads_file_lines(self):
+        self.assertEqual(extract_title(io.StringIO("intro\n\n# From a file \nbody\n")), "From a file")
+        with self.assertRaises(ValueError):
+            extract_title(io.StringIO("no title\n"))
+
+class testStreamingPage(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.template = self.root / "template.html"
+        self.template.write_text('<title>{{ Title }}</title><a href="/">home</a>{{ Content }}')
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_title_after_body_still_fills_head(self):
+        (self.root / "page.md").write_text("A [link](/x).\n\n```\nx\n\ny\n```\n\n# Late title\n")
+        generate_page(self.root / "page.md", self.template, self.root / "out" / "page.html", "/base/", verbose=False)
+        self.assertEqual(
+            (self.root / "out" / "page.html").read_text(),
+            '<title>Late title</title><a href="/base/">home</a>'
+            '<div><p>A <a href="/base/x">link</a>.</p><pre><code>x\n\ny\n</code></pre><h1>Late title</h1></div>',
+        )
+
+    def test_profiled_page_matches_streamed_page(self):
+        (self.root / "page.md").write_text("# T\n\nA [link](/x) and **bold**.\n\n> q\n\n1. a\n2. b\n")
+        profiler = Profiler(trace_memory=False)
+        generate_page(self.root / "page.md", self.template, self.root / "streamed.html", "/b/", verbose=False)
+        with profiler.page("page.md", "profiled.html"):
+            generate_page(self.root / "page.md", self.template, self.root / "profiled.html", "/b/", verbose=False, profiler=profiler)
+        self.assertEqual((self.root / "profiled.html").read_text(), (self.root / "streamed.html").read_text())
+        self.assertEqual(list(profiler.pages[0]["stages"]), ["read", "parse", "serialize", "template", "write"])
+
+    def test_failed_page_leaves_no_output(self):
+        dest = self.root / "page.html"
+        dest.write_text("old")
+        (self.root / "page.md").write_text("# Title\n\nfine\n\nbroken **bold\n")
+        with self.assertRaises(Exception):
+            generate_page(self.root / "page.md", self.template, dest, "/", verbose=False)
+        self.assertEqual(dest.read_text(), "old")
+        self.assertEqual(sorted(p.name for p in self.root.iterdir()), ["page.html", "page.md", "template.html"])
+
+class testIncrementalBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.dest = root / "docs"
+        self.template = root / "template.html"
+        (self.content / "blog").mkdir(parents=True)
+        (self.content / "index.md").write_text("# Home")
+        (self.content / "blog" / "index.md").write_text("# Blog")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.manifest = Manifest(root / "manifest.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self):
+        self.manifest.save()
+        self.manifest = Manifest.load(self.manifest.path)
+        generate_page_recursively(self.content, self.template, self.dest, "/", self.manifest)
+        remove_stale_outputs(self.manifest, self.dest)
+
+    def test_unchanged_pages_are_skipped(self):
+        self.build()
+        out = self.dest / "index.html"
+        out.write_text("untouched")
+        self.build()
+        self.assertEqual(out.read_text(), "untouched")
+
+    def test_changed_source_is_rebuilt(self):
+        self.build()
+        (self.content / "index.md").write_text("# Changed")
+        self.build()
+        self.assertIn("<title>Changed</title>", (self.dest / "index.html").read_text())
+
+    def test_changed_template_rebuilds_everything(self):
+        self.build()
+        self.template.write_text("<h1>{{ Title }}</h1>{{ Content }}")
+        self.build()
+        self.assertIn("<h1>Blog</h1>", (self.dest / "blog" / "index.html").read_text())
+
+    def test_new_generator_rebuilds_everything(self):
+        self.build()
+        out = self.dest / "index.html"
+        out.write_text("rendered by an older generator")
+        with mock.patch.object(main_module, "GENERATOR_VERSION", main_module.GENERATOR_VERSION + 1):
+            self.build()
+        self.assertIn("<title>Home</title>", out.read_text())
+
+    def test_removed_source_deletes_output(self):
+        self.build()
+        (self.content / "blog" / "index.md").unlink()
+        self.build()
+        self.assertFalse((self.dest / "blog").exists())
+        self.assertTrue((self.dest / "index.html").exists())
+
+class testParallelBuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.dest = root / "docs"
+        self.template = root / "template.html"
+        for name in ["b", "a", "c"]:
+            (self.content / name).mkdir(parents=True)
+            (self.content / name / "index.md").write_text(f"# Page {name}\n\nSome **text**.")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_collect_pages_is_sorted_and_maps_destinations(self):
+        pages = collect_pages(self.content, self.dest)
+        self.assertEqual(
+            pages,
+            [(f"{self.content}/{n}/index.md", f"{self.dest}/{n}/index.html") for n in ["a", "b", "c"]],
+        )
+
+    def test_parallel_output_matches_serial(self):
+        generate_page_recursively(self.content, self.template, self.dest / "serial", "/")
+        generate_pages_parallel(collect_pages(self.content, self.dest / "parallel"), self.template, "/", 2)
+        for name in ["a", "b", "c"]:
+            self.assertEqual(
+                (self.dest / "serial" / name / "index.html").read_text(),
+                (self.dest / "parallel" / name / "index.html").read_text(),
+            )
+
+    def test_parallel_collects_every_failure(self):
+        (self.content / "a" / "index.md").write_text("no title here")
+        (self.content / "c" / "index.md").write_text("also no title")
+        with self.assertRaises(BuildError) as cm:
+            generate_pages_parallel(collect_pages(self.content, self.dest), self.template, "/", 2)
+        failed = [from_path for from_path, _ in cm.exception.failures]
+        self.assertEqual(failed, [f"{self.content}/a/index.md", f"{self.content}/c/index.md"])
+        self.assertTrue((self.dest / "b" / "index.html").exists())
+
+class testOutDirectory(unittest.TestCase):
+    # the repo's own content/, built by main.py into temporary directories
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        # manifests stay in the temporary directory, out of the checkout
+        builds = mock.patch.dict(os.environ, {BUILDS_DIR_ENV: str(self.root / ".builds")})
+        builds.start()
+        self.addCleanup(builds.stop)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, *args, check = True):
+        main = Path(__file__).parent / "main.py"
+        return subprocess.run([sys.executable, str(main), "/", *map(str, args)], check=check, capture_output=True, text=True)
+
+    def files(self, root):
+        return sorted(p.relative_to(root).as_posix() for p in root.rglob("*") if p.is_file())
+
+    def test_incremental_builds_into_different_directories_keep_their_outputs(self):
+        a, b = self.root / "a", self.root / "b"
+        self.build("--incremental", "--out", a)
+        built = self.files(a)
+        self.assertNotIn(BUILD_MANIFEST, built)
+        self.assertTrue(build_manifest_path(PROJECT_ROOT, a).exists())
+        self.build("--incremental", "--out", b)
+        self.assertEqual(self.files(a), built)
+        self.assertEqual(self.files(b), built)
+
+    def test_moved_output_does_not_delete_from_the_old_directory(self):
+        a, b = self.root / "a", self.root / "b"
+        self.build("--incremental", "--out", a)
+        built = self.files(a)
+        shutil.copytree(a, b)
+        # a copy carries no record of the build, so it is not the build's to clean
+        result = self.build("--incremental", "--out", b, check=False)
+        self.assertIn("refusing", result.stderr)
+        self.assertEqual(self.files(a), built)
+        self.assertEqual(self.files(b), built)
+
+    def test_output_left_with_an_in_tree_manifest_is_cleaned(self):
+        out = self.root / "out"
+        self.build("--out", out)
+        built = self.files(out)
+        (out / BUILD_MANIFEST).write_text("{}")
+        build_manifest_path(PROJECT_ROOT, out).unlink()
+        self.build("--incremental", "--out", out)
+        self.assertEqual(self.files(out), built)
+
+    def test_changes_on_stdout_are_only_json(self):
+        out = self.root / "out"
+        result = self.build("--out", out, "--changes", "-")
+        changes = json.loads(result.stdout)
+        self.assertEqual(sorted(changes["written"]), self.files(out))
+        self.assertIn("Changed", result.stderr)
+
+    def test_refuses_a_directory_no_build_wrote(self):
+        notes = self.root / "scratch" / "important" / "notes.txt"
+        notes.parent.mkdir(parents=True)
+        notes.write_text("keep me")
+        result = self.build("--out", self.root / "scratch", check=False)
+        self.assertNotEqual(result.returncode, 0)
+        self.assertIn("refusing", result.stderr)
+        self.assertEqual(self.files(self.root / "scratch"), ["important/notes.txt"])
+
+    def test_full_build_cleans_its_own_directory(self):
+        out = self.root / "out"
+        self.build("--out", out)
+        built = self.files(out)
+        (out / "leftover.html").write_text("from an earlier build")
+        self.build("--out", out)
+        self.assertEqual(self.files(out), built)
+
 if __name__ == "__main__":
     unittest.main()
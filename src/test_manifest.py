@@ -0,0 +1,79 @@
+import io
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from manifest import Manifest, hash_bytes, hash_file
+
+
+class TestManifest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+        self.dest = self.root / "index.html"
+        self.dest.write_text("<p>hi</p>")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_hash_file_matches_hash_bytes(self):
+        src = self.root / "a.md"
+        src.write_text("# A")
+        self.assertEqual(hash_file(src), hash_bytes(b"# A"))
+
+    def test_load_missing_is_empty(self):
+        manifest = Manifest.load(self.root / "missing.json")
+        self.assertEqual(manifest.entries, {})
+
+    def test_load_corrupt_is_empty(self):
+        p = self.root / "manifest.json"
+        p.write_text("{not json")
+        self.assertEqual(Manifest.load(p).entries, {})
+
+    def test_round_trip(self):
+        p = self.root / "manifest.json"
+        manifest = Manifest(p)
+        manifest.record(self.dest, "a.md", "s", "t", "/")
+        manifest.save()
+        loaded = Manifest.load(p)
+        self.assertTrue(loaded.is_fresh(self.dest, "s", "t", "/"))
+
+    def test_fresh_requires_every_input_to_match(self):
+        manifest = Manifest(self.root / "manifest.json")
+        manifest.record(self.dest, "a.md", "s", "t", "/")
+        self.assertFalse(manifest.is_fresh(self.dest, "s2", "t", "/"))
+        self.assertFalse(manifest.is_fresh(self.dest, "s", "t2", "/"))
+        self.assertFalse(manifest.is_fresh(self.dest, "s", "t", "/site/"))
+
+    def test_not_fresh_when_output_deleted(self):
+        manifest = Manifest(self.root / "manifest.json")
+        manifest.record(self.dest, "a.md", "s", "t", "/")
+        self.dest.unlink()
+        self.assertFalse(manifest.is_fresh(self.dest, "s", "t", "/"))
+
+    def test_stale_lists_unvisited_outputs(self):
+        p = self.root / "manifest.json"
+        manifest = Manifest(p)
+        manifest.record("a.html", "a.md", "s", "t", "/")
+        manifest.record("b.html", "b.md", "s", "t", "/")
+        manifest.save()
+        loaded = Manifest.load(p)
+        loaded.mark("a.html")
+        self.assertEqual(loaded.stale(), ["b.html"])
+
+    def test_manifest_of_another_root_is_ignored(self):
+        p = self.root / "manifest.json"
+        manifest = Manifest(p, root=str((self.root / "docs").resolve()))
+        manifest.record(self.root / "docs" / "a.html", "a.md", "s", "t", "/")
+        manifest.save()
+        self.assertEqual(len(Manifest.load(p, self.root / "docs").entries), 1)
+        self.assertEqual(len(Manifest.load(p).entries), 1)
+        with redirect_stdout(io.StringIO()):
+            other = Manifest.load(p, self.root / "other")
+        self.assertEqual(other.entries, {})
+        self.assertEqual(other.root, str((self.root / "other").resolve()))
+
+
+if __name__ == "__main__":
+    unittest.main()
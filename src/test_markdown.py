@@ -1,5 +1,7 @@
+import io
 import unittest
-from markdown import markdown_to_html_node
+from cache import RenderCache
+from markdown import iter_markdown_html, markdown_to_html, markdown_to_html_node
 
 class testMarkdownToHTML(unittest.TestCase):
     def test_paragraphs(self):
@@ -87,5 +89,81 @@ This is another paragraph with _italic_ text and `code` here
             "</ol></div>",
         )
 
+class testRewriteUrl(unittest.TestCase):
+    def test_links_and_images_are_rewritten(self):
+        md = "[home](/) and ![pic](/images/a.png) and [ext](https://example.com)"
+        node = markdown_to_html_node(md, lambda url: "/site" + url if url.startswith("/") else url)
+        self.assertEqual(
+            node.to_html(),
+            '<div><p><a href="/site/">home</a> and <img src="/site/images/a.png" alt="pic"></img>'
+            ' and <a href="https://example.com">ext</a></p></div>',
+        )
+
+    def test_code_is_not_rewritten(self):
+        md = "```\n<a href=\"/x\">\n```"
+        node = markdown_to_html_node(md, lambda url: "/site" + url)
+        self.assertIn('href="/x"', node.to_html())
+
+class testMarkdownToHTMLFastPath(unittest.TestCase):
+    DOCS = [
+        "# Title\n\nSome **bold**, _italic_ and `code`.\n\n> quote\n> more",
+        "```\ncode _x_\n  indented\n```\n\n- [a](/a)\n- ![b](/b.png)\n\n1. one\n2. two",
+        "###### six\n\n####### seven is a paragraph",
+        "plain\nlines joined",
+    ]
+
+    def test_matches_tree_renderer(self):
+        for md in self.DOCS:
+            with self.subTest(md=md):
+                self.assertEqual(markdown_to_html(md), markdown_to_html_node(md).to_html())
+
+    def test_matches_tree_renderer_with_rewrite(self):
+        rewrite = lambda url: "/site" + url
+        for md in self.DOCS:
+            with self.subTest(md=md):
+                self.assertEqual(markdown_to_html(md, rewrite), markdown_to_html_node(md, rewrite).to_html())
+
+    def test_empty_document_raises_like_tree(self):
+        with self.assertRaises(ValueError):
+            markdown_to_html_node("").to_html()
+        with self.assertRaises(ValueError):
+            markdown_to_html("")
+
+    def test_empty_list_item_raises_like_tree(self):
+        md = "- \n- a"
+        with self.assertRaises(ValueError):
+            markdown_to_html_node(md).to_html()
+        with self.assertRaises(ValueError):
+            markdown_to_html(md)
+
+    def test_fenced_code_with_blank_lines(self):
+        md = "```\nfirst\n\nsecond\n```"
+        self.assertEqual(markdown_to_html(md), "<div><pre><code>first\n\nsecond\n</code></pre></div>")
+        self.assertEqual(markdown_to_html_node(md).to_html(), markdown_to_html(md))
+
+    def test_streams_blocks_from_a_file(self):
+        md = "# T\n\npara with **bold**\n\n- a\n- b\n"
+        chunks = list(iter_markdown_html(io.StringIO(md)))
+        self.assertEqual(len(chunks), 5)
+        self.assertEqual("".join(chunks), markdown_to_html(md))
+
+    def test_compact_matches_tree_renderer(self):
+        md = self.DOCS[0] + "\n\n> a  b\n> c\n\n![alt  text](/x.png) and `a  b`\n\n```\nkeep   this\n```"
+        html = markdown_to_html(md, compact=True)
+        self.assertEqual(html, markdown_to_html_node(md).to_html(compact=True))
+        self.assertIn("<blockquote>a b c</blockquote>", html)
+        self.assertIn('<img src="/x.png" alt="alt  text">', html)
+        self.assertIn("<code>a  b</code>", html)
+        self.assertIn("<pre><code>keep   this\n</code></pre>", html)
+
+    def test_compact_blocks_are_cached_apart(self):
+        md = "> a\n> b"
+        cache = RenderCache()
+        self.assertEqual(markdown_to_html(md, cache=cache), "<div><blockquote>a\nb</blockquote></div>")
+        self.assertEqual(markdown_to_html(md, cache=cache, compact=True), "<div><blockquote>a b</blockquote></div>")
+        # cached html is passed through as it was stored
+        self.assertEqual(markdown_to_html_node(md, cache=cache, compact=True).to_html(compact=True),
+                         "<div><blockquote>a b</blockquote></div>")
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,125 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+from unittest import mock
+from pathlib import Path
+
+from manifest import BUILD_MANIFEST, BUILDS_DIR_ENV, SHARD_MANIFEST, Manifest, build_manifest_path
+from merge import PROJECT_ROOT, MergeError, merge_shards
+
+MAIN = Path(__file__).parent / "main.py"
+
+def build(*args):
+    subprocess.run([sys.executable, str(MAIN), "/", *map(str, args)], check=True, capture_output=True, text=True)
+
+def tree(root):
+    root = Path(root)
+    return {p.relative_to(root).as_posix(): p.read_bytes() for p in root.rglob("*")
+            if p.is_file() and p.name not in (SHARD_MANIFEST, BUILD_MANIFEST)}
+
+class TestShardedBuild(unittest.TestCase):
+    # the repo's own content/, built whole and in shards by separate processes
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp = tempfile.TemporaryDirectory()
+        cls.root = Path(cls.tmp.name)
+        # manifests stay in the temporary directory, out of the checkout
+        cls.builds = mock.patch.dict(os.environ, {BUILDS_DIR_ENV: str(cls.root / ".builds")})
+        cls.builds.start()
+        build("--out", cls.root / "full")
+        cls.shards = [cls.root / f"shard{i}" for i in (1, 2, 3)]
+        for i, shard in enumerate(cls.shards, 1):
+            build("--shard", f"{i}/3", "--out", shard)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.builds.stop()
+        cls.tmp.cleanup()
+
+    def test_shards_are_disjoint_and_merge_to_the_full_build(self):
+        parts = [tree(shard) for shard in self.shards]
+        self.assertEqual(sum(len(part) for part in parts), len(tree(self.root / "full")))
+        docs = self.root / "docs"
+        changes = merge_shards(self.shards, docs, manifest_path=self.root / "manifest.json", own_dest=True)
+        self.assertEqual(tree(docs), tree(self.root / "full"))
+        self.assertEqual(len(changes.written), len(tree(docs)))
+
+        merged = Manifest.load(self.root / "manifest.json")
+        pages = [dest for dest in merged.entries]
+        self.assertTrue(pages)
+        self.assertTrue(all(Path(dest).parent.is_relative_to(docs) for dest in pages))
+
+        # merging again writes nothing
+        self.assertEqual(merge_shards(self.shards, docs, own_dest=True).written, [])
+
+    def test_collision_is_reported_before_writing(self):
+        shards = [self.root / f"collide{i}" for i in (1, 2, 3)]
+        for src, dst in zip(self.shards, shards):
+            shutil.copytree(src, dst)
+        # shard 3 also claims a page that shard 1 built
+        first = Manifest.load(shards[0] / SHARD_MANIFEST)
+        dest, entry = next(iter(first.entries.items()))
+        rel = Path(dest).relative_to(self.shards[0])
+        (shards[2] / rel).parent.mkdir(parents=True, exist_ok=True)
+        shutil.copy(shards[0] / rel, shards[2] / rel)
+        third = Manifest.load(shards[2] / SHARD_MANIFEST)
+        third.record(Path(third.shard["root"]) / rel, entry["source"], entry["source_hash"], entry["template_hash"], entry["base_path"])
+        third.save()
+
+        docs = self.root / "collided"
+        with self.assertRaises(MergeError) as cm:
+            merge_shards(shards, docs)
+        self.assertEqual(len(cm.exception.problems), 1)
+        self.assertIn(f"{rel.as_posix()}: built by shard 1", cm.exception.problems[0])
+        self.assertFalse(docs.exists())
+
+    def test_missing_and_repeated_shards(self):
+        with self.assertRaises(MergeError) as cm:
+            merge_shards([self.shards[0], self.shards[0]], self.root / "partial")
+        problems = "\n".join(cm.exception.problems)
+        self.assertIn("missing shard(s) 2, 3 of 3", problems)
+        self.assertIn("shard(s) 1 given more than once", problems)
+
+    def test_refuses_a_directory_no_build_wrote(self):
+        precious = self.root / "precious"
+        precious.mkdir()
+        (precious / "notes.txt").write_text("keep me")
+        with self.assertRaises(MergeError) as cm:
+            merge_shards(self.shards, precious)
+        self.assertIn("refusing", cm.exception.problems[0])
+        self.assertEqual(tree(precious), {"notes.txt": b"keep me"})
+
+    def test_merges_again_into_its_own_output(self):
+        out = self.root / "merged"
+        merge_shards(self.shards, out)
+        self.assertFalse((out / BUILD_MANIFEST).exists())
+        self.assertTrue(build_manifest_path(PROJECT_ROOT, out).exists())
+        (out / "leftover.html").write_text("from an earlier merge")
+        changes = merge_shards(self.shards, out)
+        self.assertEqual(changes.removed, ["leftover.html"])
+        self.assertEqual(tree(out), tree(self.root / "full"))
+
+    def test_not_a_shard(self):
+        with self.assertRaises(MergeError):
+            merge_shards([self.root / "full"], self.root / "nope")
+
+    def test_precompressed_siblings_are_merged(self):
+        shards = [self.root / f"gz{i}" for i in (1, 2)]
+        for i, shard in enumerate(shards, 1):
+            build("--shard", f"{i}/2", "--precompress", "--out", shard)
+        gz = sorted(rel for shard in shards for rel in tree(shard) if rel.endswith(".gz"))
+        self.assertTrue(gz)
+        docs = self.root / "gz-docs"
+        merge_shards(shards, docs)
+        self.assertEqual(sorted(rel for rel in tree(docs) if rel.endswith(".gz")), gz)
+
+    def test_shard_manifest_is_readable_json(self):
+        data = json.loads((self.shards[1] / SHARD_MANIFEST).read_text())
+        self.assertEqual(data["shard"], {"index": 2, "count": 3, "root": str(self.shards[1])})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+from pathlib import Path
+
+from output import ChangeLog, remove_unexpected, same_content, write_if_changed
+
+class TestWriteIfChanged(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.root = Path(self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_new_file_is_written(self):
+        p = self.root / "a.html"
+        self.assertTrue(write_if_changed(p, ["<p>", "hi", "</p>"]))
+        self.assertEqual(p.read_text(), "<p>hi</p>")
+
+    def test_identical_output_is_left_alone(self):
+        p = self.root / "a.html"
+        p.write_text("same")
+        os.utime(p, ns=(1_000_000_000, 1_000_000_000))
+        before = p.stat()
+        self.assertFalse(write_if_changed(p, ["sa", "me"]))
+        after = p.stat()
+        self.assertEqual((after.st_ino, after.st_mtime_ns), (before.st_ino, before.st_mtime_ns))
+        self.assertEqual(sorted(os.listdir(self.root)), ["a.html"])
+
+    def test_changed_output_replaces_the_file(self):
+        p = self.root / "a.html"
+        p.write_text("old!")
+        self.assertTrue(write_if_changed(p, ["new!"]))
+        self.assertEqual(p.read_text(), "new!")
+        self.assertEqual(sorted(os.listdir(self.root)), ["a.html"])
+
+    def test_failure_keeps_the_old_file(self):
+        p = self.root / "a.html"
+        p.write_text("old")
+        def chunks():
+            yield "partial"
+            raise ValueError("boom")
+        with self.assertRaises(ValueError):
+            write_if_changed(p, chunks())
+        self.assertEqual(p.read_text(), "old")
+        self.assertEqual(sorted(os.listdir(self.root)), ["a.html"])
+
+    def test_same_content(self):
+        a, b = self.root / "a", self.root / "b"
+        a.write_bytes(b"x" * 200000)
+        b.write_bytes(b"x" * 199999 + b"y")
+        self.assertFalse(same_content(a, b))
+        b.write_bytes(b"x" * 200000)
+        self.assertTrue(same_content(a, b))
+        self.assertFalse(same_content(a, self.root / "missing"))
+
+class TestChangeLog(unittest.TestCase):
+    def test_records_relative_paths(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp) / "docs"
+            changes = ChangeLog(root)
+            changes.record(root / "b.html", True)
+            changes.record(root / "a" / "index.html", True)
+            changes.record(root / "c.html", False)
+            changes.record_removed(root / "gone.html")
+            self.assertEqual(changes.summary(), "Changed 2 files, removed 1, 1 unchanged")
+            changes.save(Path(tmp) / "changes.json")
+            data = json.loads((Path(tmp) / "changes.json").read_text())
+        self.assertEqual(data["written"], ["a/index.html", "b.html"])
+        self.assertEqual(data["removed"], ["gone.html"])
+
+class TestRemoveUnexpected(unittest.TestCase):
+    def test_only_outputs_of_this_build_survive(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            for rel in ["index.html", "blog/index.html", "old/deep/page.html", "blog/stale.html"]:
+                (root / rel).parent.mkdir(parents=True, exist_ok=True)
+                (root / rel).write_text(rel)
+            changes = ChangeLog(root)
+            changes.record(root / "index.html", False)
+            changes.record(root / "blog" / "index.html", True)
+            with redirect_stdout(io.StringIO()):
+                remove_unexpected(root, changes)
+            left = sorted(p.relative_to(root).as_posix() for p in root.rglob("*"))
+        self.assertEqual(left, ["blog", "blog/index.html", "index.html"])
+        self.assertEqual(sorted(changes.removed), ["blog/stale.html", "old/deep/page.html"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,3 +1,4 @@
+import io
 import unittest
 
 from htmlnode import ParentNode, LeafNode
@@ -112,6 +113,46 @@ class testParentNode(unittest.TestCase):
         node = ParentNode("div", (LeafNode("p", "A"), LeafNode("p", "B")))
         self.assertEqual(node.to_html(), "<div><p>A</p><p>B</p></div>")
 
+    # --- Streaming scenarios ---
+
+    def test_iter_html_joins_to_to_html(self):
+        inner = ParentNode("span", [LeafNode("b", "x"), LeafNode(None, "y")], {"class": "c"})
+        outer = ParentNode("div", [LeafNode("p", "a"), inner, LeafNode("p", "b")])
+        self.assertEqual(
+            "".join(outer.iter_html()),
+            '<div><p>a</p><span class="c"><b>x</b>y</span><p>b</p></div>',
+        )
+
+    def test_write_html_writes_same_output(self):
+        node = ParentNode("div", [ParentNode("p", [LeafNode(None, "hi")])])
+        fp = io.StringIO()
+        node.write_html(fp)
+        self.assertEqual(fp.getvalue(), node.to_html())
+
+    def test_very_deep_nesting_does_not_recurse(self):
+        node = LeafNode(None, "x")
+        for _ in range(5000):
+            node = ParentNode("span", [node])
+        html = node.to_html()
+        self.assertTrue(html.startswith("<span>" * 5000 + "x</span>"))
+        self.assertEqual(len(html), 5000 * len("<span></span>") + 1)
+
+    def test_iter_html_raises_for_invalid_grandchild(self):
+        node = ParentNode("div", [ParentNode("p", [])])
+        with self.assertRaises(ValueError):
+            "".join(node.iter_html())
+
+    def test_compact_stops_below_preserved_elements(self):
+        node = ParentNode("div", [
+            ParentNode("p", [LeafNode(None, "a  b\n"), LeafNode("i", "c   d")]),
+            ParentNode("pre", [LeafNode("code", "x  y"), LeafNode(None, "\n  z  ")]),
+            LeafNode(None, "  tail"),
+        ])
+        self.assertEqual(node.to_html(compact=True),
+                         "<div><p>a b <i>c d</i></p><pre><code>x  y</code>\n  z  </pre> tail</div>")
+        fp = io.StringIO()
+        node.write_html(fp, compact=True)
+        self.assertEqual(fp.getvalue(), node.to_html(compact=True))
 
 
 if __name__ == "__main__":
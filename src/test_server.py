@@ -0,0 +1,162 @@
+import io
+import json
+import socket
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from contextlib import redirect_stdout
+from pathlib import Path
+from threading import Thread
+
+from cache import RenderCache
+from main import collect_pages, generate_pages
+from manifest import Manifest
+from server import BuildRequestError, BuildServer, make_server
+
+
+class TestBuildServer(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.root = root
+        self.content = root / "content"
+        self.dest = root / "docs"
+        (self.content / "blog").mkdir(parents=True)
+        (root / "static").mkdir()
+        (root / "static" / "index.css").write_text("body {}")
+        (self.content / "index.md").write_text("# Home\n\nShared paragraph.")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nShared paragraph.")
+        (root / "template.html").write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.builder = BuildServer(self.content, root / "static", root / "template.html", self.dest, "/",
+                                   Manifest(root / "manifest.json"), RenderCache())
+        self.out = io.StringIO()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def build(self, **kwargs):
+        with redirect_stdout(self.out):
+            return self.builder.build(**kwargs)
+
+    def test_site_then_single_page(self):
+        result = self.build()
+        self.assertEqual(result["written"], ["blog/post.html", "index.css", "index.html"])
+        self.assertEqual(result["pages"], 2)
+        self.assertEqual(set(result["timing_ms"]), {"queued", "plan", "render", "finish", "total"})
+
+        (self.content / "blog" / "post.md").write_text("# Post\n\nEdited.")
+        result = self.build(page="blog/post.md")
+        self.assertEqual((result["pages"], result["written"]), (1, ["blog/post.html"]))
+        self.assertIn("Edited.", (self.dest / "blog" / "post.html").read_text())
+
+        # fresh in the manifest, so nothing is rendered or written
+        result = self.build(page="blog/post.md")
+        self.assertEqual((result["written"], result["unchanged"]), ([], 1))
+        # forced, rendered again but the bytes are the same
+        result = self.build(page="blog/post.md", force=True)
+        self.assertEqual((result["written"], result["unchanged"]), ([], 1))
+
+    def test_rebuilt_page_loses_its_compressed_siblings(self):
+        self.build()
+        stale = self.dest / "blog" / "post.html.gz"
+        stale.write_bytes(b"old page")
+        (self.dest / "index.html.gz").write_bytes(b"index")
+        (self.content / "blog" / "post.md").write_text("# Post\n\nEdited.")
+        result = self.build(page="blog/post.md")
+        self.assertFalse(stale.exists())
+        self.assertIn("blog/post.html.gz", result["removed"])
+        self.assertTrue((self.dest / "index.html.gz").exists())
+
+    def test_subtree_and_cache_stay_warm(self):
+        self.build()
+        (self.content / "blog" / "post.md").write_text("# Post 2\n\nShared paragraph.")
+        result = self.build(subtree="blog")
+        self.assertEqual(result["written"], ["blog/post.html"])
+        status = self.builder.status()
+        self.assertEqual(status["builds"], 2)
+        self.assertGreater(status["cache"]["hits"], 0)
+
+    def test_minify_matches_the_initial_build(self):
+        # pages a --minify build left behind are fresh to a --minify daemon
+        (self.content / "index.md").write_text("# Home\n\nShared\n   paragraph.")
+        manifest = Manifest(self.root / "manifest.json")
+        with redirect_stdout(self.out):
+            generate_pages(collect_pages(self.content, self.dest), self.root / "template.html", "/", manifest, minify=True)
+        self.builder = BuildServer(self.content, self.root / "static", self.root / "template.html", self.dest, "/",
+                                   manifest, RenderCache(), minify=True)
+        result = self.build()
+        self.assertEqual(result["written"], ["index.css"])
+        result = self.build(page="index.md", force=True)
+        self.assertEqual(result["written"], [])
+        self.assertIn("<p>Shared paragraph.</p>", (self.dest / "index.html").read_text())
+
+    def test_site_build_removes_what_was_deleted_since_the_last(self):
+        self.build()
+        (self.content / "blog" / "post.md").unlink()
+        (self.root / "static" / "index.css").unlink()
+        result = self.build()
+        self.assertEqual(result["removed"], ["blog/post.html", "index.css"])
+        self.assertFalse((self.dest / "blog" / "post.html").exists())
+        self.assertFalse((self.dest / "index.css").exists())
+        self.assertEqual(list(self.builder.manifest.entries), [str(self.dest / "index.html")])
+        self.assertEqual(self.builder.manifest.assets, {})
+
+    def test_bad_requests(self):
+        with self.assertRaises(BuildRequestError) as cm:
+            self.build(page="../template.html")
+        self.assertEqual(cm.exception.status, 400)
+        with self.assertRaises(BuildRequestError) as cm:
+            self.build(page="missing.md")
+        self.assertEqual(cm.exception.status, 404)
+        with self.assertRaises(BuildRequestError):
+            self.build(page="blog")
+
+    def test_page_errors_are_reported(self):
+        (self.content / "bad.md").write_text("no title")
+        result = self.build()
+        self.assertEqual([e["source"] for e in result["errors"]], [str(self.content / "bad.md")])
+        self.assertTrue((self.dest / "index.html").exists())
+
+    def serve(self, **kwargs):
+        server = make_server(self.builder, **kwargs)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_http(self):
+        server = self.serve(port=0)
+        host, port = server.server_address[:2]
+        with redirect_stdout(self.out):
+            with urllib.request.urlopen(f"http://{host}:{port}/build?page=index.md") as r:
+                result = json.load(r)
+            request = urllib.request.Request(f"http://{host}:{port}/build", data=b'{"subtree": "blog"}', method="POST")
+            with urllib.request.urlopen(request) as r:
+                subtree = json.load(r)
+            with self.assertRaises(urllib.error.HTTPError) as cm:
+                urllib.request.urlopen(f"http://{host}:{port}/build?page=nope.md")
+            cm.exception.close()
+        self.assertEqual(result["written"], ["index.html"])
+        self.assertEqual(subtree["written"], ["blog/post.html"])
+        self.assertEqual(cm.exception.code, 404)
+        with urllib.request.urlopen(f"http://{host}:{port}/status") as r:
+            self.assertEqual(json.load(r)["builds"], 2)
+
+    @unittest.skipUnless(hasattr(socket, "AF_UNIX"), "needs unix sockets")
+    def test_unix_socket(self):
+        path = self.root / "build.sock"
+        self.serve(socket_path=path)
+        with socket.socket(socket.AF_UNIX) as s, redirect_stdout(self.out):
+            s.connect(str(path))
+            s.sendall(b"GET /build?page=index.md HTTP/1.0\r\n\r\n")
+            response = b""
+            while chunk := s.recv(65536):
+                response += chunk
+        head, body = response.split(b"\r\n\r\n", 1)
+        self.assertTrue(head.startswith(b"HTTP/1.0 200"))
+        self.assertEqual(json.loads(body)["written"], ["index.html"])
+
+
+if __name__ == "__main__":
+    unittest.main()
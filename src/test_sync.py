@@ -0,0 +1,82 @@
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+from manifest import Manifest
+from output import ChangeLog
+from sync import sync_directory, sync_file
+
+
+class TestSync(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.src = root / "static"
+        self.dst = root / "docs"
+        (self.src / "images").mkdir(parents=True)
+        (self.src / "index.css").write_text("body {}")
+        (self.src / "images" / "a.png").write_bytes(b"\x89PNG")
+        self.manifest = Manifest(root / "manifest.json")
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def sync(self, link = False):
+        self.manifest.save()
+        self.manifest = Manifest.load(self.manifest.path)
+        return sync_directory(self.src, self.dst, self.manifest, link=link)
+
+    def test_first_sync_copies_everything(self):
+        updated = self.sync()
+        self.assertEqual(sorted(updated), [self.dst / "images" / "a.png", self.dst / "index.css"])
+        self.assertEqual((self.dst / "index.css").read_text(), "body {}")
+
+    def test_second_sync_skips_unchanged(self):
+        self.sync()
+        self.assertEqual(self.sync(), [])
+
+    def test_changed_file_is_updated(self):
+        self.sync()
+        css = self.src / "index.css"
+        css.write_text("body { color: red }")
+        os.utime(css, ns=(1, 1))
+        self.assertEqual(self.sync(), [self.dst / "index.css"])
+        self.assertEqual((self.dst / "index.css").read_text(), "body { color: red }")
+
+    def test_removed_source_is_removed_from_output(self):
+        self.sync()
+        (self.dst / "index.html").write_text("a page, not a static file")
+        (self.src / "index.css").unlink()
+        self.sync()
+        self.assertFalse((self.dst / "index.css").exists())
+        self.assertTrue((self.dst / "index.html").exists())
+
+    def test_hardlinks_when_asked(self):
+        self.sync(link=True)
+        self.assertTrue(os.path.samefile(self.src / "index.css", self.dst / "index.css"))
+
+    def test_copies_by_default(self):
+        self.sync()
+        self.assertFalse(os.path.samefile(self.src / "index.css", self.dst / "index.css"))
+
+    def test_in_place_edit_is_reported(self):
+        # an editor that rewrites the file in place must not change docs/
+        self.sync()
+        with open(self.src / "index.css", "r+") as fp:
+            fp.write("main")
+        changes = ChangeLog(self.dst)
+        sync_directory(self.src, self.dst, self.manifest, changes=changes)
+        self.assertEqual(changes.written, ["index.css"])
+        self.assertEqual((self.dst / "index.css").read_text(), "main {}")
+
+    def test_sync_file_replaces_existing(self):
+        target = self.dst / "index.css"
+        target.parent.mkdir()
+        target.write_text("old")
+        sync_file(self.src / "index.css", target, link=False)
+        self.assertEqual(target.read_text(), "body {}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,91 @@
+import tempfile
+import unittest
+from pathlib import Path
+
+from template import Template, load_template, minify_template
+
+
+class TestTemplate(unittest.TestCase):
+    def test_render_fills_slots(self):
+        t = Template("<title>{{ Title }}</title><main>{{ Content }}</main>")
+        self.assertEqual(
+            t.render(Title="Hi", Content="<p>x</p>"),
+            "<title>Hi</title><main><p>x</p></main>",
+        )
+
+    def test_slot_used_twice(self):
+        t = Template("{{ Title }} | {{ Title }}")
+        self.assertEqual(t.render(Title="A"), "A | A")
+
+    def test_unknown_slot_left_untouched(self):
+        t = Template("{{ Title }} {{ Footer }}")
+        self.assertEqual(t.render(Title="A"), "A {{ Footer }}")
+
+    def test_template_without_slots(self):
+        self.assertEqual(Template("plain").render(Title="A"), "plain")
+
+    def test_base_path_rewritten_in_template(self):
+        t = Template('<link href="/index.css"><img src="/a.png">', "/site/")
+        self.assertEqual(t.render(), '<link href="/site/index.css"><img src="/site/a.png">')
+
+    def test_base_path_not_applied_to_slot_values(self):
+        t = Template("<article>{{ Content }}</article>", "/site/")
+        content = '<pre><code>&lt;a href="/x"&gt;</code></pre>'
+        self.assertEqual(t.render(Content=content), f"<article>{content}</article>")
+
+    def test_render_chunks_accepts_iterables(self):
+        t = Template("<main>{{ Content }}</main>")
+        chunks = list(t.render_chunks(Content=iter(["<p>", "x", "</p>"])))
+        self.assertEqual(chunks, ["<main>", "<p>", "x", "</p>", "</main>"])
+
+    def test_rewrite_url(self):
+        t = Template("", "/site/")
+        self.assertEqual(t.rewrite_url("/blog/tom"), "/site/blog/tom")
+        self.assertEqual(t.rewrite_url("/"), "/site/")
+        self.assertEqual(t.rewrite_url("https://example.com"), "https://example.com")
+
+    def test_load_template_is_cached_until_file_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            p = Path(tmp) / "template.html"
+            p.write_text("{{ Title }}")
+            first = load_template(p, "/")
+            self.assertIs(load_template(p, "/"), first)
+            p.write_text("<h1>{{ Title }}</h1>!")
+            self.assertEqual(load_template(p, "/").render(Title="A"), "<h1>A</h1>!")
+
+class TestMinifyTemplate(unittest.TestCase):
+    def test_indentation_goes_text_spacing_stays(self):
+        text = "<html>\n  <head>\n    <title>{{ Title }}</title>\n  </head>\n  <body>\n    <p>a  <b>b</b> c\n  d</p>\n  </body>\n</html>\n"
+        self.assertEqual(minify_template(text),
+                         "<html><head><title>{{ Title }}</title></head><body><p>a <b>b</b> c d</p></body></html>")
+
+    def test_line_breaks_beside_inline_tags_keep_a_space(self):
+        self.assertEqual(minify_template("<p>Hello\n  <b>world</b>\n  and more</p>"), "<p>Hello <b>world</b> and more</p>")
+        self.assertEqual(minify_template("<p>\n  <a>x</a>\n  <i>y</i>\n</p>"), "<p><a>x</a> <i>y</i></p>")
+        self.assertEqual(minify_template("<p>a\n  <textarea> t </textarea>\n</p>"), "<p>a <textarea> t </textarea></p>")
+
+    def test_line_break_after_br_keeps_a_space(self):
+        self.assertEqual(minify_template("<p>x<br>\n y</p>"), "<p>x<br> y</p>")
+
+    def test_attribute_values_are_kept_as_written(self):
+        text = """<div\n  title="a   b"  data-x='c\n  d'>\n  <a onclick="f( 1,  2 )">x</a>\n</div>"""
+        self.assertEqual(minify_template(text),
+                         """<div title="a   b" data-x='c\n  d'><a onclick="f( 1,  2 )">x</a></div>""")
+
+    def test_code_is_kept_as_written(self):
+        self.assertEqual(minify_template("<p>\n  <code>a   b\n  c</code>\n</p>"), "<p><code>a   b\n  c</code></p>")
+        self.assertEqual(minify_template("<p>see\n  <code> x </code>\n  here</p>"), "<p>see <code> x </code> here</p>")
+
+    def test_preserved_elements_and_comments(self):
+        text = "<div>\n  <!-- note -->\n  <pre>  a\n   b </pre>\n  <script>var  x;\n</script>\n</div>"
+        self.assertEqual(minify_template(text), "<div><pre>  a\n   b </pre><script>var  x;\n</script></div>")
+        self.assertEqual(minify_template("<!--[if IE]><p>x</p><![endif]-->"), "<!--[if IE]><p>x</p><![endif]-->")
+
+    def test_minified_template_renders_compact(self):
+        t = Template('<body>\n  <link href="/a.css">\n  {{ Content }}\n</body>', "/site/", minify=True)
+        self.assertEqual(t.render(Content="<p>x</p>"), '<body><link href="/site/a.css"><p>x</p></body>')
+        self.assertTrue(t.minify)
+        self.assertNotEqual(Template("<p>{{ Content }}</p>", minify=True).digest, Template("<p>{{ Content }}</p>").digest)
+
+if __name__ == "__main__":
+    unittest.main()
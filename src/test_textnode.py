@@ -1,6 +1,6 @@
 import unittest
 
-from textnode import TextNode, TextType, text_node_to_html_node
+from textnode import FrozenTextNode, TextNode, TextType, text_fragment_to_html, text_node_to_html_node
 
 
 class TestTextNode(unittest.TestCase):
@@ -33,6 +33,37 @@ class TestTextNode(unittest.TestCase):
         node = TextNode("This is a bold node", TextType.BOLD)
         self.assertEqual(node.url, None)
 
+    def test_no_instance_dict(self):
+        node = TextNode("x", TextType.TEXT)
+        self.assertFalse(hasattr(node, "__dict__"))
+        with self.assertRaises(AttributeError):
+            node.extra = 1
+
+class TestFrozenTextNode(unittest.TestCase):
+    def test_equal_to_mutable_node(self):
+        self.assertEqual(FrozenTextNode("a", TextType.LINK, "u"), TextNode("a", TextType.LINK, "u"))
+        self.assertEqual(FrozenTextNode.from_node(TextNode("a", TextType.BOLD)), TextNode("a", TextType.BOLD))
+
+    def test_hashable_and_deduplicates(self):
+        nodes = {FrozenTextNode("a", TextType.BOLD), FrozenTextNode("a", TextType.BOLD), FrozenTextNode("a", TextType.ITALIC)}
+        self.assertEqual(len(nodes), 2)
+
+    def test_immutable(self):
+        node = FrozenTextNode("a", TextType.BOLD)
+        with self.assertRaises(AttributeError):
+            node.text = "b"
+        with self.assertRaises(AttributeError):
+            del node.text
+
+    def test_url_dropped_for_non_link(self):
+        self.assertIsNone(FrozenTextNode("a", TextType.BOLD, "u").url)
+
+    def test_repr_matches_text_node(self):
+        self.assertEqual(repr(FrozenTextNode("a", TextType.CODE)), "TextNode(a, code, None)")
+
+    def test_converts_to_html(self):
+        self.assertEqual(text_node_to_html_node(FrozenTextNode("a", TextType.BOLD)).to_html(), "<b>a</b>")
+
 class Test_text_node_to_html_node(unittest.TestCase):
     def test_text(self):
         node = TextNode("This is a text node", TextType.TEXT)
@@ -52,5 +83,23 @@ class Test_text_node_to_html_node(unittest.TestCase):
         self.assertNotEqual(html_node1.tag, html_node2.tag)
         self.assertNotEqual(html_node1.props, html_node2.props)
 
+class Test_text_fragment_to_html(unittest.TestCase):
+    def test_matches_leaf_node_html(self):
+        cases = [
+            TextNode("t", TextType.TEXT),
+            TextNode("b", TextType.BOLD),
+            TextNode("i", TextType.ITALIC),
+            TextNode("c", TextType.CODE),
+            TextNode("l", TextType.LINK, "/u"),
+            TextNode("alt", TextType.IMAGE, "/p.png"),
+        ]
+        rewrite = lambda url: "/site" + url
+        for node in cases:
+            with self.subTest(node=node):
+                self.assertEqual(
+                    text_fragment_to_html(node.text, node.text_type, node.url, rewrite),
+                    text_node_to_html_node(node, rewrite).to_html(),
+                )
+
 if __name__ == "__main__":
     unittest.main()
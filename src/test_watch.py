@@ -0,0 +1,159 @@
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+from pathlib import Path
+
+from main import generate_page_recursively
+from manifest import Manifest
+from watch import diff_snapshots, rebuild, serve, snapshot
+
+
+class TestSnapshots(unittest.TestCase):
+    def test_diff_reports_changed_and_removed(self):
+        before = {"a": (1, 1), "b": (1, 1), "c": (1, 1)}
+        after = {"a": (1, 1), "b": (2, 1), "d": (1, 1)}
+        self.assertEqual(diff_snapshots(before, after), (["b", "d"], ["c"]))
+
+    def test_snapshot_covers_files_and_directories(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            root = Path(tmp)
+            (root / "dir" / "sub").mkdir(parents=True)
+            (root / "dir" / "sub" / "x.md").write_text("x")
+            (root / "t.html").write_text("t")
+            state = snapshot(root / "dir", root / "t.html", root / "missing")
+            self.assertEqual(sorted(state), [str(root / "dir" / "sub" / "x.md"), str(root / "t.html")])
+
+
+class TestRebuild(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = Path(self.tmp.name)
+        self.content = root / "content"
+        self.static = root / "static"
+        self.dest = root / "docs"
+        self.template = root / "template.html"
+        (self.content / "blog").mkdir(parents=True)
+        self.static.mkdir()
+        (self.content / "index.md").write_text("# Home")
+        (self.content / "blog" / "index.md").write_text("# Blog")
+        self.template.write_text("<title>{{ Title }}</title>{{ Content }}")
+        self.manifest = Manifest(root / "manifest.json")
+        generate_page_recursively(self.content, self.template, self.dest, "/", self.manifest)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def rebuild(self, changed, removed = (), minify = False):
+        return rebuild([str(p) for p in changed], [str(p) for p in removed], self.content, self.static,
+                self.template, self.dest, "/", self.manifest, minify=minify)
+
+    def test_only_changed_page_is_rebuilt(self):
+        (self.dest / "index.html").write_text("untouched")
+        (self.content / "blog" / "index.md").write_text("# Blog 2")
+        self.rebuild([self.content / "blog" / "index.md"])
+        self.assertIn("Blog 2", (self.dest / "blog" / "index.html").read_text())
+        self.assertEqual((self.dest / "index.html").read_text(), "untouched")
+
+    def test_minify_is_kept(self):
+        generate_page_recursively(self.content, self.template, self.dest, "/", self.manifest, minify=True)
+        (self.dest / "index.html").write_text("untouched")
+        (self.content / "blog" / "index.md").write_text("# Blog\n\nsome\n   text")
+        self.rebuild([self.content / "blog" / "index.md"], minify=True)
+        self.assertIn("<p>some text</p>", (self.dest / "blog" / "index.html").read_text())
+        self.assertEqual((self.dest / "index.html").read_text(), "untouched")
+
+    def test_failed_page_does_not_stop_the_batch(self):
+        css = self.static / "index.css"
+        css.write_text("body {}")
+        (self.content / "index.md").write_text("no title")
+        (self.content / "blog" / "index.md").write_text("# Blog 2")
+        failures = self.rebuild([self.content / "index.md", self.content / "blog" / "index.md", css])
+        self.assertEqual([path for path, _ in failures], [str(self.content / "index.md")])
+        self.assertIn("Blog 2", (self.dest / "blog" / "index.html").read_text())
+        self.assertEqual((self.dest / "index.css").read_text(), "body {}")
+
+    def test_template_change_with_a_failing_page_rebuilds_the_rest(self):
+        (self.content / "index.md").write_text("no title")
+        self.template.write_text("<h1>{{ Title }}</h1>")
+        failures = self.rebuild([self.template])
+        self.assertEqual([path for path, _ in failures], [str(self.content / "index.md")])
+        self.assertEqual((self.dest / "blog" / "index.html").read_text(), "<h1>Blog</h1>")
+
+    def test_template_change_rebuilds_every_page(self):
+        self.template.write_text("<h1>{{ Title }}</h1>")
+        self.rebuild([self.template])
+        self.assertEqual((self.dest / "index.html").read_text(), "<h1>Home</h1>")
+        self.assertEqual((self.dest / "blog" / "index.html").read_text(), "<h1>Blog</h1>")
+
+    def test_removed_page_output_is_deleted(self):
+        (self.content / "blog" / "index.md").unlink()
+        self.rebuild([], [self.content / "blog" / "index.md"])
+        self.assertFalse((self.dest / "blog").exists())
+        self.assertTrue(self.dest.is_dir())
+
+    def test_rebuilt_and_removed_outputs_lose_their_compressed_siblings(self):
+        for name in ("index.html.gz", "blog/index.html.br"):
+            (self.dest / name).write_bytes(b"old page")
+        (self.content / "index.md").write_text("# Home 2")
+        (self.content / "blog" / "index.md").unlink()
+        self.rebuild([self.content / "index.md"], [self.content / "blog" / "index.md"])
+        self.assertFalse((self.dest / "index.html.gz").exists())
+        self.assertFalse((self.dest / "blog").exists())
+
+    def test_static_file_is_copied_and_removed(self):
+        css = self.static / "index.css"
+        css.write_text("body {}")
+        self.rebuild([css])
+        self.assertEqual((self.dest / "index.css").read_text(), "body {}")
+        css.unlink()
+        self.rebuild([], [css])
+        self.assertFalse((self.dest / "index.css").exists())
+
+    def test_content_asset_is_synced_and_swap_file_ignored(self):
+        image = self.content / "blog" / "photo.png"
+        image.write_bytes(b"png")
+        swap = self.content / "blog" / ".index.md.swp"
+        swap.write_text("swap")
+        self.rebuild([image, swap])
+        self.assertEqual((self.dest / "blog" / "photo.png").read_bytes(), b"png")
+        self.assertFalse((self.dest / "blog" / "photo.html").exists())
+        self.assertEqual(sorted(p.name for p in (self.dest / "blog").iterdir()), ["index.html", "photo.png"])
+        image.unlink()
+        self.rebuild([], [image])
+        self.assertFalse((self.dest / "blog" / "photo.png").exists())
+
+
+
+class TestServe(unittest.TestCase):
+    def test_serves_directory(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "index.html").write_text("hello")
+            server = serve(tmp, port=0)
+            try:
+                host, port = server.server_address[:2]
+                with urllib.request.urlopen(f"http://{host}:{port}/index.html") as r:
+                    self.assertEqual(r.read(), b"hello")
+            finally:
+                server.shutdown()
+                server.server_close()
+
+    def test_serves_under_base_path(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            (Path(tmp) / "blog").mkdir()
+            (Path(tmp) / "blog" / "index.html").write_text("blog")
+            server = serve(tmp, port=0, base_path="/site/")
+            try:
+                host, port = server.server_address[:2]
+                with urllib.request.urlopen(f"http://{host}:{port}/site/blog/") as r:
+                    self.assertEqual(r.read(), b"blog")
+                with self.assertRaises(urllib.error.HTTPError) as cm:
+                    urllib.request.urlopen(f"http://{host}:{port}/blog/")
+                self.assertEqual(cm.exception.code, 404)
+            finally:
+                server.shutdown()
+                server.server_close()
+
+
+if __name__ == "__main__":
+    unittest.main()
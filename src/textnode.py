@@ -1,5 +1,5 @@
 from enum import Enum
-from htmlnode import LeafNode
+from htmlnode import LeafNode, collapse_whitespace
 class TextType(Enum):
     TEXT = "text"
     BOLD = "bold"
@@ -9,6 +9,8 @@ class TextType(Enum):
     IMAGE = "image"
 
 class TextNode:
+    __slots__ = ("text", "text_type", "url")
+
     def __init__(self, text, text_type, url = None):
         self.text = text
         self.text_type = text_type
@@ -22,7 +24,33 @@ class TextNode:
 
     def __repr__(self):
         return f"TextNode({self.text}, {self.text_type.value}, {self.url})"
-def text_node_to_html_node(text_node):
+
+class FrozenTextNode(TextNode):
+    # immutable and hashable, so equal fragments can be deduplicated or used
+    # as dict keys; compares equal to a TextNode with the same fields
+    __slots__ = ()
+
+    def __init__(self, text, text_type, url = None):
+        if text_type != TextType.LINK and text_type != TextType.IMAGE:
+            url = None
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "text_type", text_type)
+        object.__setattr__(self, "url", url)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"FrozenTextNode is immutable, cannot set {name}")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"FrozenTextNode is immutable, cannot delete {name}")
+
+    def __hash__(self):
+        return hash((self.text, self.text_type, self.url))
+
+    @classmethod
+    def from_node(cls, node):
+        return cls(node.text, node.text_type, node.url)
+
+def text_node_to_html_node(text_node, rewrite_url = None):
     if text_node.text_type == None:
         raise Exception("missing text type")
     match text_node.text_type:
@@ -35,6 +63,32 @@ def text_node_to_html_node(text_node):
         case TextType.CODE:
             return LeafNode("code", text_node.text)
         case TextType.LINK:
-            return LeafNode("a", text_node.text, {"href" : text_node.url})
+            url = rewrite_url(text_node.url) if rewrite_url else text_node.url
+            return LeafNode("a", text_node.text, {"href" : url})
+        case TextType.IMAGE:
+            url = rewrite_url(text_node.url) if rewrite_url else text_node.url
+            return LeafNode("img", "", {"src": url, "alt":text_node.text})
+def text_fragment_to_html(text, text_type, url = None, rewrite_url = None, compact = False):
+    # the html text_node_to_html_node(...).to_html(compact) would produce,
+    # without building the TextNode or the LeafNode
+    # code is shown as written; an image's alt is an attribute, not text
+    if compact and text_type != TextType.CODE and text_type != TextType.IMAGE:
+        text = collapse_whitespace(text)
+    match text_type:
+        case TextType.TEXT:
+            return text
+        case TextType.BOLD:
+            return f"<b>{text}</b>"
+        case TextType.ITALIC:
+            return f"<i>{text}</i>"
+        case TextType.CODE:
+            return f"<code>{text}</code>"
+        case TextType.LINK:
+            url = rewrite_url(url) if rewrite_url else url
+            return f'<a href="{url}">{text}</a>'
         case TextType.IMAGE:
-            return LeafNode("img", "", {"src": text_node.url, "alt":text_node.text})
+            url = rewrite_url(url) if rewrite_url else url
+            if compact:
+                return f'<img src="{url}" alt="{text}">'
+            return f'<img src="{url}" alt="{text}"></img>'
+    raise Exception("missing text type")
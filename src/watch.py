@@ -0,0 +1,165 @@
+import time
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from threading import Thread
+
+from discover import DEFAULT_IGNORE, is_ignored, is_page, page_dest
+from compress import discard_compressed
+from main import collect_pages, generate_page_incremental, prune_empty_parents, template_hash_of
+from output import ChangeLog
+from sync import sync_file, walk_files
+
+def snapshot(*roots):
+    # (mtime, size) of every file under the given files/directories; run on
+    # every poll, so directories are walked with scandir, one stat per file
+    state = {}
+    for root in roots:
+        root = Path(root)
+        if root.is_dir():
+            for _, entry in walk_files(root):
+                st = entry.stat()
+                state[entry.path] = (st.st_mtime_ns, st.st_size)
+        elif root.is_file():
+            st = root.stat()
+            state[str(root)] = (st.st_mtime_ns, st.st_size)
+    return state
+
+def diff_snapshots(before, after):
+    changed = sorted(p for p, stamp in after.items() if before.get(p) != stamp)
+    removed = sorted(p for p in before if p not in after)
+    return changed, removed
+
+def _content_target(p, content_dir, dest_dir, ignore):
+    # (is_page, dest) for a file under content/, named as in the build plan so
+    # manifest keys line up, or None when the file is ignored
+    rel = p.relative_to(content_dir).as_posix()
+    if is_ignored(rel, ignore):
+        return None
+    if is_page(rel):
+        return True, page_dest(rel, dest_dir)
+    return False, dest_dir / rel
+
+def rebuild(changed, removed, content_dir, static_dir, template_path, dest_dir, base_path, manifest, cache = None, link = False, ignore = DEFAULT_IGNORE, minify = False):
+    # returns [(path, error)] for every file that failed; one bad page does
+    # not stop the rest of the batch from being rebuilt
+    content_dir, static_dir, dest_dir = Path(content_dir), Path(static_dir), Path(dest_dir)
+    failures = []
+    # compressed siblings of what this rewrites or removes would be served
+    # out of date, here and by the next --incremental build, which sees the
+    # page as fresh; they go at the end
+    changes = ChangeLog(dest_dir)
+    template_changed = str(template_path) in changed or str(template_path) in removed
+    template_hash = template_hash_of(template_path, minify=minify)
+    if template_changed:
+        # every page embeds the template; the manifest sees the new hash
+        for from_path, dest_path in collect_pages(content_dir, dest_dir, ignore):
+            try:
+                changes.record(dest_path, generate_page_incremental(from_path, template_path, dest_path, base_path, manifest,
+                                                                    template_hash, cache, minify=minify))
+            except Exception as e:
+                failures.append((from_path, f"{type(e).__name__}: {e}"))
+    for source in changed:
+        p = Path(source)
+        asset = None
+        try:
+            if content_dir in p.parents:
+                target = _content_target(p, content_dir, dest_dir, ignore)
+                if target is None:
+                    continue
+                is_page_file, dest = target
+                if not is_page_file:
+                    asset = dest
+                elif not template_changed:
+                    changes.record(dest, generate_page_incremental(p, template_path, dest, base_path, manifest, template_hash,
+                                                                   cache, minify=minify))
+            elif static_dir in p.parents:
+                asset = dest_dir / p.relative_to(static_dir)
+            if asset is not None:
+                how = sync_file(p, asset, link)
+                manifest.record_asset(asset, p)
+                changes.record(asset, True)
+                print(f"{how.capitalize()} {p} to {asset}")
+        except Exception as e:
+            failures.append((source, f"{type(e).__name__}: {e}"))
+    for source in removed:
+        p = Path(source)
+        if content_dir in p.parents:
+            target = _content_target(p, content_dir, dest_dir, ignore)
+            if target is None:
+                continue
+            is_page_file, dest = target
+            if is_page_file:
+                manifest.forget(dest)
+            else:
+                manifest.forget_asset(dest)
+        elif static_dir in p.parents:
+            dest = dest_dir / p.relative_to(static_dir)
+            manifest.forget_asset(dest)
+        else:
+            continue
+        print(f"Removing {dest}")
+        Path(dest).unlink(missing_ok=True)
+        changes.record_removed(dest)
+    discard_compressed(changes)
+    for dest in changes.removed_paths:
+        prune_empty_parents(dest, dest_dir)
+    return failures
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    # pages link to each other under the base path, so the output directory
+    # is served there; anything outside it is not found
+    def __init__(self, *args, base_path = "/", **kwargs):
+        self.base_path = base_path
+        super().__init__(*args, **kwargs)
+
+    def log_message(self, format, *args):
+        pass
+
+    def translate_path(self, path):
+        prefix = self.base_path.rstrip("/")
+        if prefix:
+            url = path.split("?", 1)[0].split("#", 1)[0]
+            if url != prefix and not url.startswith(prefix + "/"):
+                return str(Path(self.directory) / ".not-under-base-path")
+            path = path[len(prefix):] or "/"
+        return super().translate_path(path)
+
+def serve(directory, port = 8888, host = "127.0.0.1", base_path = "/"):
+    # serve the output directory under base_path from a background thread
+    handler = partial(_QuietHandler, directory=str(directory), base_path=base_path)
+    server = ThreadingHTTPServer((host, port), handler)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def watch(content_dir, static_dir, template_path, dest_dir, base_path, manifest, cache = None, port = 8888, interval = 0.2, link = False, ignore = DEFAULT_IGNORE, minify = False):
+    server = serve(dest_dir, port, base_path=base_path)
+    host, port = server.server_address[:2]
+    print(f"Serving {dest_dir} at http://{host}:{port}{base_path}")
+    roots = (content_dir, static_dir, template_path)
+    state = snapshot(*roots)
+    try:
+        while True:
+            time.sleep(interval)
+            current = snapshot(*roots)
+            changed, removed = diff_snapshots(state, current)
+            state = current
+            if not changed and not removed:
+                continue
+            start = time.perf_counter()
+            try:
+                failures = rebuild(changed, removed, content_dir, static_dir, template_path, dest_dir, base_path, manifest,
+                                   cache, link, ignore, minify)
+            except Exception as e:
+                # keep watching; the next save will usually fix it
+                print(f"Build failed: {type(e).__name__}: {e}")
+                continue
+            for path, error in failures:
+                print(f"{path}: {error}")
+            print(f"Rebuilt in {(time.perf_counter() - start) * 1000:.0f} ms"
+                  + (f", {len(failures)} file(s) failed" if failures else ""))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.shutdown()
+        manifest.save()